@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import FitnessClass, ClassType, Level, Booking
-from .services import BookingEmailService
+from django.utils import timezone
+from .models import FitnessClass, ClassType, Level, Booking, Waitlist, EmailOutbox
+from .services import BookingEmailService, BookingService, AttendanceService
 
 
 @admin.register(ClassType)
@@ -58,12 +59,72 @@ class BookingAdmin(admin.ModelAdmin):
 
     actions = ['send_confirmation_emails', 'mark_as_attended', 'mark_as_no_show']
 
-    def send_confirmation_emails(self, request, queryset):
+    def save_model(self, request, obj, form, change):
+        BookingService.save_booking(obj)
+
+    def delete_model(self, request, obj):
+        BookingService.delete_booking(obj)
+
+    def delete_queryset(self, request, queryset):
         for booking in queryset:
-            try:
-                BookingEmailService.send_booking_confirmation_email(booking)
-            except Exception as e:
-                self.message_user(request, f"Failed to send email for {
-                                  booking}: {e}", level='error')
-        self.message_user(request, f"Confirmation emails sent for {queryset.count()} bookings.")
+            BookingService.delete_booking(booking)
+
+    def send_confirmation_emails(self, request, queryset):
+        sent, failed = BookingEmailService.send_bulk_confirmation_emails(queryset)
+        if failed:
+            self.message_user(
+                request,
+                f"Failed to send {len(failed)} confirmation emails "
+                f"(bookings {', '.join(map(str, failed))}).",
+                level='error'
+            )
+        self.message_user(request, f"Confirmation emails sent for {sent} bookings.")
     send_confirmation_emails.short_description = "Send confirmation emails"
+
+    def mark_as_attended(self, request, queryset):
+        updated, not_started = AttendanceService.mark_bookings(queryset, 'attended')
+        if not_started:
+            self.message_user(
+                request, f"Skipped {not_started} bookings of classes that have not started.",
+                level='warning'
+            )
+        self.message_user(request, f"{updated} bookings marked as attended.")
+    mark_as_attended.short_description = "Mark selected bookings as attended"
+
+    def mark_as_no_show(self, request, queryset):
+        updated, not_started = AttendanceService.mark_bookings(queryset, 'no_show')
+        if not_started:
+            self.message_user(
+                request, f"Skipped {not_started} bookings of classes that have not started.",
+                level='warning'
+            )
+        self.message_user(request, f"{updated} bookings marked as no-show.")
+    mark_as_no_show.short_description = "Mark selected bookings as no-show"
+
+
+@admin.register(Waitlist)
+class WaitlistAdmin(admin.ModelAdmin):
+    list_display = ['user', 'fitness_class', 'position', 'joined_at']
+    list_filter = ['fitness_class__class_type__name']
+    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user', 'fitness_class', 'fitness_class__class_type']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = [
+        'kind', 'user', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at'
+    ]
+    list_filter = ['status', 'kind']
+    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} emails requeued.")
+    requeue.short_description = "Requeue selected emails"
@@ -0,0 +1,120 @@
+import multiprocessing
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+from users.models import User
+from classes.models import FitnessClass, ClassType, Level, Booking
+from classes.services import BookingService, ClassFullError, BookingError
+
+
+def _attempt_bookings(args):
+    """Worker body: try to book the class once for every given user"""
+    fitness_class_id, user_ids = args
+    connections.close_all()
+
+    fitness_class = FitnessClass.objects.get(pk=fitness_class_id)
+    booked = full = failed = 0
+
+    for user_id in user_ids:
+        try:
+            BookingService.create_booking(User(pk=user_id), fitness_class)
+            booked += 1
+        except ClassFullError:
+            full += 1
+        except BookingError:
+            failed += 1
+
+    connections.close_all()
+    return booked, full, failed
+
+
+class Command(BaseCommand):
+    help = 'Hammer one class with concurrent booking attempts and report throughput/oversell'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of concurrent booking processes'
+        )
+        parser.add_argument(
+            '--attempts',
+            type=int,
+            default=1000,
+            help='Total number of members trying to book'
+        )
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            default=20,
+            help='Capacity of the benchmark class'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the generated class, users and bookings'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        attempts = options['attempts']
+        capacity = options['capacity']
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                f'Running against {connection.vendor}; numbers are only meaningful on Postgres'
+            ))
+
+        run_id = uuid.uuid4().hex[:8]
+        class_type, _ = ClassType.objects.get_or_create(name='Benchmark')
+        level, _ = Level.objects.get_or_create(name='Benchmark')
+        start_time = timezone.now() + timedelta(days=1)
+        fitness_class = FitnessClass.objects.create(
+            class_type=class_type,
+            level=level,
+            max_capacity=capacity,
+            start_time=start_time,
+            end_time=start_time + timedelta(hours=1),
+        )
+        users = User.objects.bulk_create([
+            User(username=f'bench_{run_id}_{i}', password='!')
+            for i in range(attempts)
+        ])
+        user_ids = [user.pk for user in users]
+        chunks = [(fitness_class.pk, user_ids[i::workers]) for i in range(workers)]
+
+        connections.close_all()
+        started = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.map(_attempt_bookings, chunks)
+        elapsed = time.perf_counter() - started
+
+        booked = sum(result[0] for result in results)
+        full = sum(result[1] for result in results)
+        failed = sum(result[2] for result in results)
+
+        fitness_class.refresh_from_db()
+        active = Booking.objects.filter(
+            fitness_class=fitness_class,
+            status__in=['pending', 'confirmed']
+        ).count()
+        oversell = max(0, active - capacity)
+
+        self.stdout.write(f'Workers:          {workers}')
+        self.stdout.write(f'Attempts:         {attempts} in {elapsed:.2f}s '
+                          f'({attempts / elapsed:.0f} attempts/sec)')
+        self.stdout.write(f'Bookings:         {booked} ({booked / elapsed:.0f} bookings/sec)')
+        self.stdout.write(f'Rejected as full: {full}')
+        self.stdout.write(f'Other failures:   {failed}')
+        self.stdout.write(f'Counter / actual: {fitness_class.pending_count} / {active}')
+
+        style = self.style.ERROR if oversell else self.style.SUCCESS
+        self.stdout.write(style(f'Oversell count:   {oversell}'))
+
+        if not options['keep']:
+            fitness_class.delete()
+            User.objects.filter(pk__in=user_ids).delete()
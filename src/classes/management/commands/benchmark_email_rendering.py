@@ -0,0 +1,97 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from users.models import User
+from classes.models import FitnessClass, ClassType, Level, Booking
+from classes.services import BookingEmailService, EmailRenderer
+from classes.services.email_renderer import Fragment
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark of confirmation emails rendered per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--emails',
+            type=int,
+            default=5000,
+            help='Number of emails to render'
+        )
+        parser.add_argument(
+            '--classes',
+            type=int,
+            default=25,
+            help='Number of distinct classes the bookings are spread over'
+        )
+
+    def handle(self, *args, **options):
+        bookings = self.build_bookings(options['emails'], options['classes'])
+
+        EmailRenderer.clear()
+        legacy = self.measure(bookings, self.render_uncached)
+        cached = self.measure(bookings, self.render_cached)
+
+        self.stdout.write(f'Emails:            {len(bookings)} over {options["classes"]} classes')
+        self.stdout.write(f'render_to_string:  {legacy:.0f} emails/sec '
+                          f'(html + per-email class details + strip_tags)')
+        self.stdout.write(self.style.SUCCESS(
+            f'EmailRenderer:     {cached:.0f} emails/sec ({cached / legacy:.1f}x)'
+        ))
+
+    @staticmethod
+    def build_bookings(count, class_count):
+        """Unsaved instances, so the benchmark measures rendering only"""
+        now = timezone.now()
+        class_type = ClassType(name='Yoga')
+        level = Level(name='Beginner')
+        classes = [
+            FitnessClass(
+                pk=i + 1,
+                class_type=class_type,
+                level=level,
+                start_time=now + timedelta(days=1, hours=i),
+                end_time=now + timedelta(days=1, hours=i + 1),
+                price=15,
+                updated_at=now,
+            )
+            for i in range(class_count)
+        ]
+        return [
+            Booking(
+                pk=i + 1,
+                user=User(first_name='Member', last_name=str(i), email=f'member{i}@example.com'),
+                fitness_class=classes[i % class_count],
+                confirmation_token=f'token-{i}',
+            )
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def measure(bookings, render):
+        started = time.perf_counter()
+        for booking in bookings:
+            render(booking)
+        return len(bookings) / (time.perf_counter() - started)
+
+    @staticmethod
+    def render_uncached(booking):
+        """The previous pipeline: everything re-rendered, text derived with strip_tags"""
+        context = {'fitness_class': booking.fitness_class}
+        class_details = Fragment(
+            '', render_to_string('emails/fragments/class_details.html', context)
+        )
+        html_message = render_to_string('emails/booking_confirmation.html', {
+            'user': booking.user,
+            'booking': booking,
+            'fitness_class': booking.fitness_class,
+            'class_details': class_details,
+        })
+        return strip_tags(html_message), html_message
+
+    @staticmethod
+    def render_cached(booking):
+        message = BookingEmailService.build_booking_confirmation_email(booking)
+        return message.body, message.alternatives[0]
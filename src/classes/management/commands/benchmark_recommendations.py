@@ -0,0 +1,98 @@
+import random
+import time
+from types import SimpleNamespace
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from classes.models import ItemSimilarity
+from classes.services import ClassRecommendationEngine
+from classes.services.recommendation_engine import ClassFeatures, GOAL_CLASS_TYPES
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark of class recommendation scoring per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--classes',
+            type=int,
+            default=5000,
+            help='Number of upcoming classes in the feature matrix'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Number of scored profiles'
+        )
+
+    def handle(self, *args, **options):
+        features, type_ids, level_orders = self.build_features(options['classes'])
+        rng = random.Random(0)
+        profiles = [
+            SimpleNamespace(
+                primary_goal=rng.choice(list(GOAL_CLASS_TYPES)),
+                experience_level=rng.choice(['beginner', 'intermediate', 'advanced']),
+                preferred_times=rng.sample(['morning', 'afternoon', 'evening'], 2),
+                preferred_duration_min=rng.choice([30, 45, 60]),
+            )
+            for _ in range(options['requests'])
+        ]
+
+        # "Members like you" neighbours, as ItemSimilarityService.affinities returns them
+        affinities = [
+            {
+                ItemSimilarity.CLASS_TYPE: {
+                    type_id: rng.random() for type_id in rng.sample(list(type_ids.values()), 5)
+                },
+                ItemSimilarity.INSTRUCTOR: {
+                    instructor_id: rng.random() for instructor_id in rng.sample(range(1, 50), 10)
+                },
+            }
+            for _ in range(100)
+        ]
+
+        engine = ClassRecommendationEngine
+        now = timezone.now().timestamp()
+        timings = []
+        for profile in profiles:
+            started = time.perf_counter()
+            vector = engine.profile_vector(
+                profile, rng.sample(list(type_ids.values()), 2), type_ids, level_orders,
+                affinities[len(timings) % len(affinities)]
+            )
+            engine.top_k(engine.score(features, vector, now), 5)
+            timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(f'Classes:  {len(features)}')
+        self.stdout.write(f'Requests: {len(timings)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Scoring + top-5: p50 {timings[len(timings) // 2] * 1000:.3f}ms, '
+            f'p95 {timings[int(len(timings) * 0.95)] * 1000:.3f}ms per request'
+        ))
+
+    @staticmethod
+    def build_features(count):
+        """Synthetic feature matrix, so the benchmark measures scoring only"""
+        rng = np.random.default_rng(0)
+        type_names = sorted({name for names in GOAL_CLASS_TYPES.values() for name in names})
+        type_ids = {name: i + 1 for i, name in enumerate(type_names)}
+        level_orders = {'Beginner': 1, 'Intermediate': 2, 'Advanced': 3, 'All Levels': 4}
+
+        now = timezone.now().timestamp()
+        capacity = rng.integers(10, 30, count).astype(np.float64)
+        features = ClassFeatures(
+            np.arange(1, count + 1),
+            np.floor(capacity * rng.random(count)),
+            class_type=rng.integers(1, len(type_ids) + 1, count).astype(np.float64),
+            instructor=rng.integers(0, 50, count).astype(np.float64),
+            level_order=rng.choice([0.0, 1.0, 2.0, 3.0], count),
+            hour=rng.integers(6, 22, count).astype(np.float64),
+            duration=rng.choice([30.0, 45.0, 60.0, 90.0], count),
+            capacity=capacity,
+            price=rng.choice([0.0, 10.0, 15.0, 25.0], count),
+            start=now + rng.uniform(2 * 3600, 28 * 86400, count),
+            updated=np.full(count, now),
+        )
+        return features, type_ids, level_orders
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from classes.services import ItemSimilarityService
+
+
+class Command(BaseCommand):
+    help = 'Nightly: rebuild "members like you" class type and instructor neighbours'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-n',
+            type=int,
+            default=20,
+            help='Neighbours stored per class type / instructor'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help='Bookings read per query'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = ItemSimilarityService.rebuild(
+            top_n=options['top_n'], chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stats['similarities']} neighbours from {stats['bookings']} bookings "
+            f"of {stats['members']} members in {time.perf_counter() - started:.1f}s"
+        ))
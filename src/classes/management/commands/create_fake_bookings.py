@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.core.management import call_command
 from faker import Faker
 import random
 from django.utils import timezone
@@ -75,6 +76,8 @@ class Command(BaseCommand):
                     self.style.ERROR(f'Error creating booking: {e}')
                 )
 
+        call_command('rebuild_class_counters')
+
         self.stdout.write(
             self.style.SUCCESS(f'Successfully created {created_count} fake bookings!')
         )
@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand
+from classes.services import BookingService
+
+
+class Command(BaseCommand):
+    help = 'Cancel pending bookings whose hold (BOOKING_HOLD_TTL_MINUTES) has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of bookings expired per transaction'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep sweeping in-process instead of exiting after one pass'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds to sleep between passes when --loop is set'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'])
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        started = time.perf_counter()
+        total = 0
+
+        for expired in BookingService.expire_pending_holds(batch_size=batch_size):
+            total += expired
+            self.stdout.write(f'Expired {total} pending bookings...')
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {total} pending bookings in {elapsed:.2f}s ({rate:.0f} rows/sec)'
+        ))
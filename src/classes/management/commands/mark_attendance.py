@@ -0,0 +1,36 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from classes.services import AttendanceService
+
+
+class Command(BaseCommand):
+    help = 'Mark bookings of finished classes as attended (confirmed) or no_show (pending)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Settle classes that ended within this many hours'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of bookings updated per transaction'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        attended = no_show = 0
+
+        for chunk_attended, chunk_no_show in AttendanceService.close_finished_classes(
+            since, batch_size=options['batch_size']
+        ):
+            attended += chunk_attended
+            no_show += chunk_no_show
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Marked {attended} bookings as attended and {no_show} as no-show'
+        ))
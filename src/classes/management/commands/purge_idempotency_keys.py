@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from classes.services import IdempotencyService
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of keys deleted per query'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for deleted in IdempotencyService.purge_expired(batch_size=options['batch_size']):
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} expired idempotency keys'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from classes.services import EmailOutboxService
+
+
+class Command(BaseCommand):
+    help = 'Delete sent outbox emails older than EMAIL_OUTBOX_RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of emails deleted per query'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for deleted in EmailOutboxService.purge_sent(batch_size=options['batch_size']):
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} sent outbox emails'))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from classes.models import FitnessClass
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or verify) the denormalized seat counters on fitness classes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report classes whose counters drifted, do not write'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of classes to update per query'
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = options['batch_size']
+
+        actual = FitnessClass.objects.annotate(
+            actual_confirmed=Count(
+                'bookings', filter=Q(bookings__status__in=['confirmed', 'attended'])
+            ),
+            actual_pending=Count('bookings', filter=Q(bookings__status='pending')),
+        ).only('id', 'confirmed_count', 'pending_count')
+
+        drifted = []
+        for fitness_class in actual.iterator(chunk_size=batch_size):
+            if (fitness_class.confirmed_count != fitness_class.actual_confirmed
+                    or fitness_class.pending_count != fitness_class.actual_pending):
+                if check_only:
+                    self.stdout.write(
+                        f'Class {fitness_class.pk}: confirmed '
+                        f'{fitness_class.confirmed_count} != {fitness_class.actual_confirmed}, '
+                        f'pending {fitness_class.pending_count} != {fitness_class.actual_pending}'
+                    )
+                fitness_class.confirmed_count = fitness_class.actual_confirmed
+                fitness_class.pending_count = fitness_class.actual_pending
+                drifted.append(fitness_class)
+
+        if check_only:
+            style = self.style.WARNING if drifted else self.style.SUCCESS
+            self.stdout.write(style(f'{len(drifted)} classes with drifted counters'))
+            return
+
+        with transaction.atomic():
+            FitnessClass.objects.bulk_update(
+                drifted, FitnessClass.SEAT_COUNTER_FIELDS, batch_size=batch_size
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt seat counters for {len(drifted)} classes')
+        )
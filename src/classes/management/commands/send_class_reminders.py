@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from classes.services import ClassReminderService
+
+
+class Command(BaseCommand):
+    help = 'Email reminders for confirmed bookings of classes starting within the reminder window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of bookings claimed and sent per chunk'
+        )
+
+    def handle(self, *args, **options):
+        with ClassReminderService.run_lock() as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING('Another reminder run is in progress'))
+                return
+
+            started = time.perf_counter()
+            sent = failed = 0
+
+            for chunk_sent, chunk_failed in ClassReminderService.dispatch(
+                chunk_size=options['chunk_size']
+            ):
+                sent += chunk_sent
+                failed += chunk_failed
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Sent {sent} class reminders ({failed} failed) in {elapsed:.2f}s'
+            ))
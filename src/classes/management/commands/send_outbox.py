@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand
+from classes.services import EmailOutboxService
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued booking emails from the outbox over pooled SMTP connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of emails sent per SMTP connection'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Seconds to sleep between polls when --loop is set'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.drain(options['batch_size'])
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def drain(self, batch_size):
+        sent = retried = dead = 0
+
+        while True:
+            result = EmailOutboxService.deliver_batch(batch_size=batch_size)
+            if result is None:
+                break
+
+            sent += result[0]
+            retried += result[1]
+            dead += result[2]
+
+        if sent or retried or dead:
+            self.stdout.write(self.style.SUCCESS(
+                f'Sent {sent} emails, {retried} scheduled for retry, {dead} dead-lettered'
+            ))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:06
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_seat_counters(apps, schema_editor):
+    FitnessClass = apps.get_model('classes', 'FitnessClass')
+
+    classes = FitnessClass.objects.annotate(
+        actual_confirmed=Count(
+            'bookings', filter=Q(bookings__status__in=['confirmed', 'attended'])
+        ),
+        actual_pending=Count('bookings', filter=Q(bookings__status='pending')),
+    )
+    for fitness_class in classes.iterator(chunk_size=500):
+        FitnessClass.objects.filter(pk=fitness_class.pk).update(
+            confirmed_count=fitness_class.actual_confirmed,
+            pending_count=fitness_class.actual_pending,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0004_booking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fitnessclass',
+            name='confirmed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='fitnessclass',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_seat_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0006_waitlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'booked_at'], name='bookings_status_60e269_idx'),
+        ),
+    ]
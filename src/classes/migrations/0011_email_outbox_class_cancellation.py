@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0010_booking_reminder_sent_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='kind',
+            field=models.CharField(choices=[('booking_confirmation', 'Booking Confirmation'), ('batch_booking_confirmation', 'Batch Booking Confirmation'), ('booking_cancellation', 'Booking Cancellation'), ('class_reminder', 'Class Reminder'), ('class_cancellation', 'Class Cancellation'), ('class_cancellation_fanout', 'Class Cancellation Fan-out')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
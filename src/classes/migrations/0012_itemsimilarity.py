@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0011_email_outbox_class_cancellation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('class_type', 'Class type'), ('instructor', 'Instructor')], max_length=20)),
+                ('item_id', models.PositiveIntegerField()),
+                ('neighbour_id', models.PositiveIntegerField()),
+                ('similarity', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'item_similarities',
+                'ordering': ['kind', 'item_id', '-similarity'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'item_id', 'neighbour_id'), name='unique_item_similarity')],
+            },
+        ),
+    ]
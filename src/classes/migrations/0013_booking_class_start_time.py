@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_class_start_time(apps, schema_editor):
+    Booking = apps.get_model('classes', 'Booking')
+    FitnessClass = apps.get_model('classes', 'FitnessClass')
+
+    Booking.objects.update(class_start_time=Subquery(
+        FitnessClass.objects.filter(pk=OuterRef('fitness_class_id')).values('start_time')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0012_itemsimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='class_start_time',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_class_start_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='class_start_time',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'class_start_time', 'id'], name='bookings_user_id_853baf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['class_start_time', 'id'], name='bookings_class_s_cfe755_idx'),
+        ),
+    ]
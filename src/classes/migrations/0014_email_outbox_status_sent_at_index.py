@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0013_booking_class_start_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['status', 'sent_at'], name='email_outbo_status_75dddc_idx'),
+        ),
+    ]
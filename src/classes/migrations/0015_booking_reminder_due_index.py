@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0014_email_outbox_status_sent_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('reminder_sent_at__isnull', True), ('status', 'confirmed')), fields=['class_start_time', 'id'], name='bookings_reminder_due_idx'),
+        ),
+    ]
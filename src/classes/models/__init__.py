@@ -2,10 +2,18 @@ from .level import Level
 from .class_type import ClassType
 from .fitness_class import FitnessClass
 from .booking import Booking
+from .waitlist import Waitlist
+from .idempotency_key import IdempotencyKey
+from .email_outbox import EmailOutbox
+from .item_similarity import ItemSimilarity
 
 __all__ = [
     "Level",
     "ClassType",
     "FitnessClass",
-    "Booking"
+    "Booking",
+    "Waitlist",
+    "IdempotencyKey",
+    "EmailOutbox",
+    "ItemSimilarity"
 ]
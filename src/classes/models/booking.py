@@ -34,6 +34,14 @@ class Booking(models.Model):
     confirmation_token = models.CharField(max_length=100, unique=True, blank=True)
     is_email_confirmed = models.BooleanField(default=False)
 
+    # Ledger for the 24h reminder dispatcher, set when the reminder is claimed
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Copy of fitness_class.start_time so booking pages are an index range scan.
+    # FitnessClass.save() and FitnessClass.objects.update() keep it in sync;
+    # raw SQL that moves a class must update its bookings too.
+    class_start_time = models.DateTimeField(editable=False)
+
     class Meta:
         db_table = 'bookings'
         unique_together = ['user', 'fitness_class']
@@ -41,6 +49,15 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields=['status', 'fitness_class']),
             models.Index(fields=['user', 'booked_at']),
+            models.Index(fields=['status', 'booked_at']),
+            models.Index(fields=['user', 'class_start_time', 'id']),
+            models.Index(fields=['class_start_time', 'id']),
+            # Only bookings still waiting for their reminder, for the reminder dispatcher
+            models.Index(
+                fields=['class_start_time', 'id'],
+                condition=models.Q(status='confirmed', reminder_sent_at__isnull=True),
+                name='bookings_reminder_due_idx',
+            ),
         ]
 
     def __str__(self):
@@ -51,6 +68,9 @@ class Booking(models.Model):
             import secrets
             self.confirmation_token = secrets.token_urlsafe(32)
 
+        if self.class_start_time is None or Booking.fitness_class.is_cached(self):
+            self.class_start_time = self.fitness_class.start_time
+
         super().save(*args, **kwargs)
 
     @property
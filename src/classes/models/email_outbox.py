@@ -0,0 +1,61 @@
+from django.db import models
+from django.conf import settings
+
+
+class EmailOutbox(models.Model):
+    """
+    Email queued in the same transaction as the booking change it describes,
+    delivered later by the send_outbox worker
+    """
+    KIND_CHOICES = [
+        ('booking_confirmation', 'Booking Confirmation'),
+        ('batch_booking_confirmation', 'Batch Booking Confirmation'),
+        ('booking_cancellation', 'Booking Cancellation'),
+        ('class_reminder', 'Class Reminder'),
+        ('class_cancellation', 'Class Cancellation'),
+        # Job row: expanded by the worker into one class_cancellation per member
+        ('class_cancellation_fanout', 'Class Cancellation Fan-out'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    booking = models.ForeignKey(
+        "classes.Booking",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'email_outbox'
+        verbose_name_plural = 'Email Outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['status', 'sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} to {self.user_id} ({self.status})"
@@ -1,5 +1,7 @@
 from datetime import timedelta
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from .level import Level
 from .class_type import ClassType
 from .booking import Booking
@@ -7,7 +9,53 @@ from instructors.models import Instructor
 from common.mixins.timestamp import TimestampMixin
 
 
+class FitnessClassQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if 'start_time' not in kwargs:
+            return super().update(**kwargs)
+
+        # Bookings keep a copy of the start time, follow every rescheduled class
+        with transaction.atomic(using=self.db):
+            class_ids = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            Booking.objects.filter(fitness_class_id__in=class_ids).update(
+                class_start_time=Subquery(
+                    FitnessClass.objects.filter(pk=OuterRef('fitness_class_id'))
+                    .values('start_time')[:1]
+                )
+            )
+        return rows
+
+    def with_booking_stats(self, user=None):
+        """
+        Annotate everything FitnessClassReadSerializer needs so a page of
+        classes renders without per-row queries
+        """
+        class_type_counts = FitnessClass.objects.filter(
+            class_type=OuterRef('class_type'),
+            is_active=True
+        ).order_by().values('class_type').annotate(total=Count('pk')).values('total')
+
+        if user is not None and user.is_authenticated:
+            user_has_booking = Exists(Booking.objects.filter(
+                fitness_class=OuterRef('pk'),
+                user=user,
+                status__in=['pending', 'confirmed']
+            ))
+        else:
+            user_has_booking = Value(False)
+
+        return self.select_related(
+            'class_type', 'level', 'instructor', 'instructor__user'
+        ).annotate(
+            class_type_class_count=Coalesce(Subquery(class_type_counts), 0),
+            user_has_booking=user_has_booking,
+        )
+
+
 class FitnessClass(TimestampMixin, models.Model):
+    SEAT_COUNTER_FIELDS = ['confirmed_count', 'pending_count']
+
     class_type = models.ForeignKey(
         ClassType,
         on_delete=models.PROTECT,
@@ -38,13 +86,16 @@ class FitnessClass(TimestampMixin, models.Model):
     is_active = models.BooleanField(default=True)
     is_cancelled = models.BooleanField(default=False)
 
+    # Denormalized seat counters, maintained by BookingService
+    confirmed_count = models.PositiveIntegerField(default=0, editable=False)
+    pending_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = FitnessClassQuerySet.as_manager()
+
     @property
     def available_spots(self):
-        """Get count of available spots"""
-        confirmed_bookings = self.bookings.filter(
-            status__in=['confirmed']
-        ).count()
-        return max(0, self.max_capacity - confirmed_bookings)
+        """Get count of available spots (pending bookings hold a seat)"""
+        return max(0, self.max_capacity - self.confirmed_count - self.pending_count)
 
     @property
     def is_fully_booked(self):
@@ -65,12 +116,12 @@ class FitnessClass(TimestampMixin, models.Model):
     @property
     def confirmed_bookings_count(self):
         """Get count of confirmed bookings"""
-        return self.bookings.filter(status__in=['confirmed', 'attended']).count()
+        return self.confirmed_count
 
     @property
     def pending_bookings_count(self):
         """Get count of pending bookings"""
-        return self.bookings.filter(status='pending').count()
+        return self.pending_count
 
     def get_user_booking(self, user):
         """Get a user's booking for this class if it exists"""
@@ -86,9 +137,32 @@ class FitnessClass(TimestampMixin, models.Model):
             status__in=['pending', 'confirmed']
         ).exists()
 
+    def get_series(self, weeks):
+        """Get this class and its weekly recurrences (same type and time slot)"""
+        return FitnessClass.objects.filter(
+            class_type_id=self.class_type_id,
+            start_time__in=[self.start_time + timedelta(weeks=week) for week in range(weeks)]
+        ).order_by('start_time')
+
     def __str__(self):
         return f"{self.pk} {self.class_type.name}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # Never write back possibly stale in-memory seat counters on update
+        if not adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SEAT_COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+        # Bookings keep a copy of the start time, follow a rescheduled class
+        if not adding:
+            self.bookings.exclude(class_start_time=self.start_time).update(
+                class_start_time=self.start_time
+            )
+
     class Meta:
         db_table = 'fitness_classes'
         verbose_name_plural = 'Fitness Classes'
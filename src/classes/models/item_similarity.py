@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class ItemSimilarity(models.Model):
+    """
+    One of the top-N neighbours of a class type or instructor, by how often
+    the same members book both (rebuilt nightly by build_item_similarities).
+    item_id and neighbour_id are ClassType or Instructor ids depending on kind.
+    """
+    CLASS_TYPE = 'class_type'
+    INSTRUCTOR = 'instructor'
+    KINDS = [
+        (CLASS_TYPE, 'Class type'),
+        (INSTRUCTOR, 'Instructor'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    item_id = models.PositiveIntegerField()
+    neighbour_id = models.PositiveIntegerField()
+    similarity = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'item_similarities'
+        ordering = ['kind', 'item_id', '-similarity']
+        constraints = [
+            # Also the index behind "neighbours of the items a member booked"
+            models.UniqueConstraint(
+                fields=['kind', 'item_id', 'neighbour_id'],
+                name='unique_item_similarity'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.item_id} ~ {self.neighbour_id} ({self.similarity:.2f})"
@@ -0,0 +1,51 @@
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.conf import settings
+
+
+class WaitlistQuerySet(models.QuerySet):
+    def with_positions(self):
+        """Annotate queue_position so a list of entries needs no per-row COUNT"""
+        ahead = Waitlist.objects.filter(
+            fitness_class=OuterRef('fitness_class'),
+            id__lte=OuterRef('id')
+        ).order_by().values('fitness_class').annotate(total=Count('pk')).values('total')
+
+        return self.annotate(queue_position=Coalesce(Subquery(ahead), 1))
+
+
+class Waitlist(models.Model):
+    """A member queued for a seat in a fully booked class (FIFO by id)"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries'
+    )
+    fitness_class = models.ForeignKey(
+        "classes.FitnessClass",
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries'
+    )
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    objects = WaitlistQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'waitlists'
+        unique_together = ['user', 'fitness_class']
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['fitness_class', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.fitness_class} (waitlist)"
+
+    @property
+    def position(self):
+        """1-based place in the queue, answered from the (fitness_class, id) index"""
+        return Waitlist.objects.filter(
+            fitness_class_id=self.fitness_class_id,
+            id__lt=self.id
+        ).count() + 1
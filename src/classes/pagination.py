@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a (timestamp, id) key.
+
+    Unlike offset pagination every page is a single index range scan, so
+    fetching page 500 costs the same as fetching page 1. Both ordering
+    fields must share one direction; id breaks ties between equal timestamps.
+    """
+    ordering = ('class_start_time', 'id')
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        descending = self.ordering[0].startswith('-')
+        time_field, id_field = (field.lstrip('-') for field in self.ordering)
+
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            timestamp, pk = cursor
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{time_field}__{lookup}': timestamp})
+                | Q(**{time_field: timestamp, f'{id_field}__{lookup}': pk})
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        self.next_position = (
+            (self._get_value(rows[-1], time_field), self._get_value(rows[-1], id_field))
+            if self.has_next else None
+        )
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        timestamp, pk = self.next_position
+        encoded = base64.urlsafe_b64encode(
+            json.dumps([timestamp.isoformat(), pk]).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            timestamp, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _get_value(instance, field_path):
+        for attr in field_path.split('__'):
+            instance = getattr(instance, attr)
+        return instance
+
+
+class UpcomingBookingPagination(KeysetPagination):
+    ordering = ('class_start_time', 'id')
+
+
+class BookingHistoryPagination(KeysetPagination):
+    ordering = ('-class_start_time', '-id')
+
+
+class StaffBookingPagination(KeysetPagination):
+    ordering = ('-class_start_time', '-id')
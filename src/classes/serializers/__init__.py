@@ -1,7 +1,9 @@
 from .levels import LevelSerializer
 from .class_types import ClassTypeSerializer
 from .fitness_classes import FitnessClassReadSerializer, FitnessClassWriteSerializer
-from .booking import BookingCreateSerializer, BookingReadSerializer
+from .booking import (BookingCreateSerializer, BookingReadSerializer,
+                      BookingBatchCreateSerializer)
+from .waitlist import WaitlistSerializer
 
 __all__ = [
     "LevelSerializer",
@@ -9,5 +11,7 @@ __all__ = [
     "FitnessClassReadSerializer",
     "FitnessClassWriteSerializer",
     "BookingCreateSerializer",
-    "BookingReadSerializer"
+    "BookingReadSerializer",
+    "BookingBatchCreateSerializer",
+    "WaitlistSerializer"
 ]
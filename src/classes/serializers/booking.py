@@ -49,7 +49,9 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         fitness_class = data['fitness_class']
         user = self.context['request'].user
 
-        if not fitness_class.can_be_booked:
+        # Cheap pre-checks only; the authoritative seat claim happens in create()
+        # and reports a full class as ClassFullError (409)
+        if not fitness_class.is_fully_booked and not fitness_class.can_be_booked:
             raise serializers.ValidationError("This class cannot be booked at the moment.")
 
         if Booking.objects.filter(
@@ -59,11 +61,42 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         ).exists():
             raise serializers.ValidationError("You already have a booking for this class.")
 
-        if fitness_class.is_fully_booked:
-            raise serializers.ValidationError("This class is fully booked.")
-
         return data
 
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
+        from ..services import BookingService
+        return BookingService.create_booking(
+            user=self.context['request'].user,
+            fitness_class=validated_data['fitness_class'],
+        )
+
+
+class BookingBatchCreateSerializer(serializers.Serializer):
+    fitness_class_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+        max_length=52
+    )
+    series_class_id = serializers.PrimaryKeyRelatedField(
+        queryset=FitnessClass.objects.filter(is_active=True),
+        source='series_class',
+        required=False
+    )
+    weeks = serializers.IntegerField(default=4, min_value=1, max_value=26)
+
+    def validate(self, data):
+        has_ids = 'fitness_class_ids' in data
+        has_series = 'series_class' in data
+
+        if has_ids == has_series:
+            raise serializers.ValidationError(
+                "Provide either fitness_class_ids or series_class_id."
+            )
+
+        if has_series:
+            data['fitness_class_ids'] = list(
+                data['series_class'].get_series(data['weeks']).values_list('pk', flat=True)
+            )
+
+        return data
@@ -14,4 +14,6 @@ class ClassTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_class_count(self, obj):
+        if hasattr(obj, 'class_count'):
+            return obj.class_count
         return obj.classes.filter(is_active=True).count()
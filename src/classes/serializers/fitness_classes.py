@@ -79,6 +79,11 @@ class FitnessClassReadSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'class_type_class_count'):
+            instance.class_type.class_count = instance.class_type_class_count
+        return super().to_representation(instance)
+
     def get_is_upcoming(self, obj):
         from django.utils import timezone
         return obj.start_time > timezone.now()
@@ -97,6 +102,9 @@ class FitnessClassReadSerializer(serializers.ModelSerializer):
         return obj.can_be_booked
 
     def get_user_has_booking(self, obj):
+        if hasattr(obj, 'user_has_booking'):
+            return obj.user_has_booking
+
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.is_user_booked(request.user)
@@ -0,0 +1,21 @@
+from rest_framework import serializers
+from ..models import FitnessClass, Waitlist
+
+
+class WaitlistSerializer(serializers.ModelSerializer):
+    fitness_class_id = serializers.PrimaryKeyRelatedField(
+        queryset=FitnessClass.objects.filter(is_active=True, is_cancelled=False),
+        source='fitness_class',
+        write_only=True
+    )
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Waitlist
+        fields = ['id', 'fitness_class', 'fitness_class_id', 'joined_at', 'position']
+        read_only_fields = ['id', 'fitness_class', 'joined_at']
+
+    def get_position(self, obj):
+        if hasattr(obj, 'queue_position'):
+            return obj.queue_position
+        return obj.position
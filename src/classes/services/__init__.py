@@ -1 +1,16 @@
+from .email_renderer import EmailRenderer
 from .email_service import BookingEmailService
+from .outbox_service import EmailOutboxService
+from .reminder_service import ClassReminderService
+from .booking_service import (
+    BookingService,
+    BookingError,
+    ClassFullError,
+    ClassNotBookableError,
+    DuplicateBookingError,
+)
+from .waitlist_service import WaitlistService, WaitlistError
+from .idempotency_service import IdempotencyService, idempotent
+from .attendance_service import AttendanceService
+from .item_similarity_service import ItemSimilarityService
+from .recommendation_engine import ClassRecommendationEngine
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from users.models import FitnessProfile
+from ..models import Booking
+from .booking_service import BookingService
+
+
+class AttendanceService:
+    """Post-class attended / no_show transitions, applied in set-based chunks"""
+
+    OPEN_STATUSES = ['pending', 'confirmed']
+
+    @staticmethod
+    def close_finished_classes(since, now=None, batch_size=1000):
+        """
+        Settle bookings of classes that ended between since and now:
+        confirmed bookings become attended, unconfirmed holds become no_show.
+        Yields (attended, no_show) per chunk.
+        """
+        now = now or timezone.now()
+        finished = Q(
+            fitness_class__end_time__gte=since,
+            fitness_class__end_time__lt=now,
+            fitness_class__is_cancelled=False,
+        )
+
+        for new_status, old_status in (('attended', 'confirmed'), ('no_show', 'pending')):
+            while True:
+                changed = AttendanceService._transition_chunk(
+                    Booking.objects.filter(finished, status=old_status),
+                    new_status,
+                    batch_size
+                )
+                if not changed:
+                    break
+                yield (changed, 0) if new_status == 'attended' else (0, changed)
+
+    @staticmethod
+    def mark_bookings(queryset, new_status, batch_size=1000):
+        """
+        Move the open bookings of queryset to attended/no_show. Bookings of
+        classes that have not started yet are left alone.
+        Returns (changed, not_started).
+        """
+        total = 0
+        queryset = queryset.filter(status__in=AttendanceService.OPEN_STATUSES)
+        not_started = queryset.filter(fitness_class__start_time__gt=timezone.now()).count()
+
+        while True:
+            changed = AttendanceService._transition_chunk(queryset, new_status, batch_size)
+            if not changed:
+                return total, not_started
+            total += changed
+
+    @staticmethod
+    @transaction.atomic
+    def _transition_chunk(queryset, new_status, batch_size):
+        rows = list(
+            # Nobody attends or misses a class before it starts
+            queryset.filter(fitness_class__start_time__lte=timezone.now())
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')
+            .values_list('id', 'user_id', 'fitness_class_id', 'status',
+                         'fitness_class__end_time')[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        Booking.objects.filter(id__in=[row[0] for row in rows]).update(status=new_status)
+
+        BookingService.apply_bulk_counter_deltas(
+            (class_id, old_status, new_status) for _, _, class_id, old_status, _ in rows
+        )
+
+        if new_status == 'attended':
+            AttendanceService._record_workouts(
+                (user_id, timezone.localtime(end_time).date())
+                for _, user_id, _, _, end_time in rows
+            )
+
+        return len(rows)
+
+    @staticmethod
+    def _record_workouts(user_dates):
+        """
+        Bump total_workouts, workout_streak and last_workout_date with
+        F-expressions: one UPDATE per distinct (workout date, workouts) pair.
+        """
+        workouts = defaultdict(int)
+        for user_id, workout_date in user_dates:
+            workouts[(workout_date, user_id)] += 1
+
+        groups = defaultdict(list)
+        for (workout_date, user_id), count in workouts.items():
+            groups[(workout_date, count)].append(user_id)
+
+        for (workout_date, count), user_ids in sorted(groups.items()):
+            FitnessProfile.objects.filter(user_id__in=user_ids).update(
+                total_workouts=F('total_workouts') + count,
+                workout_streak=Case(
+                    When(last_workout_date=workout_date - timedelta(days=1),
+                         then=F('workout_streak') + 1),
+                    When(last_workout_date__gte=workout_date, then=F('workout_streak')),
+                    default=Value(1),
+                    output_field=models.PositiveIntegerField()
+                ),
+                last_workout_date=Case(
+                    When(last_workout_date__gt=workout_date, then=F('last_workout_date')),
+                    default=Value(workout_date),
+                    output_field=models.DateField()
+                ),
+            )
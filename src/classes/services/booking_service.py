@@ -0,0 +1,406 @@
+import secrets
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from users.services.recommendation_snapshots import RecommendationSnapshotService
+from ..models import Booking, FitnessClass, Waitlist
+from .outbox_service import EmailOutboxService
+
+SEAT_COUNTER_FIELDS = {
+    'pending': 'pending_count',
+    'confirmed': 'confirmed_count',
+    'attended': 'confirmed_count',
+}
+
+
+class BookingError(Exception):
+    """Base class for booking rule violations"""
+
+
+class ClassFullError(BookingError):
+    pass
+
+
+class ClassNotBookableError(BookingError):
+    pass
+
+
+class DuplicateBookingError(BookingError):
+    pass
+
+
+class BookingService:
+    """Booking state transitions that keep FitnessClass seat counters in sync"""
+
+    @staticmethod
+    def apply_counter_deltas(fitness_class_id, old_status, new_status):
+        """Move one booking between the counter columns of its class"""
+        old_field = SEAT_COUNTER_FIELDS.get(old_status)
+        new_field = SEAT_COUNTER_FIELDS.get(new_status)
+
+        if old_field == new_field:
+            return
+
+        updates = {}
+        if old_field:
+            updates[old_field] = F(old_field) - 1
+        if new_field:
+            updates[new_field] = F(new_field) + 1
+
+        FitnessClass.objects.filter(pk=fitness_class_id).update(**updates)
+
+    @staticmethod
+    def apply_bulk_counter_deltas(transitions):
+        """
+        Counter bookkeeping for many bookings at once, in a single UPDATE.
+
+        transitions is an iterable of (fitness_class_id, old_status, new_status).
+        """
+        deltas = defaultdict(lambda: defaultdict(int))
+        for fitness_class_id, old_status, new_status in transitions:
+            old_field = SEAT_COUNTER_FIELDS.get(old_status)
+            new_field = SEAT_COUNTER_FIELDS.get(new_status)
+            if old_field == new_field:
+                continue
+            if old_field:
+                deltas[old_field][fitness_class_id] -= 1
+            if new_field:
+                deltas[new_field][fitness_class_id] += 1
+
+        if not deltas:
+            return
+
+        class_ids = {class_id for per_class in deltas.values() for class_id in per_class}
+        FitnessClass.objects.filter(pk__in=class_ids).update(**{
+            field: Case(
+                *[When(pk=class_id, then=F(field) + delta)
+                  for class_id, delta in per_class.items()],
+                default=F(field),
+                output_field=models.PositiveIntegerField()
+            )
+            for field, per_class in deltas.items()
+        })
+
+    @staticmethod
+    def invalidate_recommendations(user_ids, fitness_class_ids):
+        """After members booked the classes: their snapshots, and those showing a class now full"""
+        RecommendationSnapshotService.invalidate(user_ids)
+        RecommendationSnapshotService.invalidate_classes(fitness_class_ids, full_only=True)
+
+    @staticmethod
+    def claim_seat(fitness_class_id):
+        """
+        Atomically take one seat with a single conditional UPDATE.
+
+        The row lock taken by the UPDATE serializes concurrent claims and the
+        WHERE clause is re-evaluated against the committed row, so a class can
+        never be oversold. Returns False when no seat could be claimed.
+        """
+        return FitnessClass.objects.filter(
+            pk=fitness_class_id,
+            is_active=True,
+            is_cancelled=False,
+            start_time__gt=timezone.now() + timedelta(hours=1),
+        ).alias(
+            seats_taken=F('confirmed_count') + F('pending_count')
+        ).filter(
+            seats_taken__lt=F('max_capacity')
+        ).update(pending_count=F('pending_count') + 1) == 1
+
+    @staticmethod
+    def activate_booking(user_id, fitness_class_id):
+        """
+        Create the pending booking for a claimed seat. A cancelled booking of the
+        same class is reused (user/class is unique) and starts over as a new hold:
+        fresh booked_at for the hold expiry, new confirmation token, no reminder sent.
+        Raises IntegrityError when the member has an active booking.
+        """
+        reactivated = Booking.objects.filter(
+            user_id=user_id,
+            fitness_class_id=fitness_class_id,
+            status='cancelled'
+        ).update(
+            status='pending',
+            booked_at=timezone.now(),
+            cancelled_at=None,
+            confirmed_at=None,
+            is_email_confirmed=False,
+            confirmation_token=secrets.token_urlsafe(32),
+            reminder_sent_at=None
+        )
+
+        if reactivated:
+            return Booking.objects.get(user_id=user_id, fitness_class_id=fitness_class_id)
+        return Booking.objects.create(user_id=user_id, fitness_class_id=fitness_class_id)
+
+    @staticmethod
+    def create_booking(user, fitness_class):
+        try:
+            with transaction.atomic():
+                if not BookingService.claim_seat(fitness_class.pk):
+                    fitness_class.refresh_from_db()
+                    if fitness_class.available_spots <= 0:
+                        raise ClassFullError("This class is fully booked.")
+                    raise ClassNotBookableError("This class cannot be booked at the moment.")
+
+                booking = BookingService.activate_booking(user.pk, fitness_class.pk)
+                Waitlist.objects.filter(user=user, fitness_class=fitness_class).delete()
+                EmailOutboxService.enqueue('booking_confirmation', user, booking)
+                BookingService.invalidate_recommendations([user.pk], [fitness_class.pk])
+                return booking
+        except IntegrityError:
+            raise DuplicateBookingError("You already have a booking for this class.")
+
+    @staticmethod
+    def create_bookings(user, fitness_class_ids):
+        """
+        Book several classes at once with a handful of set-based queries.
+
+        Class rows are locked in pk order (so concurrent batches cannot
+        deadlock), seats are claimed for every bookable class with one
+        UPDATE and the bookings are inserted with one bulk_create.
+        Returns (bookings, results) where results maps class id to either
+        the new booking or an error message.
+        """
+        fitness_class_ids = list(dict.fromkeys(fitness_class_ids))
+        results = {}
+
+        with transaction.atomic():
+            classes = {
+                fitness_class.pk: fitness_class
+                for fitness_class in FitnessClass.objects.select_for_update(of=('self',))
+                .select_related('class_type', 'level')
+                .filter(pk__in=fitness_class_ids)
+                .order_by('pk')
+            }
+            existing = dict(
+                Booking.objects.filter(user=user, fitness_class_id__in=classes)
+                .values_list('fitness_class_id', 'status')
+            )
+            already_booked = {
+                class_id for class_id, status in existing.items() if status != 'cancelled'
+            }
+
+            claimable = []
+            for class_id in fitness_class_ids:
+                fitness_class = classes.get(class_id)
+                if fitness_class is None:
+                    results[class_id] = "Class not found."
+                elif class_id in already_booked:
+                    results[class_id] = "You already have a booking for this class."
+                elif fitness_class.is_fully_booked:
+                    results[class_id] = "This class is fully booked."
+                elif not fitness_class.can_be_booked:
+                    results[class_id] = "This class cannot be booked at the moment."
+                else:
+                    claimable.append(class_id)
+
+            FitnessClass.objects.filter(pk__in=claimable).update(
+                pending_count=F('pending_count') + 1
+            )
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    user=user,
+                    fitness_class=classes[class_id],
+                    class_start_time=classes[class_id].start_time,
+                    confirmation_token=secrets.token_urlsafe(32)
+                )
+                for class_id in claimable if class_id not in existing
+            ])
+            # Cancelled bookings of these classes start over as new holds
+            bookings += [
+                BookingService.activate_booking(user.pk, class_id)
+                for class_id in claimable if class_id in existing
+            ]
+            Waitlist.objects.filter(user=user, fitness_class_id__in=claimable).delete()
+
+            if bookings:
+                EmailOutboxService.enqueue(
+                    'batch_booking_confirmation',
+                    user,
+                    payload={'booking_ids': [booking.pk for booking in bookings]}
+                )
+                BookingService.invalidate_recommendations([user.pk], claimable)
+
+        for booking in bookings:
+            results[booking.fitness_class_id] = booking
+
+        return bookings, {class_id: results[class_id] for class_id in fitness_class_ids}
+
+    @staticmethod
+    def _lock_status(booking):
+        """Re-read the booking status under a row lock (sweepers may have moved it)"""
+        return Booking.objects.select_for_update().values_list(
+            'status', flat=True
+        ).get(pk=booking.pk)
+
+    @staticmethod
+    @transaction.atomic
+    def confirm_booking(booking):
+        old_status = BookingService._lock_status(booking)
+        if old_status not in ['pending', 'confirmed']:
+            raise BookingError("This booking is no longer active.")
+
+        booking.is_email_confirmed = True
+        booking.status = 'confirmed'
+        booking.confirmed_at = timezone.now()
+        booking.save()
+
+        BookingService.apply_counter_deltas(booking.fitness_class_id, old_status, booking.status)
+        return booking
+
+    @staticmethod
+    @transaction.atomic
+    def cancel_booking(booking):
+        old_status = BookingService._lock_status(booking)
+        if old_status not in ['pending', 'confirmed']:
+            raise BookingError("This booking cannot be cancelled")
+
+        booking.status = 'cancelled'
+        booking.cancelled_at = timezone.now()
+        booking.save()
+
+        BookingService.apply_counter_deltas(booking.fitness_class_id, old_status, booking.status)
+        EmailOutboxService.enqueue_for_bookings('booking_cancellation', [booking])
+        RecommendationSnapshotService.invalidate([booking.user_id])
+
+        from .waitlist_service import WaitlistService
+        WaitlistService.promote(booking.fitness_class_id)
+        return booking
+
+    @staticmethod
+    @transaction.atomic
+    def cancel_class(fitness_class):
+        """
+        Cancel a class and every active booking on it with set-based queries.
+
+        The class row is flipped first, which locks it: concurrent seat claims
+        wait and then fail on is_cancelled. The per-member emails are fanned out
+        by the outbox worker, so the cost here does not grow with the roster.
+        Returns the number of bookings cancelled.
+        """
+        now = timezone.now()
+
+        # updated_at moves too, so cached renderings of the class are dropped
+        if not FitnessClass.objects.filter(pk=fitness_class.pk, is_cancelled=False).update(
+            is_cancelled=True, updated_at=now
+        ):
+            raise BookingError("This class is already cancelled.")
+
+        cancelled = Booking.objects.filter(
+            fitness_class_id=fitness_class.pk,
+            status__in=['pending', 'confirmed']
+        ).update(status='cancelled', cancelled_at=now)
+
+        attended = (
+            Booking.objects.filter(fitness_class_id=OuterRef('pk'), status='attended')
+            .order_by()
+            .values('fitness_class_id')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        FitnessClass.objects.filter(pk=fitness_class.pk).update(
+            pending_count=0,
+            confirmed_count=Coalesce(Subquery(attended), 0)
+        )
+
+        Waitlist.objects.filter(fitness_class_id=fitness_class.pk).delete()
+        RecommendationSnapshotService.invalidate_classes([fitness_class.pk])
+
+        # The worker finds the roster again by this cancellation's timestamp
+        if cancelled:
+            EmailOutboxService.enqueue(
+                'class_cancellation_fanout',
+                None,
+                payload={'fitness_class_id': fitness_class.pk, 'cancelled_at': now.isoformat()}
+            )
+
+        return cancelled
+
+    @staticmethod
+    def expire_pending_holds(batch_size=1000, now=None):
+        """
+        Cancel pending bookings older than BOOKING_HOLD_TTL_MINUTES.
+
+        Works in short per-batch transactions: lock a batch of expired holds
+        (skipping rows a confirm is touching), flip them with one UPDATE,
+        release the seats with one UPDATE over the affected classes and hand
+        them to waitlisted members. Yields the number of rows expired per batch.
+        """
+        now = now or timezone.now()
+        cutoff = now - timedelta(minutes=settings.BOOKING_HOLD_TTL_MINUTES)
+
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    Booking.objects.select_for_update(skip_locked=True)
+                    .filter(status='pending', booked_at__lt=cutoff)
+                    .order_by('status', 'booked_at')
+                    .values_list('id', 'fitness_class_id', 'user_id')[:batch_size]
+                )
+                if not rows:
+                    return
+
+                ids = [booking_id for booking_id, _, _ in rows]
+                class_ids = [class_id for _, class_id, _ in rows]
+
+                expired = Booking.objects.filter(id__in=ids).update(
+                    status='cancelled',
+                    cancelled_at=now
+                )
+
+                BookingService.apply_bulk_counter_deltas(
+                    (class_id, 'pending', 'cancelled') for class_id in class_ids
+                )
+                RecommendationSnapshotService.invalidate({user_id for _, _, user_id in rows})
+
+                from .waitlist_service import WaitlistService
+                waitlisted_class_ids = (
+                    Waitlist.objects.filter(fitness_class_id__in=set(class_ids))
+                    .order_by()
+                    .values_list('fitness_class_id', flat=True)
+                    .distinct()
+                )
+                for class_id in waitlisted_class_ids:
+                    WaitlistService.promote(class_id)
+
+            yield expired
+
+    @staticmethod
+    def sync_counters(old, booking):
+        """Adjust counters given the pre-edit status/fitness_class_id of a saved booking"""
+        if old and old['fitness_class_id'] != booking.fitness_class_id:
+            BookingService.apply_counter_deltas(old['fitness_class_id'], old['status'], None)
+            BookingService.apply_counter_deltas(booking.fitness_class_id, None, booking.status)
+        else:
+            BookingService.apply_counter_deltas(
+                booking.fitness_class_id, old and old['status'], booking.status
+            )
+
+    @staticmethod
+    @transaction.atomic
+    def save_booking(booking):
+        """Persist an arbitrary edit (e.g. from the admin) and adjust counters"""
+        old = (
+            Booking.objects.select_for_update()
+            .filter(pk=booking.pk)
+            .values('status', 'fitness_class_id')
+            .first()
+        ) if booking.pk else None
+
+        booking.save()
+
+        BookingService.sync_counters(old, booking)
+        BookingService.invalidate_recommendations([booking.user_id], [booking.fitness_class_id])
+        return booking
+
+    @staticmethod
+    @transaction.atomic
+    def delete_booking(booking):
+        BookingService.apply_counter_deltas(booking.fitness_class_id, booking.status, None)
+        booking.delete()
+        RecommendationSnapshotService.invalidate([booking.user_id])
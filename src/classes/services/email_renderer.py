@@ -0,0 +1,78 @@
+import functools
+import threading
+from collections import OrderedDict, namedtuple
+from django.template.loader import get_template
+
+FRAGMENT_CACHE_SIZE = 1024
+
+# A rendered per-class fragment: templates use {{ fragment.text }} or {{ fragment.html }}
+Fragment = namedtuple('Fragment', ['text', 'html'])
+
+
+@functools.lru_cache(maxsize=None)
+def _template(template_name):
+    """Compiled template, looked up once per process"""
+    return get_template(template_name)
+
+
+class EmailRenderer:
+    """
+    Renders the plain-text and html parts of an email from their own templates.
+
+    Class-level fragments (class type, level, instructor, time) are rendered
+    once per FitnessClass and reused for every attendee. They are keyed on
+    the updated_at of the class and of every related row they show, so
+    saving any of them invalidates them.
+    """
+
+    _fragments = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def render(template_name, context):
+        """Returns (text, html) for emails/<template_name>.txt and .html"""
+        return (
+            _template(f'emails/{template_name}.txt').render(context),
+            _template(f'emails/{template_name}.html').render(context),
+        )
+
+    @staticmethod
+    def _fragment_key(fragment_name, fitness_class):
+        instructor = fitness_class.instructor
+        return (
+            fragment_name,
+            fitness_class.pk,
+            fitness_class.updated_at,
+            fitness_class.class_type.updated_at,
+            fitness_class.level.updated_at,
+            instructor and instructor.updated_at,
+            instructor and instructor.user.updated_at,
+        )
+
+    @staticmethod
+    def class_fragment(fragment_name, fitness_class):
+        key = EmailRenderer._fragment_key(fragment_name, fitness_class)
+
+        with EmailRenderer._lock:
+            fragment = EmailRenderer._fragments.get(key)
+            if fragment is not None:
+                EmailRenderer._fragments.move_to_end(key)
+                return fragment
+
+        context = {'fitness_class': fitness_class}
+        fragment = Fragment(
+            _template(f'emails/fragments/{fragment_name}.txt').render(context),
+            _template(f'emails/fragments/{fragment_name}.html').render(context),
+        )
+
+        with EmailRenderer._lock:
+            EmailRenderer._fragments[key] = fragment
+            if len(EmailRenderer._fragments) > FRAGMENT_CACHE_SIZE:
+                EmailRenderer._fragments.popitem(last=False)
+        return fragment
+
+    @staticmethod
+    def clear():
+        with EmailRenderer._lock:
+            EmailRenderer._fragments.clear()
+        _template.cache_clear()
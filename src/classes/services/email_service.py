@@ -1,89 +1,216 @@
 import logging
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
+from .email_renderer import EmailRenderer
 
 logger = logging.getLogger(__name__)
 
 
 class BookingEmailService:
     @staticmethod
-    def send_booking_confirmation_email(booking):
-        try:
-            subject = f"Booking Confirmation - {booking.fitness_class.name}"
-
-            context = {
-                'user': booking.user,
-                'booking': booking,
-                'fitness_class': booking.fitness_class,
-                'confirmation_url': (f"{settings.FRONTEND_URL or 'http://localhost:8000'}"
-                                     "/api/classes/bookings/{booking.id}/confirm/"
-                                     "?token={booking.confirmation_token}"),
-                'cancellation_url': (f"{settings.FRONTEND_URL or 'http://localhost:8000'}"
-                                     "/api/classes/bookings/{booking.id}/cancel"),
-            }
-
-            html_message = render_to_string('emails/booking_confirmation.html', context)
-            plain_message = strip_tags(html_message)
-
-            sent_count = send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[booking.user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
+    def _base_url():
+        return settings.FRONTEND_URL or 'http://localhost:8000'
 
-            logger.info(f"Confirmation email sent to {booking.user.email} for booking {booking.id}")
-            return sent_count > 0
+    @staticmethod
+    def _build_message(subject, template_name, context, recipient, connection=None):
+        text_message, html_message = EmailRenderer.render(template_name, context)
 
-        except Exception as e:
-            logger.error(f"Failed to send confirmation email for booking {booking.id}: {e}")
-            raise
+        message = EmailMultiAlternatives(
+            subject=subject,
+            body=text_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient],
+            connection=connection,
+        )
+        message.attach_alternative(html_message, 'text/html')
+        return message
 
     @staticmethod
-    def send_booking_cancellation_email(booking):
-        subject = f"Booking Cancelled - {booking.fitness_class.class_type.name}"
+    def build_booking_confirmation_email(booking, connection=None):
+        base_url = BookingEmailService._base_url()
 
         context = {
             'user': booking.user,
             'booking': booking,
             'fitness_class': booking.fitness_class,
+            'class_details': EmailRenderer.class_fragment('class_details', booking.fitness_class),
+            'confirmation_url': (f"{base_url}/api/classes/bookings/{booking.id}/confirm/"
+                                 f"?token={booking.confirmation_token}"),
+            'cancellation_url': f"{base_url}/api/classes/bookings/{booking.id}/cancel",
         }
 
-        html_message = render_to_string('emails/booking_cancellation.html', context)
-        plain_message = strip_tags(html_message)
+        return BookingEmailService._build_message(
+            f"Booking Confirmation - {booking.fitness_class.class_type.name}",
+            'booking_confirmation',
+            context,
+            booking.user.email,
+            connection,
+        )
 
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            html_message=html_message,
-            fail_silently=False,
+    @staticmethod
+    def build_batch_booking_confirmation_email(user, bookings, connection=None):
+        base_url = BookingEmailService._base_url()
+
+        context = {
+            'user': user,
+            'items': [
+                {
+                    'booking': booking,
+                    'fitness_class': booking.fitness_class,
+                    'class_summary': EmailRenderer.class_fragment(
+                        'class_summary', booking.fitness_class
+                    ),
+                    'confirmation_url': (f"{base_url}/api/classes/bookings/{booking.id}/confirm/"
+                                         f"?token={booking.confirmation_token}"),
+                }
+                for booking in bookings
+            ],
+        }
+
+        return BookingEmailService._build_message(
+            f"Booking Confirmation - {len(bookings)} classes",
+            'batch_booking_confirmation',
+            context,
+            user.email,
+            connection,
         )
 
     @staticmethod
-    def send_class_reminder_email(booking):
-        """Send reminder 24 hours before class"""
-        subject = f"Class Reminder - {booking.fitness_class.class_type.name}"
+    def build_booking_cancellation_email(booking, connection=None):
+        context = {
+            'user': booking.user,
+            'booking': booking,
+            'fitness_class': booking.fitness_class,
+            'class_details': EmailRenderer.class_fragment('class_details', booking.fitness_class),
+        }
+
+        return BookingEmailService._build_message(
+            f"Booking Cancelled - {booking.fitness_class.class_type.name}",
+            'booking_cancellation',
+            context,
+            booking.user.email,
+            connection,
+        )
 
+    @staticmethod
+    def build_class_cancellation_email(booking, connection=None):
+        """Sent to every member of a class the studio cancelled"""
         context = {
             'user': booking.user,
             'booking': booking,
             'fitness_class': booking.fitness_class,
+            'class_details': EmailRenderer.class_fragment('class_details', booking.fitness_class),
         }
 
-        html_message = render_to_string('emails/class_reminder.html', context)
-        plain_message = strip_tags(html_message)
+        return BookingEmailService._build_message(
+            f"Class Cancelled - {booking.fitness_class.class_type.name}",
+            'class_cancellation',
+            context,
+            booking.user.email,
+            connection,
+        )
 
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[booking.user.email],
-            html_message=html_message,
-            fail_silently=False,
+    @staticmethod
+    def build_class_reminder_email(booking, connection=None):
+        context = {
+            'user': booking.user,
+            'booking': booking,
+            'fitness_class': booking.fitness_class,
+            'class_details': EmailRenderer.class_fragment('class_details', booking.fitness_class),
+        }
+
+        return BookingEmailService._build_message(
+            f"Class Reminder - {booking.fitness_class.class_type.name}",
+            'class_reminder',
+            context,
+            booking.user.email,
+            connection,
         )
+
+    @staticmethod
+    def send_booking_confirmation_email(booking):
+        try:
+            sent_count = BookingEmailService.build_booking_confirmation_email(booking).send()
+
+            logger.info(f"Confirmation email sent to {booking.user.email} for booking {booking.id}")
+            return sent_count > 0
+
+        except Exception as e:
+            logger.error(f"Failed to send confirmation email for booking {booking.id}: {e}")
+            raise
+
+    @staticmethod
+    def send_bulk_confirmation_emails(bookings, chunk_size=None):
+        """
+        Send a confirmation email for every booking in the queryset over one
+        shared SMTP connection, reading chunk_size bookings per query.
+        Every message is sent and accounted for on its own, so one bad
+        address or a dropped connection fails only that message.
+        Returns (sent, failed_booking_ids).
+        """
+        chunk_size = chunk_size or settings.EMAIL_BULK_CHUNK_SIZE
+        bookings = bookings.select_related(
+            'user', 'fitness_class', 'fitness_class__class_type', 'fitness_class__level',
+            'fitness_class__instructor__user',
+        ).order_by('id')
+
+        sent = 0
+        failed = []
+        connection = get_connection(fail_silently=False)
+        BookingEmailService._open_quietly(connection)
+
+        try:
+            for booking in bookings.iterator(chunk_size=chunk_size):
+                try:
+                    BookingEmailService.build_booking_confirmation_email(
+                        booking, connection
+                    ).send()
+                    sent += 1
+                except Exception as e:
+                    logger.error(f"Failed to send confirmation email for booking {booking.id}: {e}")
+                    failed.append(booking.id)
+                    BookingEmailService.reconnect(connection)
+        finally:
+            BookingEmailService._close_quietly(connection)
+
+        logger.info(f"Bulk confirmation emails: {sent} sent, {len(failed)} failed")
+        return sent, failed
+
+    @staticmethod
+    def reconnect(connection):
+        """Replace a connection a failed send may have broken with a fresh session"""
+        BookingEmailService._close_quietly(connection)
+        BookingEmailService._open_quietly(connection)
+
+    @staticmethod
+    def _open_quietly(connection):
+        # If the server is unreachable, each send retries the connect and fails on its own
+        try:
+            connection.open()
+        except Exception as e:
+            logger.warning(f"Could not open SMTP connection: {e}")
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def send_batch_booking_confirmation_email(user, bookings):
+        """Send one consolidated confirmation for several bookings"""
+        message = BookingEmailService.build_batch_booking_confirmation_email(user, bookings)
+        sent_count = message.send()
+
+        logger.info(f"Batch confirmation email sent to {user.email} for {len(bookings)} bookings")
+        return sent_count > 0
+
+    @staticmethod
+    def send_booking_cancellation_email(booking):
+        BookingEmailService.build_booking_cancellation_email(booking).send()
+
+    @staticmethod
+    def send_class_reminder_email(booking):
+        """Send reminder 24 hours before class"""
+        BookingEmailService.build_class_reminder_email(booking).send()
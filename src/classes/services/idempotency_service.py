@@ -0,0 +1,139 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from ..models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class IdempotencyService:
+    """Replay stored responses for retried requests carrying an Idempotency-Key"""
+
+    @staticmethod
+    def cutoff():
+        return timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+    @staticmethod
+    def request_hash(request):
+        data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+        payload = json.dumps(
+            [request.method, data, request.query_params.dict()],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def begin(user, key, scope, request_hash):
+        """
+        Reserve the key. Returns (record, None) when the request should run,
+        or (None, response) when it must not (replay, conflict, misuse).
+
+        Meant to run in the transaction of the request itself (see idempotent),
+        so the reservation only becomes visible together with the stored response.
+        """
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+
+        if record is not None and record.created_at < IdempotencyService.cutoff():
+            record.delete()
+            record = None
+
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=user, key=key, scope=scope, request_hash=request_hash
+                    )
+                return record, None
+            except IntegrityError:
+                # A concurrent request with this key committed first: answer as it did
+                record = IdempotencyKey.objects.filter(user=user, key=key).first()
+                if record is None:
+                    return None, Response(
+                        {'error': 'The original request is still being processed'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+        if record.scope != scope or record.request_hash != request_hash:
+            return None, Response(
+                {'error': 'Idempotency key was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        if record.response_status is None:
+            return None, Response(
+                {'error': 'The original request is still being processed'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        response = Response(record.response_body, status=record.response_status)
+        response['Idempotent-Replayed'] = 'true'
+        return None, response
+
+    @staticmethod
+    def complete(record, response):
+        # Server errors are not stored so the client can retry with the same key
+        if response.status_code >= 500:
+            record.delete()
+            return
+
+        record.response_status = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['response_status', 'response_body'])
+
+    @staticmethod
+    def purge_expired(batch_size=5000):
+        """Delete expired keys in index-ordered chunks, yielding rows deleted per chunk"""
+        cutoff = IdempotencyService.cutoff()
+
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(created_at__lt=cutoff)
+                .order_by('created_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+
+            deleted, _ = IdempotencyKey.objects.filter(id__in=ids).delete()
+            yield deleted
+
+
+def idempotent(scope):
+    """Make a viewset action replay its first response for a repeated Idempotency-Key"""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view_method(self, request, *args, **kwargs)
+
+            if len(key) > 255:
+                return Response(
+                    {'error': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Reservation, work and stored response commit together: a crash or an
+            # exception in between leaves neither behind, so the retry runs again
+            with transaction.atomic():
+                record, response = IdempotencyService.begin(
+                    request.user,
+                    key,
+                    f"{scope}:{kwargs.get('pk', '')}",
+                    IdempotencyService.request_hash(request)
+                )
+                if response is not None:
+                    return response
+
+                response = view_method(self, request, *args, **kwargs)
+                IdempotencyService.complete(record, response)
+            return response
+        return wrapper
+    return decorator
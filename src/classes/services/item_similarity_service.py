@@ -0,0 +1,164 @@
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from ..models import Booking, ItemSimilarity
+
+
+class ItemSimilarityService:
+    """
+    "Members like you" item-item collaborative filtering over booking history.
+
+    The nightly rebuild streams bookings in id-ordered chunks into sparse
+    member x class type and member x instructor count matrices, so memory
+    grows with the number of distinct member/item pairs, not with the number
+    of bookings. Cosine similarities between items are then computed on the
+    (small) item x item co-occurrence matrix and the top N neighbours of each
+    item are stored in ItemSimilarity.
+    """
+
+    INTERACTION_STATUSES = ['confirmed', 'attended']
+
+    # Booking column holding the item of each kind
+    ITEM_COLUMNS = {
+        ItemSimilarity.CLASS_TYPE: 'fitness_class__class_type_id',
+        ItemSimilarity.INSTRUCTOR: 'fitness_class__instructor_id',
+    }
+
+    @staticmethod
+    def interactions(chunk_size=50000):
+        """
+        Yields one int array per chunk of bookings, columns user id followed
+        by the ITEM_COLUMNS ids (0 where a class has no instructor).
+        """
+        columns = list(ItemSimilarityService.ITEM_COLUMNS.values())
+        last_id = 0
+        while True:
+            rows = list(
+                Booking.objects.filter(
+                    status__in=ItemSimilarityService.INTERACTION_STATUSES,
+                    id__gt=last_id,
+                ).order_by('id').values_list('id', 'user_id', *columns)[:chunk_size]
+            )
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield np.array(
+                [[value or 0 for value in row[1:]] for row in rows], dtype=np.int64
+            )
+
+    @staticmethod
+    def interaction_matrices(chunk_size=50000):
+        """Sparse member x item booking counts per kind, and the bookings read"""
+        matrices = dict.fromkeys(ItemSimilarityService.ITEM_COLUMNS)
+        bookings = 0
+
+        for chunk in ItemSimilarityService.interactions(chunk_size):
+            bookings += len(chunk)
+            users = chunk[:, 0]
+            for column, kind in enumerate(matrices, start=1):
+                items = chunk[:, column]
+                known = items > 0
+                counts = sparse.coo_matrix(
+                    (np.ones(known.sum()), (users[known], items[known]))
+                ).tocsr()
+                matrices[kind] = ItemSimilarityService._add(matrices[kind], counts)
+
+        return matrices, bookings
+
+    @staticmethod
+    def _add(total, counts):
+        """Sum of two count matrices, growing to the larger member and item ids"""
+        if total is None:
+            return counts
+        shape = (max(total.shape[0], counts.shape[0]), max(total.shape[1], counts.shape[1]))
+        total.resize(shape)
+        counts.resize(shape)
+        return total + counts
+
+    @staticmethod
+    def similarities(counts, top_n):
+        """
+        (item, neighbour, similarity) for the top_n most similar items of each
+        item. Repeat bookings count with diminishing (log) weight.
+
+        Columns are compacted to the items that were actually booked and the
+        co-occurrence product stays sparse, so memory follows the co-booked
+        pairs, not the largest item id.
+        """
+        interactions = counts.tocoo()
+        item_ids, columns = np.unique(interactions.col, return_inverse=True)
+        weights = sparse.csr_matrix(
+            (np.log1p(interactions.data), (interactions.row, columns)),
+            shape=(counts.shape[0], len(item_ids))
+        )
+
+        co_booked = (weights.T @ weights).tocsr()
+        co_booked.sort_indices()
+        # Every compacted item was booked, so no norm is zero
+        norms = np.sqrt(co_booked.diagonal())
+
+        for column in range(len(item_ids)):
+            start, end = co_booked.indptr[column], co_booked.indptr[column + 1]
+            neighbours = co_booked.indices[start:end]
+            similarity = co_booked.data[start:end] / (norms[column] * norms[neighbours])
+            similarity[neighbours == column] = 0.0
+
+            # Ties go to the lower item id, as neighbours are sorted by column
+            best = np.argsort(-similarity, kind='stable')[:top_n]
+            for neighbour, value in zip(neighbours[best].tolist(), similarity[best].tolist()):
+                if value > 0:
+                    yield int(item_ids[column]), int(item_ids[neighbour]), value
+
+    @staticmethod
+    def rebuild(top_n=20, chunk_size=50000):
+        """Recompute and replace every stored neighbour list. Returns run stats"""
+        computed_at = timezone.now()
+        matrices, bookings = ItemSimilarityService.interaction_matrices(chunk_size)
+
+        rows = []
+        members = 0
+        for kind, counts in matrices.items():
+            if counts is None:
+                continue
+            members = max(members, np.diff(counts.indptr).astype(bool).sum())
+            rows.extend(
+                ItemSimilarity(
+                    kind=kind,
+                    item_id=item,
+                    neighbour_id=neighbour,
+                    similarity=similarity,
+                    computed_at=computed_at,
+                )
+                for item, neighbour, similarity in ItemSimilarityService.similarities(counts, top_n)
+            )
+
+        # Readers keep seeing the previous lists until the new ones are committed
+        with transaction.atomic():
+            ItemSimilarity.objects.all().delete()
+            ItemSimilarity.objects.bulk_create(rows, batch_size=1000)
+
+        return {'bookings': bookings, 'members': int(members), 'similarities': len(rows)}
+
+    @staticmethod
+    def affinities(user_id):
+        """
+        {kind: {item id: summed similarity}} for the neighbours of every item
+        the member booked, in one query over the (kind, item_id) index.
+        """
+        history = Booking.objects.filter(
+            user_id=user_id,
+            status__in=ItemSimilarityService.INTERACTION_STATUSES
+        )
+        booked_items = Q()
+        for kind, column in ItemSimilarityService.ITEM_COLUMNS.items():
+            booked_items |= Q(kind=kind, item_id__in=history.values(column))
+
+        affinities = {kind: {} for kind in ItemSimilarityService.ITEM_COLUMNS}
+        neighbours = ItemSimilarity.objects.filter(booked_items).order_by().values(
+            'kind', 'neighbour_id'
+        ).annotate(score=Sum('similarity'))
+        for row in neighbours:
+            affinities[row['kind']][row['neighbour_id']] = row['score']
+        return affinities
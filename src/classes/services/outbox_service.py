@@ -0,0 +1,197 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from ..models import Booking, EmailOutbox
+from .email_service import BookingEmailService
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed row stays invisible to other workers while being sent
+CLAIM_LEASE = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+class EmailOutboxService:
+    """Transactional outbox for booking emails"""
+
+    @staticmethod
+    def enqueue(kind, user, booking=None, payload=None):
+        """Queue an email; call inside the transaction that made the change"""
+        return EmailOutbox.objects.create(
+            kind=kind,
+            user=user,
+            booking=booking,
+            payload=payload or {},
+            next_attempt_at=timezone.now(),
+        )
+
+    @staticmethod
+    def enqueue_for_bookings(kind, bookings):
+        """Queue one email per booking with a single INSERT"""
+        now = timezone.now()
+        return EmailOutbox.objects.bulk_create([
+            EmailOutbox(
+                kind=kind,
+                user_id=booking.user_id,
+                booking_id=booking.pk,
+                next_attempt_at=now,
+            )
+            for booking in bookings
+        ])
+
+    @staticmethod
+    @transaction.atomic
+    def fan_out(entry, chunk_size=1000):
+        """Expand a class_cancellation_fanout job into one email per cancelled booking"""
+        bookings = Booking.objects.filter(
+            fitness_class_id=entry.payload['fitness_class_id'],
+            status='cancelled',
+            cancelled_at=parse_datetime(entry.payload['cancelled_at'])
+        ).only('id', 'user_id').order_by('id')
+
+        chunk = []
+        for booking in bookings.iterator(chunk_size=chunk_size):
+            chunk.append(booking)
+            if len(chunk) >= chunk_size:
+                EmailOutboxService.enqueue_for_bookings('class_cancellation', chunk)
+                chunk = []
+        EmailOutboxService.enqueue_for_bookings('class_cancellation', chunk)
+
+        EmailOutbox.objects.filter(pk=entry.pk).update(status='sent', sent_at=timezone.now())
+
+    @staticmethod
+    def claim_batch(batch_size):
+        """Lease a batch of due rows so concurrent workers never send the same email"""
+        now = timezone.now()
+
+        with transaction.atomic():
+            ids = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', next_attempt_at__lte=now)
+                .order_by('status', 'next_attempt_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            EmailOutbox.objects.filter(id__in=ids).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + CLAIM_LEASE
+            )
+
+        return list(
+            EmailOutbox.objects.filter(id__in=ids).select_related(
+                'user', 'booking', 'booking__user', 'booking__fitness_class',
+                'booking__fitness_class__class_type', 'booking__fitness_class__level',
+                'booking__fitness_class__instructor__user',
+            ).order_by('id')
+        )
+
+    @staticmethod
+    def build_message(entry, connection=None):
+        if entry.kind == 'booking_confirmation':
+            return BookingEmailService.build_booking_confirmation_email(entry.booking, connection)
+        if entry.kind == 'booking_cancellation':
+            return BookingEmailService.build_booking_cancellation_email(entry.booking, connection)
+        if entry.kind == 'class_reminder':
+            return BookingEmailService.build_class_reminder_email(entry.booking, connection)
+        if entry.kind == 'class_cancellation':
+            return BookingEmailService.build_class_cancellation_email(entry.booking, connection)
+        if entry.kind == 'batch_booking_confirmation':
+            bookings = list(
+                Booking.objects.filter(id__in=entry.payload['booking_ids']).select_related(
+                    'fitness_class', 'fitness_class__class_type', 'fitness_class__level',
+                    'fitness_class__instructor__user',
+                ).order_by('fitness_class__start_time')
+            )
+            return BookingEmailService.build_batch_booking_confirmation_email(
+                entry.user, bookings, connection
+            )
+        raise ValueError(f"Unknown outbox email kind: {entry.kind}")
+
+    @staticmethod
+    def retry_delay(attempts):
+        """Exponential backoff: base, 2x base, 4x base ... capped at an hour"""
+        delay = timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+        return min(delay, MAX_RETRY_DELAY)
+
+    @staticmethod
+    def deliver_batch(batch_size=100):
+        """
+        Send one claimed batch over a single SMTP connection.
+        Returns (sent, retried, dead) or None when nothing was due.
+        """
+        entries = EmailOutboxService.claim_batch(batch_size)
+        if not entries:
+            return None
+
+        sent_ids = []
+        failures = []
+
+        for entry in entries:
+            if entry.kind == 'class_cancellation_fanout':
+                try:
+                    EmailOutboxService.fan_out(entry)
+                except Exception as e:
+                    failures.append((entry, e))
+        entries = [entry for entry in entries if entry.kind != 'class_cancellation_fanout']
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            # Could not even connect: the whole batch is retried later
+            failures.extend((entry, e) for entry in entries)
+        else:
+            try:
+                for entry in entries:
+                    try:
+                        EmailOutboxService.build_message(entry, connection).send()
+                        sent_ids.append(entry.id)
+                    except Exception as e:
+                        failures.append((entry, e))
+            finally:
+                connection.close()
+
+        now = timezone.now()
+        EmailOutbox.objects.filter(id__in=sent_ids).update(
+            status='sent', sent_at=now, last_error=''
+        )
+
+        dead = 0
+        for entry, error in failures:
+            logger.error(
+                f"Failed to send outbox email {entry.id} (attempt {entry.attempts}): {error}"
+            )
+            if entry.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                entry.status = 'dead'
+                dead += 1
+            else:
+                entry.next_attempt_at = now + EmailOutboxService.retry_delay(entry.attempts)
+            entry.last_error = str(error)
+            entry.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+
+        return len(sent_ids), len(failures) - dead, dead
+
+    @staticmethod
+    def purge_sent(batch_size=5000):
+        """
+        Delete sent emails older than EMAIL_OUTBOX_RETENTION_DAYS in
+        index-ordered chunks, yielding rows deleted per chunk. Dead letters
+        are kept for requeueing.
+        """
+        cutoff = timezone.now() - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+
+        while True:
+            ids = list(
+                EmailOutbox.objects.filter(status='sent', sent_at__lt=cutoff)
+                .order_by('status', 'sent_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+
+            deleted, _ = EmailOutbox.objects.filter(id__in=ids).delete()
+            yield deleted
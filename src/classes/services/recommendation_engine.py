@@ -0,0 +1,336 @@
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from ..models import ClassType, FitnessClass, ItemSimilarity, Level
+from .item_similarity_service import ItemSimilarityService
+
+# Class types that serve each primary goal
+GOAL_CLASS_TYPES = {
+    'weight_loss': ['HIIT', 'Cardio', 'Cycling', 'Boxing', 'Zumba'],
+    'muscle_gain': ['Strength Training', 'CrossFit', 'Functional Fitness'],
+    'strength': ['Strength Training', 'CrossFit', 'Boxing'],
+    'endurance': ['Cardio', 'Cycling', 'Running Club', 'HIIT'],
+    'flexibility': ['Yoga', 'Pilates', 'Stretching', 'Barre'],
+    'rehabilitation': ['Pilates', 'Yoga', 'Stretching', 'Meditation'],
+    'general_fitness': ['Circuit Training', 'Bootcamp', 'Cardio', 'Strength Training'],
+    'sports_performance': ['HIIT', 'Strength Training', 'Martial Arts', 'Boxing'],
+}
+
+# Level whose difficulty matches each experience level; ALL_LEVELS suits everyone
+EXPERIENCE_LEVELS = {
+    'beginner': 'Beginner',
+    'intermediate': 'Intermediate',
+    'advanced': 'Advanced',
+}
+ALL_LEVELS = 'All Levels'
+
+TIME_OF_DAY_HOURS = {
+    'early_morning': range(5, 8),
+    'morning': range(5, 12),
+    'afternoon': range(12, 17),
+    'evening': range(17, 22),
+    'night': range(20, 24),
+}
+
+WEIGHTS = {
+    'preferred_type': 3.0,
+    'goal': 2.0,
+    'level': 2.0,
+    'time': 1.0,
+    'duration': 1.0,
+    'popularity': 0.5,
+    'price': 0.5,
+    'soon': 0.5,
+    # Neighbours of what the member booked before (ItemSimilarityService)
+    'similar_types': 2.0,
+    'similar_instructors': 1.0,
+}
+
+# Classes starting sooner than this cannot be booked (FitnessClass.can_be_booked)
+BOOKING_CUTOFF_SECONDS = 3600
+
+
+class ClassFeatures:
+    """
+    Column arrays of the upcoming-class feature matrix, rows sorted by class id.
+    level_order is 0 for ALL_LEVELS and NaN for levels nobody is matched to;
+    instructor is 0 for classes without one.
+    """
+
+    STATIC_COLUMNS = [
+        'class_type', 'instructor', 'level_order', 'hour', 'duration', 'capacity', 'price',
+        'start', 'updated',
+    ]
+
+    def __init__(self, ids, booked, **columns):
+        self.ids = ids
+        self.booked = booked
+        for name in self.STATIC_COLUMNS:
+            setattr(self, name, columns[name])
+        self.hour_index = self.hour.astype(np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.empty(0, dtype=np.int64), np.empty(0),
+            **{name: np.empty(0) for name in cls.STATIC_COLUMNS}
+        )
+
+    @staticmethod
+    def row(fitness_class_values, level_orders):
+        """Static feature row from FitnessClass values (see ClassRecommendationEngine._fetch)"""
+        (pk, class_type_id, instructor_id, level_name, start_time, duration,
+         capacity, price, updated_at) = fitness_class_values
+
+        if level_name == ALL_LEVELS:
+            level_order = 0.0
+        elif level_name in EXPERIENCE_LEVELS.values():
+            level_order = level_orders.get(level_name, np.nan)
+        else:
+            level_order = np.nan
+
+        return (
+            pk, class_type_id, instructor_id or 0, level_order,
+            timezone.localtime(start_time).hour, duration, capacity, float(price),
+            start_time.timestamp(), updated_at.timestamp(),
+        )
+
+
+class ClassRecommendationEngine:
+    """
+    Scores upcoming classes against a fitness profile with NumPy.
+
+    The feature matrix of bookable classes in the next RECOMMENDATION_HORIZON_DAYS
+    is cached per process. Every RECOMMENDATION_REFRESH_SECONDS (or right after
+    a class changes in this process) one narrow query returns the live class
+    ids with their seat counters and updated_at; only new or edited classes are
+    read again, everything else is carried over from the previous matrix.
+    Scores also blend in the member's "members like you" affinities, read
+    per request with one query (ItemSimilarityService.affinities).
+    """
+
+    _lock = threading.Lock()
+    _features = None
+    _type_ids = {}
+    _level_orders = {}
+    _synced_at = None
+    _dirty = True
+
+    @staticmethod
+    def mark_dirty(full=False):
+        """Resync on the next request; full also re-reads unchanged classes"""
+        with ClassRecommendationEngine._lock:
+            ClassRecommendationEngine._dirty = True
+            if full:
+                ClassRecommendationEngine._features = None
+
+    @staticmethod
+    def features():
+        engine = ClassRecommendationEngine
+        with engine._lock:
+            stale = (
+                engine._synced_at is None
+                or time.monotonic() - engine._synced_at >= settings.RECOMMENDATION_REFRESH_SECONDS
+            )
+            if engine._dirty or stale:
+                engine._sync()
+            return engine._features
+
+    @staticmethod
+    def _sync():
+        engine = ClassRecommendationEngine
+        now = timezone.now()
+        previous = engine._features if engine._features is not None else ClassFeatures.empty()
+
+        engine._type_ids = dict(ClassType.objects.values_list('name', 'id'))
+        level_orders = dict(Level.objects.values_list('name', 'difficulty_order'))
+        if level_orders != engine._level_orders:
+            # Level difficulties moved: every row's level_order is suspect
+            previous = ClassFeatures.empty()
+            engine._level_orders = level_orders
+
+        live = list(
+            FitnessClass.objects.filter(
+                is_active=True,
+                is_cancelled=False,
+                start_time__gt=now,
+                start_time__lte=now + timedelta(days=settings.RECOMMENDATION_HORIZON_DAYS),
+            ).order_by('id').values_list('id', 'confirmed_count', 'pending_count', 'updated_at')
+        )
+        live_ids = np.array([row[0] for row in live], dtype=np.int64)
+        live_updated = np.array([row[3].timestamp() for row in live])
+        booked = np.array([row[1] + row[2] for row in live], dtype=np.float64)
+
+        # Rows carried over: same id and same updated_at as in the previous matrix
+        kept = np.zeros(len(live_ids), dtype=bool)
+        positions = np.zeros(len(live_ids), dtype=np.int64)
+        if len(previous):
+            positions = np.minimum(np.searchsorted(previous.ids, live_ids), len(previous) - 1)
+            kept = (
+                (previous.ids[positions] == live_ids)
+                & (previous.updated[positions] == live_updated)
+            )
+
+        fetched = {
+            row[0]: ClassFeatures.row(row, engine._level_orders)
+            for row in engine._fetch(live_ids[~kept].tolist())
+        }
+        # A class deleted between the two queries is skipped until the next sync
+        new = ~kept & np.isin(live_ids, list(fetched))
+        present = kept | new
+        fetched_rows = np.array(
+            [fetched[pk] for pk in live_ids[new].tolist()], dtype=np.float64
+        ).reshape(-1, len(ClassFeatures.STATIC_COLUMNS) + 1)
+
+        columns = {}
+        for i, name in enumerate(ClassFeatures.STATIC_COLUMNS):
+            column = np.empty(len(live_ids))
+            column[kept] = getattr(previous, name)[positions[kept]]
+            column[new] = fetched_rows[:, i + 1]
+            columns[name] = column[present]
+
+        engine._features = ClassFeatures(live_ids[present], booked[present], **columns)
+        engine._synced_at = time.monotonic()
+        engine._dirty = False
+
+    @staticmethod
+    def _fetch(class_ids, chunk_size=2000):
+        for start in range(0, len(class_ids), chunk_size):
+            yield from FitnessClass.objects.filter(
+                pk__in=class_ids[start:start + chunk_size]
+            ).values_list(
+                'id', 'class_type_id', 'instructor_id', 'level__name', 'start_time',
+                'duration_minutes', 'max_capacity', 'price', 'updated_at',
+            )
+
+    @staticmethod
+    def profile_vector(profile, preferred_type_ids, type_ids, level_orders, affinities=None):
+        """
+        What the scores are computed against, from the profile's preferences
+        and the member's ItemSimilarityService.affinities
+        """
+        affinities = affinities or {}
+        hours = np.zeros(24)
+        for time_of_day in profile.preferred_times or []:
+            hours[list(TIME_OF_DAY_HOURS.get(time_of_day, []))] = 1.0
+        if not hours.any():
+            hours[:] = 0.5  # no preference
+
+        return {
+            'preferred_types': np.array(list(preferred_type_ids), dtype=np.int64),
+            'goal_types': np.array([
+                type_ids[name] for name in GOAL_CLASS_TYPES.get(profile.primary_goal, [])
+                if name in type_ids
+            ], dtype=np.int64),
+            'level_order': level_orders.get(
+                EXPERIENCE_LEVELS.get(profile.experience_level), 1
+            ),
+            'hours': hours,
+            'duration': float(profile.preferred_duration_min or 45),
+            'similar_types': ClassRecommendationEngine._lookup_table(
+                affinities.get(ItemSimilarity.CLASS_TYPE)
+            ),
+            'similar_instructors': ClassRecommendationEngine._lookup_table(
+                affinities.get(ItemSimilarity.INSTRUCTOR)
+            ),
+        }
+
+    @staticmethod
+    def _lookup_table(values):
+        """Sorted keys and values scaled to 0..1, for _lookup"""
+        if not values:
+            return np.empty(0), np.empty(0)
+        keys = np.array(sorted(values), dtype=np.float64)
+        scaled = np.array([values[key] for key in sorted(values)], dtype=np.float64)
+        return keys, scaled / max(scaled.max(), 1e-9)
+
+    @staticmethod
+    def _lookup(column, table):
+        """table value of every entry of column, 0 where the table has none"""
+        keys, values = table
+        if not len(keys):
+            return np.zeros(len(column))
+        positions = np.minimum(np.searchsorted(keys, column), len(keys) - 1)
+        return np.where(keys[positions] == column, values[positions], 0.0)
+
+    @staticmethod
+    def score(features, vector, now):
+        """Score of every row; -inf for classes that cannot be recommended"""
+        engine = ClassRecommendationEngine
+        # Harder than the member's level costs more than easier; ALL_LEVELS fits everyone
+        level_gap = features.level_order - vector['level_order']
+        level_fit = np.where(
+            features.level_order == 0,
+            1.0,
+            1.0 - 0.5 * np.abs(level_gap) - 0.5 * (level_gap > 0)
+        )
+
+        duration_fit = 1.0 - np.minimum(
+            np.abs(features.duration - vector['duration']) / vector['duration'], 1.0
+        )
+        max_price = features.price.max() if len(features) else 0
+        price = features.price / max_price if max_price > 0 else np.zeros(len(features))
+        fill = features.booked / np.maximum(features.capacity, 1)
+        days_until = (features.start - now) / 86400
+
+        scores = (
+            WEIGHTS['preferred_type'] * np.isin(features.class_type, vector['preferred_types'])
+            + WEIGHTS['goal'] * np.isin(features.class_type, vector['goal_types'])
+            + WEIGHTS['level'] * level_fit
+            + WEIGHTS['time'] * vector['hours'][features.hour_index]
+            + WEIGHTS['duration'] * duration_fit
+            + WEIGHTS['popularity'] * fill
+            - WEIGHTS['price'] * price
+            + WEIGHTS['soon'] / (1.0 + days_until / 7)
+            + WEIGHTS['similar_types'] * engine._lookup(
+                features.class_type, vector['similar_types']
+            )
+            + WEIGHTS['similar_instructors'] * engine._lookup(
+                features.instructor, vector['similar_instructors']
+            )
+        )
+
+        unavailable = (
+            np.isnan(features.level_order)
+            | (fill >= 1.0)
+            | (features.start <= now + BOOKING_CUTOFF_SECONDS)
+        )
+        scores[unavailable] = -np.inf
+        return scores
+
+    @staticmethod
+    def top_k(scores, k):
+        """Indexes of the k best finite scores, best first"""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return candidates[np.isfinite(scores[candidates])]
+
+    @staticmethod
+    def recommend(profile, k=5, preferred_type_ids=None, affinities=None):
+        """Ids of the k best upcoming classes for the profile, best first"""
+        engine = ClassRecommendationEngine
+        features = engine.features()
+
+        if preferred_type_ids is None:
+            # Served from the prefetch cache when the caller prefetched class types
+            preferred_type_ids = [ct.pk for ct in profile.preferred_class_types.all()]
+        if affinities is None:
+            affinities = ItemSimilarityService.affinities(profile.user_id)
+
+        vector = engine.profile_vector(
+            profile, preferred_type_ids, engine._type_ids, engine._level_orders, affinities
+        )
+        scores = engine.score(features, vector, timezone.now().timestamp())
+        return features.ids[engine.top_k(scores, k)].tolist()
@@ -0,0 +1,108 @@
+import logging
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import Booking
+from .email_service import BookingEmailService
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_LOCK_KEY = zlib.crc32(b'classes.class_reminders')
+
+
+class ClassReminderService:
+    """Reminder emails for confirmed bookings of classes starting soon"""
+
+    @staticmethod
+    def due_bookings(now=None):
+        """Confirmed, not yet reminded bookings of classes starting in the reminder window"""
+        now = now or timezone.now()
+        return Booking.objects.filter(
+            status='confirmed',
+            reminder_sent_at__isnull=True,
+            fitness_class__is_cancelled=False,
+            class_start_time__gt=now,
+            class_start_time__lte=now + timedelta(
+                hours=settings.CLASS_REMINDER_LEAD_HOURS
+            ),
+        )
+
+    @staticmethod
+    @contextmanager
+    def run_lock():
+        """
+        Postgres advisory lock so overlapping runs on several nodes don't
+        compete for the same rows. Yields False when another run holds it.
+        Other backends rely on the row-level claim alone.
+        """
+        if connection.vendor != 'postgresql':
+            yield True
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [ADVISORY_LOCK_KEY])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [ADVISORY_LOCK_KEY])
+
+    @staticmethod
+    def claim_chunk(chunk_size, now, after_id=0):
+        """
+        Mark a chunk of due bookings as reminded before sending, so no other
+        run can pick them up. Returns the claimed ids.
+        """
+        with transaction.atomic():
+            ids = list(
+                ClassReminderService.due_bookings(now)
+                .filter(id__gt=after_id)
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            Booking.objects.filter(id__in=ids).update(reminder_sent_at=now)
+        return ids
+
+    @staticmethod
+    def dispatch(chunk_size=500, now=None):
+        """
+        Send all due reminders over one SMTP connection, chunk by chunk,
+        reconnecting after a failed send so one dropped session fails one reminder.
+        Failed sends are released from the ledger so the next run retries them.
+        Yields (sent, failed) per chunk.
+        """
+        now = now or timezone.now()
+        smtp = get_connection(fail_silently=False)
+        last_id = 0
+
+        with smtp:
+            while True:
+                ids = ClassReminderService.claim_chunk(chunk_size, now, after_id=last_id)
+                if not ids:
+                    return
+                last_id = ids[-1]
+
+                sent, failed_ids = 0, []
+                bookings = Booking.objects.filter(id__in=ids).select_related(
+                    'user', 'fitness_class', 'fitness_class__class_type',
+                    'fitness_class__level', 'fitness_class__instructor__user',
+                ).order_by('id')
+
+                for booking in bookings.iterator(chunk_size=chunk_size):
+                    try:
+                        BookingEmailService.build_class_reminder_email(booking, smtp).send()
+                        sent += 1
+                    except Exception as e:
+                        logger.error(f"Failed to send reminder for booking {booking.id}: {e}")
+                        failed_ids.append(booking.id)
+                        BookingEmailService.reconnect(smtp)
+
+                Booking.objects.filter(id__in=failed_ids).update(reminder_sent_at=None)
+                yield sent, len(failed_ids)
@@ -0,0 +1,81 @@
+from django.db import IntegrityError, transaction
+from ..models import Booking, Waitlist
+from .booking_service import BookingService, BookingError, DuplicateBookingError
+from .outbox_service import EmailOutboxService
+
+
+class WaitlistError(BookingError):
+    pass
+
+
+class WaitlistService:
+    """FIFO waitlist for fully booked classes"""
+
+    @staticmethod
+    def join(user, fitness_class):
+        if not fitness_class.is_fully_booked:
+            raise WaitlistError("This class still has free spots. Book it directly.")
+
+        if fitness_class.is_user_booked(user):
+            raise DuplicateBookingError("You already have a booking for this class.")
+
+        try:
+            with transaction.atomic():
+                entry = Waitlist.objects.create(user=user, fitness_class=fitness_class)
+        except IntegrityError:
+            raise WaitlistError("You are already on the waitlist for this class.")
+
+        # A seat may have been freed between the capacity check and the insert
+        WaitlistService.promote(fitness_class.pk)
+        return entry
+
+    @staticmethod
+    def leave(user, fitness_class):
+        deleted, _ = Waitlist.objects.filter(user=user, fitness_class=fitness_class).delete()
+        return deleted > 0
+
+    @staticmethod
+    def promote(fitness_class_id):
+        """
+        Hand free seats to waitlisted members in FIFO order.
+
+        Meant to run inside the transaction that freed the seat; concurrent
+        promoters skip each other's locked entries and the conditional seat
+        claim keeps the class from being oversold.
+        """
+        promoted = []
+
+        with transaction.atomic():
+            while True:
+                entry = (
+                    Waitlist.objects.select_for_update(skip_locked=True)
+                    .filter(fitness_class_id=fitness_class_id)
+                    .order_by('id')
+                    .first()
+                )
+                if entry is None:
+                    break
+
+                if Booking.objects.filter(
+                    user_id=entry.user_id,
+                    fitness_class_id=fitness_class_id,
+                    status__in=['pending', 'confirmed']
+                ).exists():
+                    entry.delete()
+                    continue
+
+                if not BookingService.claim_seat(fitness_class_id):
+                    break
+
+                promoted.append(
+                    BookingService.activate_booking(entry.user_id, fitness_class_id)
+                )
+                entry.delete()
+
+            EmailOutboxService.enqueue_for_bookings('booking_confirmation', promoted)
+            if promoted:
+                BookingService.invalidate_recommendations(
+                    [booking.user_id for booking in promoted], [fitness_class_id]
+                )
+
+        return promoted
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from users.services.recommendation_snapshots import RecommendationSnapshotService
+from .models import ClassType, FitnessClass, Level
+from .services import ClassRecommendationEngine
+
+
+@receiver([post_save, post_delete], sender=FitnessClass)
+def fitness_class_changed(sender, **kwargs):
+    """Seat counter UPDATEs don't come through here; the periodic resync covers them"""
+    ClassRecommendationEngine.mark_dirty()
+
+
+@receiver([post_save, pre_delete], sender=FitnessClass)
+def suggested_class_changed(sender, instance, created=False, **kwargs):
+    """pre_delete: the snapshots' links to the class are gone after the delete"""
+    if created:
+        return
+    RecommendationSnapshotService.invalidate_classes([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ClassType)
+@receiver([post_save, post_delete], sender=Level)
+def class_catalog_changed(sender, **kwargs):
+    ClassRecommendationEngine.mark_dirty(full=True)
@@ -1,3 +1,1090 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from scipy import sparse
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User, FitnessProfile
+from instructors.models import Instructor
+from .models import (
+    ClassType, Level, FitnessClass, Booking, EmailOutbox, IdempotencyKey, ItemSimilarity,
+    Waitlist
+)
+from .services import (
+    AttendanceService, BookingEmailService, BookingError, BookingService, ClassFullError,
+    ClassRecommendationEngine, ClassReminderService, EmailOutboxService, ItemSimilarityService,
+    WaitlistService
+)
+from .services.email_renderer import EmailRenderer
 
-# Create your tests here.
+
+def create_classes(count, class_type, level):
+    start_time = timezone.now() + timedelta(days=2)
+    return FitnessClass.objects.bulk_create([
+        FitnessClass(
+            class_type=class_type,
+            level=level,
+            start_time=start_time + timedelta(hours=i),
+            end_time=start_time + timedelta(hours=i, minutes=60),
+        )
+        for i in range(count)
+    ])
+
+
+class FitnessClassListQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('member', 'member@example.com', 'password123')
+        self.class_type = ClassType.objects.create(name='Yoga')
+        self.level = Level.objects.create(name='Beginner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertListQueryCount(self, url, class_count, expected_queries):
+        FitnessClass.objects.all().delete()
+        classes = create_classes(class_count, self.class_type, self.level)
+        Booking.objects.create(user=self.user, fitness_class=classes[0])
+
+        with self.assertNumQueries(expected_queries):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_query_count_is_constant(self):
+        # One COUNT for pagination plus one annotated SELECT
+        for class_count in (1, 5, 20):
+            response = self.assertListQueryCount('/api/classes/', class_count, 2)
+            self.assertEqual(len(response.data['results']), class_count)
+
+    def test_upcoming_query_count_is_constant(self):
+        for class_count in (1, 5, 20):
+            response = self.assertListQueryCount('/api/classes/upcoming/', class_count, 1)
+            self.assertEqual(len(response.data), class_count)
+
+    def test_annotations_match_properties(self):
+        classes = create_classes(2, self.class_type, self.level)
+        Booking.objects.create(user=self.user, fitness_class=classes[0])
+
+        response = self.client.get('/api/classes/')
+        first, second = response.data['results']
+
+        self.assertTrue(first['user_has_booking'])
+        self.assertFalse(second['user_has_booking'])
+        self.assertEqual(first['class_type']['class_count'], 2)
+
+
+@override_settings(RECOMMENDATION_REFRESH_SECONDS=0)
+class ClassRecommendationEngineTests(TestCase):
+    def setUp(self):
+        ClassRecommendationEngine.mark_dirty(full=True)
+
+        self.beginner = Level.objects.create(name='Beginner', difficulty_order=1)
+        self.advanced = Level.objects.create(name='Advanced', difficulty_order=3)
+        self.kids = Level.objects.create(name='Kids', difficulty_order=5)
+        self.yoga = ClassType.objects.create(name='Yoga')
+        self.hiit = ClassType.objects.create(name='HIIT')
+        self.meditation = ClassType.objects.create(name='Meditation')
+
+        self.user = User.objects.create_user('scored', 'scored@example.com', 'password123')
+        self.profile = FitnessProfile.objects.create(
+            user=self.user, height_cm=170, weight_kg=70, primary_goal='weight_loss',
+            experience_level='beginner', preferred_times=['evening'], preferred_duration_min=45,
+        )
+        self.profile.preferred_class_types.add(self.yoga)
+
+        # Evenings, two days out
+        self.evening = (timezone.now() + timedelta(days=2)).replace(
+            hour=18, minute=0, second=0, microsecond=0
+        )
+
+    def create_class(self, class_type, level, start_time=None, **fields):
+        start_time = start_time or self.evening
+        return FitnessClass.objects.create(
+            class_type=class_type, level=level, start_time=start_time,
+            end_time=start_time + timedelta(minutes=45), duration_minutes=45, **fields
+        )
+
+    def test_ranks_by_profile_and_skips_unbookable_classes(self):
+        preferred = self.create_class(self.yoga, self.beginner)
+        goal = self.create_class(self.hiit, self.beginner)
+        too_hard = self.create_class(self.meditation, self.advanced)
+        self.create_class(self.yoga, self.kids)
+        self.create_class(self.yoga, self.beginner, confirmed_count=20, max_capacity=20)
+        soon = timezone.now() + timedelta(minutes=30)
+        self.create_class(self.yoga, self.beginner, start_time=soon)
+        self.create_class(self.yoga, self.beginner, is_cancelled=True)
+
+        self.assertEqual(
+            ClassRecommendationEngine.recommend(self.profile, k=10),
+            [preferred.pk, goal.pk, too_hard.pk]
+        )
+        self.assertEqual(ClassRecommendationEngine.recommend(self.profile, k=1), [preferred.pk])
+
+    def test_resync_only_reads_changed_classes(self):
+        classes = create_classes(3, self.yoga, self.beginner)
+        ClassRecommendationEngine.features()
+
+        # Class types, levels, live ids/counters; nothing changed so nothing refetched
+        with self.assertNumQueries(3):
+            self.assertEqual(len(ClassRecommendationEngine.features()), 3)
+
+        FitnessClass.objects.filter(pk=classes[0].pk).update(updated_at=timezone.now())
+        with self.assertNumQueries(4):
+            ClassRecommendationEngine.features()
+
+        # Seat counters are refreshed from the live query alone
+        FitnessClass.objects.filter(pk=classes[1].pk).update(confirmed_count=20)
+        with self.assertNumQueries(3):
+            features = ClassRecommendationEngine.features()
+        self.assertEqual(features.booked.tolist(), [0, 20, 0])
+        self.assertNotIn(classes[1].pk, ClassRecommendationEngine.recommend(self.profile, k=5))
+
+        FitnessClass.objects.filter(pk=classes[2].pk).delete()
+        self.assertEqual(ClassRecommendationEngine.features().ids.tolist(),
+                         [classes[0].pk, classes[1].pk])
+
+    def test_recommendations_endpoint_returns_scored_classes(self):
+        goal = self.create_class(self.hiit, self.beginner)
+        preferred = self.create_class(self.yoga, self.beginner)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/users/profiles/recommendations/')
+        self.assertEqual(
+            [fitness_class['id'] for fitness_class in response.data['suggested_classes']],
+            [preferred.pk, goal.pk]
+        )
+
+
+@override_settings(RECOMMENDATION_REFRESH_SECONDS=0)
+class ItemSimilarityTests(TestCase):
+    def setUp(self):
+        ClassRecommendationEngine.mark_dirty(full=True)
+
+        self.level = Level.objects.create(name='All Levels', difficulty_order=4)
+        self.yoga = ClassType.objects.create(name='Yoga')
+        self.pilates = ClassType.objects.create(name='Pilates')
+        self.barre = ClassType.objects.create(name='Barre')
+        self.boxing = ClassType.objects.create(name='Boxing')
+        coach = User.objects.create_user('coach', 'coach@example.com', 'password123')
+        self.instructor = Instructor.objects.create(user=coach)
+
+        self.members = [
+            User.objects.create_user(f'member{i}', f'member{i}@example.com', 'password123')
+            for i in range(5)
+        ]
+        past = timezone.now() - timedelta(days=10)
+        self.past_classes = {
+            class_type: FitnessClass.objects.create(
+                class_type=class_type, level=self.level, instructor=self.instructor,
+                start_time=past, end_time=past + timedelta(hours=1),
+            )
+            for class_type in (self.yoga, self.pilates, self.barre, self.boxing)
+        }
+
+    def book(self, member, class_type, status='attended'):
+        Booking.objects.create(
+            user=member, fitness_class=self.past_classes[class_type], status=status
+        )
+
+    def neighbours(self, kind, item_id):
+        return list(
+            ItemSimilarity.objects.filter(kind=kind, item_id=item_id)
+            .values_list('neighbour_id', flat=True)
+        )
+
+    def test_rebuild_ranks_items_booked_by_the_same_members(self):
+        for member in self.members[:3]:
+            self.book(member, self.yoga)
+            self.book(member, self.pilates)
+        self.book(self.members[3], self.yoga)
+        self.book(self.members[3], self.barre)
+        self.book(self.members[4], self.boxing)
+        # Cancelled bookings are not interactions
+        self.book(self.members[4], self.yoga, status='cancelled')
+
+        # Chunks smaller than the history exercise the streaming path
+        stats = ItemSimilarityService.rebuild(top_n=2, chunk_size=3)
+
+        self.assertEqual(stats['bookings'], 9)
+        self.assertEqual(stats['members'], 5)
+        self.assertEqual(
+            self.neighbours(ItemSimilarity.CLASS_TYPE, self.yoga.pk),
+            [self.pilates.pk, self.barre.pk]
+        )
+        self.assertEqual(self.neighbours(ItemSimilarity.CLASS_TYPE, self.boxing.pk), [])
+        # A single instructor has no neighbours
+        self.assertEqual(self.neighbours(ItemSimilarity.INSTRUCTOR, self.instructor.pk), [])
+
+        # A rebuild replaces the previous lists
+        ItemSimilarityService.rebuild(top_n=1, chunk_size=3)
+        self.assertEqual(
+            self.neighbours(ItemSimilarity.CLASS_TYPE, self.yoga.pk), [self.pilates.pk]
+        )
+
+    def test_similarities_scale_with_booked_items_not_ids(self):
+        # Dense over the id range this would be a 10^9 x 10^9 matrix
+        far = 10 ** 9
+        counts = sparse.csr_matrix(
+            ([1, 1, 2, 1, 1], ([0, 0, 1, 1, 2], [7, far, 7, far, 9])), shape=(3, far + 1)
+        )
+
+        pairs = list(ItemSimilarityService.similarities(counts, top_n=5))
+
+        expected = (np.log(2) ** 2 + np.log(3) * np.log(2)) / (
+            np.sqrt(np.log(2) ** 2 + np.log(3) ** 2) * np.sqrt(2 * np.log(2) ** 2)
+        )
+        self.assertEqual([(item, neighbour) for item, neighbour, _ in pairs], [(7, far), (far, 7)])
+        for _, _, similarity in pairs:
+            self.assertAlmostEqual(similarity, expected)
+
+    def test_similar_classes_are_blended_into_recommendations(self):
+        for member in self.members[:3]:
+            self.book(member, self.yoga)
+            self.book(member, self.pilates)
+        ItemSimilarityService.rebuild()
+
+        newcomer = User.objects.create_user('newcomer', 'newcomer@example.com', 'password123')
+        self.book(newcomer, self.yoga)
+        profile = FitnessProfile.objects.create(user=newcomer, height_cm=170, weight_kg=70)
+
+        start_time = timezone.now() + timedelta(days=2)
+        boxing, pilates = [
+            FitnessClass.objects.create(
+                class_type=class_type, level=self.level,
+                start_time=start_time, end_time=start_time + timedelta(hours=1),
+            )
+            for class_type in (self.boxing, self.pilates)
+        ]
+
+        with self.assertNumQueries(1):
+            affinities = ItemSimilarityService.affinities(newcomer.pk)
+        self.assertEqual(list(affinities[ItemSimilarity.CLASS_TYPE]), [self.pilates.pk])
+
+        self.assertEqual(
+            ClassRecommendationEngine.recommend(profile, preferred_type_ids=[]),
+            [pilates.pk, boxing.pk]
+        )
+        self.assertEqual(
+            ClassRecommendationEngine.recommend(profile, preferred_type_ids=[], affinities={}),
+            [boxing.pk, pilates.pk]
+        )
+
+
+class BookingServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('member', 'member@example.com', 'password123')
+        self.other = User.objects.create_user('other', 'other@example.com', 'password123')
+        self.fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertCounters(self, pending, confirmed):
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(
+            (self.fitness_class.pending_count, self.fitness_class.confirmed_count),
+            (pending, confirmed)
+        )
+
+    def book(self):
+        return self.client.post(
+            '/api/classes/bookings/', {'fitness_class_id': self.fitness_class.pk}, format='json'
+        )
+
+    def test_full_class_returns_409(self):
+        FitnessClass.objects.filter(pk=self.fitness_class.pk).update(max_capacity=1)
+        BookingService.create_booking(self.other, self.fitness_class)
+
+        response = self.book()
+        self.assertEqual(response.status_code, 409)
+        self.assertCounters(pending=1, confirmed=0)
+        self.assertFalse(Booking.objects.filter(user=self.user).exists())
+
+    def test_stale_instance_cannot_oversell(self):
+        FitnessClass.objects.filter(pk=self.fitness_class.pk).update(max_capacity=1)
+        stale = FitnessClass.objects.get(pk=self.fitness_class.pk)
+        BookingService.create_booking(self.other, self.fitness_class)
+
+        # The in-memory instance still shows a free seat; the conditional UPDATE does not
+        self.assertFalse(stale.is_fully_booked)
+        with self.assertRaises(ClassFullError):
+            BookingService.create_booking(self.user, stale)
+        self.assertCounters(pending=1, confirmed=0)
+
+    def test_counters_follow_confirm_and_cancel(self):
+        booking = BookingService.create_booking(self.user, self.fitness_class)
+        self.assertCounters(pending=1, confirmed=0)
+
+        BookingService.confirm_booking(booking)
+        self.assertCounters(pending=0, confirmed=1)
+
+        BookingService.cancel_booking(booking)
+        self.assertCounters(pending=0, confirmed=0)
+
+    def test_cancel_and_rebook_starts_a_new_hold(self):
+        booking = BookingService.create_booking(self.user, self.fitness_class)
+        BookingService.confirm_booking(booking)
+        BookingService.cancel_booking(booking)
+        Booking.objects.filter(pk=booking.pk).update(
+            booked_at=timezone.now() - timedelta(days=3),
+            reminder_sent_at=timezone.now() - timedelta(days=1)
+        )
+
+        response = self.book()
+        self.assertEqual(response.status_code, 201)
+
+        rebooked = Booking.objects.get(pk=booking.pk)
+        self.assertEqual(response.data['id'], booking.pk)
+        self.assertEqual(rebooked.status, 'pending')
+        self.assertFalse(rebooked.is_email_confirmed)
+        self.assertIsNone(rebooked.cancelled_at)
+        self.assertIsNone(rebooked.confirmed_at)
+        self.assertIsNone(rebooked.reminder_sent_at)
+        self.assertNotEqual(rebooked.confirmation_token, booking.confirmation_token)
+        self.assertGreater(rebooked.booked_at, timezone.now() - timedelta(minutes=1))
+        self.assertCounters(pending=1, confirmed=0)
+
+        # Booking again while the hold is active is still a duplicate
+        self.assertEqual(self.book().status_code, 400)
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.members = [
+            User.objects.create_user(f'queued{i}', f'queued{i}@example.com', 'password123')
+            for i in range(3)
+        ]
+        self.fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        FitnessClass.objects.filter(pk=self.fitness_class.pk).update(max_capacity=1)
+        self.fitness_class.refresh_from_db()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def join(self, user):
+        return self.client_for(user).post(
+            '/api/classes/bookings/join_waitlist/',
+            {'fitness_class_id': self.fitness_class.pk}, format='json'
+        )
+
+    def test_join_only_full_classes_and_list_positions(self):
+        first, second, third = self.members
+        self.assertEqual(self.join(second).status_code, 400)
+
+        BookingService.create_booking(first, self.fitness_class)
+        self.assertEqual(self.join(second).status_code, 201)
+        self.assertEqual(self.join(third).status_code, 201)
+        self.assertEqual(self.join(third).status_code, 400)
+
+        client = self.client_for(third)
+        # Positions are annotated: one query however many entries are listed
+        with self.assertNumQueries(1):
+            response = client.get('/api/classes/bookings/waitlist/')
+        self.assertEqual([entry['position'] for entry in response.data], [2])
+
+    def test_cancel_promotes_first_in_line(self):
+        first, second, third = self.members
+        booking = BookingService.create_booking(first, self.fitness_class)
+        self.join(second)
+        self.join(third)
+
+        BookingService.cancel_booking(booking)
+
+        self.assertEqual(
+            Booking.objects.get(user=second, fitness_class=self.fitness_class).status, 'pending'
+        )
+        self.assertFalse(Booking.objects.filter(user=third).exists())
+        self.assertEqual(
+            list(Waitlist.objects.with_positions().values_list('user', 'queue_position')),
+            [(third.pk, 1)]
+        )
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.pending_count, 1)
+
+    def test_promoted_hold_survives_the_next_sweep(self):
+        first, second, _ = self.members
+        # second booked long ago and cancelled: promotion reuses that row
+        old = BookingService.create_booking(second, self.fitness_class)
+        BookingService.cancel_booking(old)
+        Booking.objects.filter(pk=old.pk).update(
+            booked_at=timezone.now() - timedelta(days=3),
+            reminder_sent_at=timezone.now() - timedelta(days=2)
+        )
+
+        booking = BookingService.create_booking(first, self.fitness_class)
+        self.join(second)
+        BookingService.cancel_booking(booking)
+
+        list(BookingService.expire_pending_holds())
+
+        promoted = Booking.objects.get(pk=old.pk)
+        self.assertEqual(promoted.status, 'pending')
+        self.assertIsNone(promoted.reminder_sent_at)
+        self.assertNotEqual(promoted.confirmation_token, old.confirmation_token)
+
+
+@override_settings(BOOKING_HOLD_TTL_MINUTES=30)
+class ExpirePendingHoldsTests(TestCase):
+    def setUp(self):
+        self.holder = User.objects.create_user('holder', 'holder@example.com', 'password123')
+        self.waiting = User.objects.create_user('waiting', 'waiting@example.com', 'password123')
+        self.fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        FitnessClass.objects.filter(pk=self.fitness_class.pk).update(max_capacity=1)
+        self.fitness_class.refresh_from_db()
+        self.hold = BookingService.create_booking(self.holder, self.fitness_class)
+
+    def age_hold(self, minutes):
+        Booking.objects.filter(pk=self.hold.pk).update(
+            booked_at=timezone.now() - timedelta(minutes=minutes)
+        )
+
+    def test_expired_hold_is_cancelled_and_releases_its_seat(self):
+        self.age_hold(45)
+
+        self.assertEqual(sum(BookingService.expire_pending_holds()), 1)
+
+        self.hold.refresh_from_db()
+        self.assertEqual(self.hold.status, 'cancelled')
+        self.assertIsNotNone(self.hold.cancelled_at)
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.pending_count, 0)
+
+    def test_fresh_and_confirmed_bookings_are_kept(self):
+        self.age_hold(10)
+        self.assertEqual(sum(BookingService.expire_pending_holds()), 0)
+
+        self.age_hold(45)
+        BookingService.confirm_booking(self.hold)
+        self.assertEqual(sum(BookingService.expire_pending_holds()), 0)
+        self.hold.refresh_from_db()
+        self.assertEqual(self.hold.status, 'confirmed')
+
+    def test_expired_seat_goes_to_the_waitlist(self):
+        self.fitness_class.refresh_from_db()
+        WaitlistService.join(self.waiting, self.fitness_class)
+        self.age_hold(45)
+
+        list(BookingService.expire_pending_holds(batch_size=1))
+
+        promoted = Booking.objects.get(user=self.waiting)
+        self.assertEqual(promoted.status, 'pending')
+        self.assertFalse(Waitlist.objects.exists())
+        self.fitness_class.refresh_from_db()
+        self.assertEqual(self.fitness_class.pending_count, 1)
+
+        # The promoted hold is new, so the next sweep leaves it alone
+        self.assertEqual(sum(BookingService.expire_pending_holds()), 0)
+
+
+class BatchBookingTests(TestCase):
+    URL = '/api/classes/bookings/batch/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('batch', 'batch@example.com', 'password123')
+        self.other = User.objects.create_user('rival', 'rival@example.com', 'password123')
+        self.classes = create_classes(
+            3, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, client, class_ids):
+        return client.post(self.URL, {'fitness_class_ids': class_ids}, format='json')
+
+    def results(self, response):
+        return {
+            result['fitness_class_id']: result.get('error', 'booked')
+            for result in response.data['results']
+        }
+
+    def test_partial_failure_books_the_rest(self):
+        free, full, _ = self.classes
+        FitnessClass.objects.filter(pk=full.pk).update(max_capacity=1, pending_count=1)
+
+        response = self.post(self.client, [free.pk, full.pk, 999999, free.pk])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['booked'], 1)
+        # Duplicate ids are booked once and reported once
+        self.assertEqual(self.results(response), {
+            free.pk: 'booked',
+            full.pk: 'This class is fully booked.',
+            999999: 'Class not found.',
+        })
+        self.assertEqual(
+            list(FitnessClass.objects.order_by('pk').values_list('pending_count', flat=True)),
+            [1, 1, 0]
+        )
+
+    def test_nothing_booked_returns_400(self):
+        BookingService.create_booking(self.user, self.classes[0])
+
+        response = self.post(self.client, [self.classes[0].pk, 999999])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['booked'], 0)
+        self.assertEqual(
+            self.results(response)[self.classes[0].pk],
+            'You already have a booking for this class.'
+        )
+
+    def test_capacity_exhausted_by_an_earlier_batch(self):
+        last_seat = self.classes[1]
+        FitnessClass.objects.filter(pk=last_seat.pk).update(max_capacity=1)
+        rival = APIClient()
+        rival.force_authenticate(self.other)
+
+        self.assertEqual(self.post(rival, [last_seat.pk]).status_code, 201)
+        response = self.post(self.client, [c.pk for c in self.classes])
+
+        self.assertEqual(response.data['booked'], 2)
+        self.assertEqual(self.results(response)[last_seat.pk], 'This class is fully booked.')
+        last_seat.refresh_from_db()
+        self.assertEqual(last_seat.pending_count, 1)
+
+    def test_cancelled_bookings_are_rebooked(self):
+        booking = BookingService.create_booking(self.user, self.classes[0])
+        BookingService.cancel_booking(booking)
+
+        response = self.post(self.client, [self.classes[0].pk, self.classes[1].pk])
+
+        self.assertEqual(response.data['booked'], 2)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'pending')
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 2)
+
+
+class IdempotencyTests(TestCase):
+    URL = '/api/classes/bookings/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('retry', 'retry@example.com', 'password123')
+        self.classes = create_classes(
+            2, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, fitness_class, key='key-1'):
+        return self.client.post(
+            self.URL, {'fitness_class_id': fitness_class.pk}, format='json',
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.book(self.classes[0])
+        retry = self.book(self.classes[0])
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_reused_key_with_a_different_body_is_rejected(self):
+        self.book(self.classes[0])
+
+        response = self.book(self.classes[1])
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_request_in_progress_returns_409(self):
+        # What a concurrent duplicate sees before the original has committed its response
+        IdempotencyKey.objects.create(
+            user=self.user, key='key-1', scope='booking-create:',
+            request_hash='in-progress'
+        )
+        with mock.patch(
+            'classes.services.idempotency_service.IdempotencyService.request_hash',
+            return_value='in-progress'
+        ):
+            response = self.book(self.classes[0])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_failed_request_leaves_no_reservation(self):
+        with mock.patch(
+            'classes.services.booking_service.EmailOutboxService.enqueue',
+            side_effect=RuntimeError('crash')
+        ):
+            with self.assertRaises(RuntimeError):
+                self.book(self.classes[0])
+
+        # Neither the booking nor the key survived, so the retry simply runs
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.book(self.classes[0]).status_code, 201)
+
+
+class BookingPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pager', 'pager@example.com', 'password123')
+        start_time = timezone.now() + timedelta(days=2)
+        class_type = ClassType.objects.create(name='Yoga')
+        level = Level.objects.create(name='Beginner')
+        # Same start time everywhere, so only the id orders the pages
+        self.classes = FitnessClass.objects.bulk_create([
+            FitnessClass(
+                class_type=class_type, level=level, start_time=start_time,
+                end_time=start_time + timedelta(hours=1)
+            )
+            for _ in range(3)
+        ])
+        self.bookings = [
+            Booking.objects.create(user=self.user, fitness_class=fitness_class)
+            for fitness_class in self.classes
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upcoming_pages_break_ties_on_id(self):
+        seen = []
+        url = '/api/classes/bookings/upcoming/?page_size=1'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [booking['id'] for booking in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, sorted(booking.pk for booking in self.bookings))
+
+    def test_bad_or_tampered_cursor_is_not_found(self):
+        for cursor in ['not-a-cursor', 'WyJub3QtYS1kYXRlIiwgMV0=']:  # ["not-a-date", 1]
+            response = self.client.get(f'/api/classes/bookings/upcoming/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+    def test_list_keeps_count_and_previous(self):
+        response = self.client.get('/api/classes/bookings/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'count', 'next', 'previous', 'results'})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_staff_list_is_cursor_paginated_newest_first(self):
+        staff = User.objects.create_user(
+            'staff', 'staff@example.com', 'password123', is_staff=True
+        )
+        self.client.force_authenticate(staff)
+
+        seen = []
+        url = '/api/classes/bookings/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(response.data), {'next', 'results'})
+            seen += [booking['id'] for booking in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, sorted((booking.pk for booking in self.bookings), reverse=True))
+
+    def test_rescheduled_class_moves_its_bookings(self):
+        fitness_class = self.classes[0]
+        fitness_class.start_time -= timedelta(days=3)
+        fitness_class.save()
+
+        self.assertEqual(
+            Booking.objects.get(pk=self.bookings[0].pk).class_start_time, fitness_class.start_time
+        )
+        response = self.client.get('/api/classes/bookings/history/')
+        self.assertEqual([b['id'] for b in response.data['results']], [self.bookings[0].pk])
+
+    def test_queryset_update_moves_the_bookings_too(self):
+        moved = self.classes[1:]
+        new_start = timezone.now() - timedelta(days=1)
+        FitnessClass.objects.filter(pk__in=[c.pk for c in moved]).update(start_time=new_start)
+
+        self.assertEqual(
+            list(Booking.objects.order_by('id').values_list('class_start_time', flat=True)),
+            [self.classes[0].start_time, new_start, new_start]
+        )
+
+
+class AttendanceTests(TestCase):
+    def setUp(self):
+        self.class_type = ClassType.objects.create(name='Yoga')
+        self.level = Level.objects.create(name='Beginner')
+        self.users = [
+            User.objects.create_user(f'member{i}', f'member{i}@example.com', 'password123')
+            for i in range(5)
+        ]
+
+    def create_class(self, start_time, status, users):
+        fitness_class = FitnessClass.objects.create(
+            class_type=self.class_type, level=self.level, start_time=start_time,
+            end_time=start_time + timedelta(hours=1),
+            confirmed_count=len(users) if status == 'confirmed' else 0,
+            pending_count=len(users) if status == 'pending' else 0,
+        )
+        for user in users:
+            Booking.objects.create(user=user, fitness_class=fitness_class, status=status)
+        return fitness_class
+
+    def test_finished_classes_settle_in_chunks(self):
+        now = timezone.now()
+        confirmed = self.create_class(now - timedelta(hours=3), 'confirmed', self.users)
+        pending = self.create_class(now - timedelta(hours=5), 'pending', self.users[:3])
+
+        chunks = list(AttendanceService.close_finished_classes(
+            now - timedelta(days=1), batch_size=2
+        ))
+
+        self.assertEqual(chunks, [(2, 0), (2, 0), (1, 0), (0, 2), (0, 1)])
+        confirmed.refresh_from_db()
+        pending.refresh_from_db()
+        # attended bookings still count as confirmed seats, no_show frees the hold
+        self.assertEqual((confirmed.confirmed_count, confirmed.pending_count), (5, 0))
+        self.assertEqual((pending.confirmed_count, pending.pending_count), (0, 0))
+        self.assertEqual(Booking.objects.filter(status='attended').count(), 5)
+        self.assertEqual(Booking.objects.filter(status='no_show').count(), 3)
+
+    def test_classes_that_have_not_started_are_rejected(self):
+        now = timezone.now()
+        self.create_class(now - timedelta(hours=3), 'confirmed', self.users[:2])
+        future = self.create_class(now + timedelta(days=1), 'confirmed', self.users[2:])
+
+        changed, not_started = AttendanceService.mark_bookings(Booking.objects.all(), 'attended')
+
+        self.assertEqual((changed, not_started), (2, 3))
+        self.assertFalse(future.bookings.exclude(status='confirmed').exists())
+
+    def attend(self, days_ago, user):
+        start_time = timezone.localtime().replace(hour=10, minute=0) - timedelta(days=days_ago)
+        fitness_class = self.create_class(start_time, 'confirmed', [user])
+        AttendanceService.mark_bookings(fitness_class.bookings.all(), 'attended')
+
+    def test_streak_grows_on_consecutive_days_and_resets_after_a_gap(self):
+        user = self.users[0]
+        profile = FitnessProfile.objects.create(user=user)
+        today = timezone.localdate()
+
+        self.attend(5, user)
+        self.attend(4, user)
+        profile.refresh_from_db()
+        self.assertEqual((profile.workout_streak, profile.total_workouts), (2, 2))
+
+        # A second class the same day counts as a workout but not as a streak day
+        self.attend(4, user)
+        profile.refresh_from_db()
+        self.assertEqual((profile.workout_streak, profile.total_workouts), (2, 3))
+
+        self.attend(1, user)
+        profile.refresh_from_db()
+        self.assertEqual((profile.workout_streak, profile.total_workouts), (1, 4))
+        self.assertEqual(profile.last_workout_date, today - timedelta(days=1))
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_SECONDS=60,
+                   EMAIL_OUTBOX_RETENTION_DAYS=7)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('inbox', 'inbox@example.com', 'password123')
+        fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        self.booking = Booking.objects.create(user=self.user, fitness_class=fitness_class)
+        self.entry = EmailOutboxService.enqueue('booking_confirmation', self.user, self.booking)
+
+    def test_claimed_rows_are_leased(self):
+        self.assertEqual([e.pk for e in EmailOutboxService.claim_batch(10)], [self.entry.pk])
+        # A second worker sees nothing until the lease runs out
+        self.assertEqual(EmailOutboxService.claim_batch(10), [])
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual([e.pk for e in EmailOutboxService.claim_batch(10)], [self.entry.pk])
+
+    def test_sent_email_is_marked_sent(self):
+        self.assertEqual(EmailOutboxService.deliver_batch(), (1, 0, 0))
+
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_backs_off_then_dead_letters(self):
+        with mock.patch.object(
+            EmailOutboxService, 'build_message', side_effect=RuntimeError('smtp down')
+        ):
+            before = timezone.now()
+            self.assertEqual(EmailOutboxService.deliver_batch(), (0, 1, 0))
+            self.entry.refresh_from_db()
+            self.assertEqual((self.entry.status, self.entry.attempts), ('pending', 1))
+            self.assertGreaterEqual(self.entry.next_attempt_at, before + timedelta(seconds=60))
+            self.assertEqual(self.entry.last_error, 'smtp down')
+
+            # Not due yet, then retried once it is and dead-lettered at the attempt limit
+            self.assertIsNone(EmailOutboxService.deliver_batch())
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(EmailOutboxService.deliver_batch(), (0, 0, 1))
+
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.status, self.entry.attempts), ('dead', 2))
+        self.assertEqual(EmailOutboxService.retry_delay(3), timedelta(seconds=240))
+
+    def test_purge_deletes_only_old_sent_emails(self):
+        now = timezone.now()
+        old = EmailOutboxService.enqueue('booking_confirmation', self.user, self.booking)
+        dead = EmailOutboxService.enqueue('booking_confirmation', self.user, self.booking)
+        EmailOutbox.objects.filter(pk=old.pk).update(
+            status='sent', sent_at=now - timedelta(days=8)
+        )
+        EmailOutbox.objects.filter(pk=dead.pk).update(
+            status='dead', sent_at=now - timedelta(days=8)
+        )
+        EmailOutbox.objects.filter(pk=self.entry.pk).update(
+            status='sent', sent_at=now - timedelta(days=1)
+        )
+
+        self.assertEqual(sum(EmailOutboxService.purge_sent(batch_size=1)), 1)
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('pk', flat=True)), {self.entry.pk, dead.pk}
+        )
+
+
+class CountingEmailBackend(EmailBackend):
+    """locmem backend that counts the SMTP sessions a real backend would open"""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+
+
+class BulkConfirmationEmailTests(TestCase):
+    def setUp(self):
+        fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        self.bookings = [
+            Booking.objects.create(
+                user=User.objects.create_user(name, f'{name}@example.com', 'password123'),
+                fitness_class=fitness_class
+            )
+            for name in ['first', 'bounced', 'last']
+        ]
+
+    def test_failures_are_counted_per_message(self):
+        def send_messages(backend, messages):
+            if messages[0].to == ['bounced@example.com']:
+                raise OSError('mailbox unavailable')
+            mail.outbox.extend(messages)
+            return len(messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True,
+                               side_effect=send_messages):
+            sent, failed = BookingEmailService.send_bulk_confirmation_emails(
+                Booking.objects.all(), chunk_size=2
+            )
+
+        self.assertEqual((sent, failed), (2, [self.bookings[1].pk]))
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['first@example.com', 'last@example.com']
+        )
+
+    @override_settings(EMAIL_BACKEND='classes.tests.CountingEmailBackend')
+    def test_one_connection_is_opened_for_the_whole_run(self):
+        CountingEmailBackend.opened = 0
+
+        sent, failed = BookingEmailService.send_bulk_confirmation_emails(
+            Booking.objects.all(), chunk_size=2
+        )
+
+        self.assertEqual((sent, failed), (3, []))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+
+
+@override_settings(CLASS_REMINDER_LEAD_HOURS=24)
+class ClassReminderTests(TestCase):
+    def setUp(self):
+        start_time = timezone.now() + timedelta(hours=3)
+        soon = FitnessClass.objects.create(
+            class_type=ClassType.objects.create(name='Yoga'),
+            level=Level.objects.create(name='Beginner'),
+            start_time=start_time, end_time=start_time + timedelta(hours=1)
+        )
+        self.bookings = [
+            Booking.objects.create(
+                user=User.objects.create_user(name, f'{name}@example.com', 'password123'),
+                fitness_class=soon, status='confirmed'
+            )
+            for name in ['first', 'bounced']
+        ]
+
+    def test_claim_marks_the_ledger_before_sending(self):
+        now = timezone.now()
+        ids = ClassReminderService.claim_chunk(10, now)
+
+        self.assertEqual(ids, [booking.pk for booking in self.bookings])
+        self.assertEqual(Booking.objects.filter(reminder_sent_at=now).count(), 2)
+        # A concurrent or later run finds nothing left to send
+        self.assertEqual(ClassReminderService.claim_chunk(10, now), [])
+        self.assertEqual(list(ClassReminderService.dispatch()), [])
+
+    def test_failed_send_releases_the_claim(self):
+        def send_messages(backend, messages):
+            if messages[0].to == ['bounced@example.com']:
+                raise OSError('mailbox unavailable')
+            mail.outbox.extend(messages)
+            return len(messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True,
+                               side_effect=send_messages):
+            self.assertEqual(list(ClassReminderService.dispatch()), [(1, 1)])
+
+        sent, bounced = (Booking.objects.get(pk=booking.pk) for booking in self.bookings)
+        self.assertIsNotNone(sent.reminder_sent_at)
+        self.assertIsNone(bounced.reminder_sent_at)
+
+        # The next run retries only the released booking
+        self.assertEqual(list(ClassReminderService.dispatch()), [(1, 0)])
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [['first@example.com'], ['bounced@example.com']]
+        )
+
+    @override_settings(EMAIL_BACKEND='classes.tests.CountingEmailBackend')
+    def test_a_dropped_connection_fails_only_its_own_reminder(self):
+        Booking.objects.create(
+            user=User.objects.create_user('last', 'last@example.com', 'password123'),
+            fitness_class=self.bookings[0].fitness_class, status='confirmed'
+        )
+        CountingEmailBackend.opened = 0
+        calls = []
+
+        def send_messages(backend, messages):
+            calls.append(messages[0].to)
+            if len(calls) == 1:
+                raise OSError('connection reset')
+            mail.outbox.extend(messages)
+            return len(messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True,
+                               side_effect=send_messages):
+            self.assertEqual(list(ClassReminderService.dispatch()), [(2, 1)])
+
+        # The session is replaced after the failure instead of being reused
+        self.assertEqual(CountingEmailBackend.opened, 2)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [['bounced@example.com'], ['last@example.com']]
+        )
+
+
+class EmailRendererTests(TestCase):
+    def setUp(self):
+        EmailRenderer.clear()
+        coach = User.objects.create_user(
+            'coach', 'coach@example.com', 'password123', first_name='Ana', last_name='Coach'
+        )
+        fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        fitness_class.instructor = Instructor.objects.create(user=coach)
+        fitness_class.save()
+        self.class_id = fitness_class.pk
+
+    def fragment(self):
+        fitness_class = FitnessClass.objects.select_related(
+            'class_type', 'level', 'instructor__user'
+        ).get(pk=self.class_id)
+        return EmailRenderer.class_fragment('class_details', fitness_class)
+
+    def test_fragment_is_rendered_once_per_class(self):
+        first = self.fragment()
+
+        self.assertIs(self.fragment(), first)
+        self.assertIn('Class: Yoga', first.text)
+        self.assertIn('Ana Coach', first.text)
+        self.assertIn('<strong>', self.fragment().html)
+
+    def test_saving_a_related_row_invalidates_the_fragment(self):
+        self.fragment()
+
+        class_type = ClassType.objects.get(name='Yoga')
+        class_type.name = 'Power Yoga'
+        class_type.save()
+        self.assertIn('Class: Power Yoga', self.fragment().text)
+
+        coach = User.objects.get(username='coach')
+        coach.first_name = 'Bea'
+        coach.save()
+        self.assertIn('Bea Coach', self.fragment().text)
+
+
+class ClassCancellationFanOutTests(TestCase):
+    def setUp(self):
+        self.fitness_class = create_classes(
+            1, ClassType.objects.create(name='Yoga'), Level.objects.create(name='Beginner')
+        )[0]
+        self.bookings = {
+            status: Booking.objects.create(
+                user=User.objects.create_user(status, f'{status}@example.com', 'password123'),
+                fitness_class=self.fitness_class,
+                status=status
+            )
+            for status in ['pending', 'confirmed', 'cancelled']
+        }
+
+    def test_cancelled_members_get_one_email_each(self):
+        updated_at = self.fitness_class.updated_at
+
+        self.assertEqual(BookingService.cancel_class(self.fitness_class), 2)
+
+        fanout = EmailOutbox.objects.get(kind='class_cancellation_fanout')
+        self.assertEqual(set(fanout.payload), {'fitness_class_id', 'cancelled_at'})
+        self.fitness_class.refresh_from_db()
+        self.assertGreater(self.fitness_class.updated_at, updated_at)
+
+        # The first pass expands the job, the second sends what it queued
+        self.assertEqual(EmailOutboxService.deliver_batch(), (0, 0, 0))
+        self.assertEqual(EmailOutboxService.deliver_batch(), (2, 0, 0))
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['confirmed@example.com', 'pending@example.com']
+        )
+        self.assertEqual(EmailOutbox.objects.exclude(status='sent').count(), 0)
+
+    def test_cancelling_twice_is_rejected(self):
+        BookingService.cancel_class(self.fitness_class)
+
+        with self.assertRaises(BookingError):
+            BookingService.cancel_class(self.fitness_class)
+        self.assertEqual(EmailOutbox.objects.filter(kind='class_cancellation_fanout').count(), 1)
+
+    def test_earlier_cancellations_are_not_notified_again(self):
+        self.bookings['cancelled'].cancelled_at = timezone.now() - timedelta(days=1)
+        self.bookings['cancelled'].save()
+        BookingService.cancel_class(self.fitness_class)
+
+        EmailOutboxService.deliver_batch()
+        self.assertEqual(
+            sorted(EmailOutbox.objects.filter(kind='class_cancellation')
+                   .values_list('booking_id', flat=True)),
+            [self.bookings['pending'].pk, self.bookings['confirmed'].pk]
+        )
+
+    def test_only_staff_can_cancel_a_class(self):
+        client = APIClient()
+        url = f'/api/classes/{self.fitness_class.pk}/cancel/'
+
+        client.force_authenticate(self.bookings['pending'].user)
+        self.assertEqual(client.post(url).status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(
+            'staff', 'staff@example.com', 'password123', is_staff=True
+        ))
+        response = client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bookings_cancelled'], 2)
@@ -2,13 +2,29 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from rest_framework.settings import api_settings
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
-from ..models import Booking
+from ..models import Booking, FitnessClass, Waitlist
+from ..pagination import (
+    BookingHistoryPagination,
+    StaffBookingPagination,
+    UpcomingBookingPagination,
+)
 from ..serializers import (
     BookingReadSerializer,
     BookingCreateSerializer,
+    BookingBatchCreateSerializer,
+    WaitlistSerializer,
+)
+from ..services import (
+    BookingService,
+    BookingError,
+    ClassFullError,
+    WaitlistService,
+    idempotent,
 )
-from ..services import BookingEmailService
 
 
 class BookingViewSet(viewsets.ModelViewSet):
@@ -18,49 +34,106 @@ class BookingViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
 
+        # The annotated prefetch lets the nested class serializer render without per-row queries
+        queryset = Booking.objects.select_related('user').prefetch_related(
+            Prefetch('fitness_class', queryset=FitnessClass.objects.with_booking_stats(user))
+        )
+
         if user.is_staff:
-            return Booking.objects.select_related(
-                'user', 'fitness_class', 'fitness_class__class_type',
-                'fitness_class__level', 'fitness_class__instructor'
-            ).all()
+            return queryset.all()
         else:
-            return Booking.objects.select_related(
-                'user', 'fitness_class', 'fitness_class__class_type',
-                'fitness_class__level', 'fitness_class__instructor'
-            ).filter(user=user)
+            return queryset.filter(user=user)
+
+    @property
+    def pagination_class(self):
+        # Staff list every booking: keyset pages avoid COUNT and OFFSET on the largest table
+        if self.action == 'list' and self.request.user.is_staff:
+            return StaffBookingPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
 
     def get_serializer_class(self):
         if self.action == 'create':
             return BookingCreateSerializer
+        if self.action == 'batch':
+            return BookingBatchCreateSerializer
+        if self.action in ['waitlist', 'join_waitlist', 'leave_waitlist']:
+            return WaitlistSerializer
         return BookingReadSerializer
 
+    @idempotent('booking-create')
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        booking = serializer.save()
-
-        email_sent = False
         try:
-            BookingEmailService.send_booking_confirmation_email(booking)
-            email_sent = True
-        except Exception as e:
-            print(f"Failed to send confirmation email: {e}")
+            booking = serializer.save()
+        except ClassFullError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except BookingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         read_serializer = BookingReadSerializer(
             booking,
             context={'request': request}
         )
 
+        # The confirmation email was queued in the booking transaction (see send_outbox)
         response_data = read_serializer.data
-        response_data['email_sent'] = email_sent
-
-        if not email_sent:
-            response_data['email_warning'] = 'Email not sent. Use confirmation link below.'
+        response_data['email_queued'] = True
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = {
+            'status': serializer.instance.status,
+            'fitness_class_id': serializer.instance.fitness_class_id,
+        }
+        booking = serializer.save()
+        BookingService.sync_counters(old, booking)
+
+    def perform_destroy(self, instance):
+        BookingService.delete_booking(instance)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Book several classes (a list of ids or a weekly series) in one request"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        bookings, results = BookingService.create_bookings(
+            request.user,
+            serializer.validated_data['fitness_class_ids']
+        )
+
+        response_data = {
+            'booked': len(bookings),
+            'email_queued': bool(bookings),
+            'results': [
+                {
+                    'fitness_class_id': class_id,
+                    'success': True,
+                    'booking_id': result.id,
+                    'confirmation_link': request.build_absolute_uri(
+                        f'/api/classes/bookings/{result.id}/confirm/'
+                        f'?token={result.confirmation_token}'
+                    ),
+                } if isinstance(result, Booking) else {
+                    'fitness_class_id': class_id,
+                    'success': False,
+                    'error': result,
+                }
+                for class_id, result in results.items()
+            ],
+        }
+
+        return Response(
+            response_data,
+            status=status.HTTP_201_CREATED if bookings else status.HTTP_400_BAD_REQUEST
+        )
+
     @action(detail=True, methods=['post', 'get'])
+    @idempotent('booking-confirm')
     def confirm(self, request, pk=None):
         """Confirm booking via email link (supports GET and POST)"""
         booking = self.get_object()
@@ -88,10 +161,10 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        booking.is_email_confirmed = True
-        booking.status = 'confirmed'
-        booking.confirmed_at = timezone.now()
-        booking.save()
+        try:
+            BookingService.confirm_booking(booking)
+        except BookingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
             'success': True,
@@ -100,6 +173,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=True, methods=['post'])
+    @idempotent('booking-cancel')
     def cancel(self, request, pk=None):
         """Cancel a booking"""
         booking = self.get_object()
@@ -116,14 +190,10 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        booking.status = 'cancelled'
-        booking.cancelled_at = timezone.now()
-        booking.save()
-
         try:
-            BookingEmailService.send_booking_cancellation_email(booking)
-        except Exception as e:
-            print(f"Failed to send cancellation email: {e}")
+            BookingService.cancel_booking(booking)
+        except BookingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(booking)
         return Response(serializer.data)
@@ -132,19 +202,65 @@ class BookingViewSet(viewsets.ModelViewSet):
     def upcoming(self, request):
         """Get user's upcoming bookings"""
         queryset = self.get_queryset().filter(
-            fitness_class__start_time__gt=timezone.now(),
+            class_start_time__gt=timezone.now(),
             status__in=['pending', 'confirmed']
-        ).order_by('fitness_class__start_time')
+        )
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        paginator = UpcomingBookingPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Get user's booking history"""
         queryset = self.get_queryset().filter(
-            fitness_class__start_time__lt=timezone.now()
-        ).order_by('-fitness_class__start_time')
+            class_start_time__lt=timezone.now()
+        )
+
+        paginator = BookingHistoryPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(queryset, many=True)
+    @action(detail=False, methods=['get'])
+    def waitlist(self, request):
+        """Get user's waitlist entries with their queue positions"""
+        entries = Waitlist.objects.filter(user=request.user).with_positions().order_by('id')
+        serializer = self.get_serializer(entries, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def join_waitlist(self, request):
+        """Join the waitlist of a fully booked class"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fitness_class = serializer.validated_data['fitness_class']
+
+        try:
+            entry = WaitlistService.join(request.user, fitness_class)
+        except BookingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not Waitlist.objects.filter(pk=entry.pk).exists():
+            booking = Booking.objects.get(user=request.user, fitness_class=fitness_class)
+            return Response({
+                'promoted': True,
+                'booking': BookingReadSerializer(booking, context={'request': request}).data
+            }, status=status.HTTP_201_CREATED)
+
+        return Response(self.get_serializer(entry).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def leave_waitlist(self, request):
+        """Leave the waitlist of a class"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if not WaitlistService.leave(request.user, serializer.validated_data['fitness_class']):
+            return Response(
+                {'error': 'You are not on the waitlist for this class'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,4 +1,5 @@
 from rest_framework import viewsets, permissions
+from django.db.models import Count, Q
 from ..models import ClassType
 from ..serializers import ClassTypeSerializer
 
@@ -9,7 +10,9 @@ class ClassTypeViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
-        queryset = ClassType.objects.all()
+        queryset = ClassType.objects.annotate(
+            class_count=Count('classes', filter=Q(classes__is_active=True))
+        )
 
         is_active = self.request.query_params.get('is_active', None)
         if is_active and is_active.lower() == 'true':
@@ -6,6 +6,7 @@ from ..filters import FitnessClassFilter
 from ..models import FitnessClass
 from ..serializers import (FitnessClassWriteSerializer,
                            FitnessClassReadSerializer)
+from ..services import BookingService, BookingError
 
 
 class FitnessClassViewSet(viewsets.ModelViewSet):
@@ -17,22 +18,30 @@ class FitnessClassViewSet(viewsets.ModelViewSet):
     ordering_fields = ['start_time', 'price', 'level']
     ordering = ['start_time']
 
+    def get_queryset(self):
+        return FitnessClass.objects.with_booking_stats(self.request.user)
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return FitnessClassWriteSerializer
         return FitnessClassReadSerializer
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def cancel(self, request, pk=None):
         """
-        Cancel a fitness class
+        Cancel a fitness class and all of its active bookings.
+        Members are notified in the background (see send_outbox).
         """
         fitness_class = self.get_object()
-        fitness_class.is_cancelled = True
-        fitness_class.save()
 
-        serializer = self.get_serializer(fitness_class)
-        return Response(serializer.data)
+        try:
+            cancelled = BookingService.cancel_class(fitness_class)
+        except BookingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_data = self.get_serializer(self.get_object()).data
+        response_data['bookings_cancelled'] = cancelled
+        return Response(response_data)
 
     @action(detail=True, methods=['post'])
     def assign_instructor(self, request, pk=None):
@@ -28,6 +28,13 @@ SECRET_KEY = env('SECRET_KEY', default='<SECRET_KEY>')
 
 OPENAI_API_KEY = env('OPENAI_API_KEY', default='<OPEN_API_KEY>')
 ANTHROPIC_API_KEY = env('ANTHROPIC_API_KEY', default='<ANTHROPIC_API_KEY>')
+ANTHROPIC_BASE_URL = env('ANTHROPIC_BASE_URL', default='')
+LLM_TIMEOUT_SECONDS = env.float('LLM_TIMEOUT_SECONDS', default=20)
+LLM_MAX_RETRIES = env.int('LLM_MAX_RETRIES', default=2)
+LLM_RETRY_BASE_SECONDS = env.float('LLM_RETRY_BASE_SECONDS', default=0.5)
+LLM_SLOW_CALL_SECONDS = env.float('LLM_SLOW_CALL_SECONDS', default=15)
+LLM_BREAKER_FAILURE_THRESHOLD = env.int('LLM_BREAKER_FAILURE_THRESHOLD', default=5)
+LLM_BREAKER_RESET_SECONDS = env.int('LLM_BREAKER_RESET_SECONDS', default=30)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env.bool('DEBUG', default=True)
@@ -43,6 +50,33 @@ EMAIL_USE_TLS = env('EMAIL_USE_TLS', default=True)
 EMAIL_HOST_USER = env('EMAIL_HOST_USER', default='<EMAIL_HOST_USER>')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='<EMAIL_HOST_PASSWORD>')
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='<DEFAULT_FROM_EMAIL>')
+EMAIL_BULK_CHUNK_SIZE = env.int('EMAIL_BULK_CHUNK_SIZE', default=100)
+
+# Bookings
+
+BOOKING_HOLD_TTL_MINUTES = env.int('BOOKING_HOLD_TTL_MINUTES', default=30)
+IDEMPOTENCY_KEY_TTL_HOURS = env.int('IDEMPOTENCY_KEY_TTL_HOURS', default=24)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5)
+EMAIL_OUTBOX_RETRY_SECONDS = env.int('EMAIL_OUTBOX_RETRY_SECONDS', default=60)
+EMAIL_OUTBOX_RETENTION_DAYS = env.int('EMAIL_OUTBOX_RETENTION_DAYS', default=7)
+CLASS_REMINDER_LEAD_HOURS = env.int('CLASS_REMINDER_LEAD_HOURS', default=24)
+
+# Class recommendations: per-process feature matrix of classes starting within the horizon
+RECOMMENDATION_HORIZON_DAYS = env.int('RECOMMENDATION_HORIZON_DAYS', default=28)
+RECOMMENDATION_REFRESH_SECONDS = env.int('RECOMMENDATION_REFRESH_SECONDS', default=30)
+# Per-member snapshots of the recommendations response; members who read theirs
+# within the hot window are refreshed in the background
+RECOMMENDATION_SNAPSHOT_TTL_SECONDS = env.int('RECOMMENDATION_SNAPSHOT_TTL_SECONDS', default=900)
+RECOMMENDATION_HOT_MEMBER_HOURS = env.int('RECOMMENDATION_HOT_MEMBER_HOURS', default=24)
+
+# Workout plans
+
+# Threads generating plans per web process; 0 runs jobs inline after the request commits
+WORKOUT_PLAN_WORKERS = env.int('WORKOUT_PLAN_WORKERS', default=4)
+WORKOUT_PLAN_JOB_TIMEOUT_SECONDS = env.int('WORKOUT_PLAN_JOB_TIMEOUT_SECONDS', default=300)
+# Nightly pre-generation (pregenerate_workout_plans): 'anthropic', or 'local' to benchmark
+WORKOUT_PLAN_BATCH_BACKEND = env('WORKOUT_PLAN_BATCH_BACKEND', default='anthropic')
+WORKOUT_PLAN_BATCH_WORKERS = env.int('WORKOUT_PLAN_BATCH_WORKERS', default=8)
 
 # Application definition
 
@@ -115,6 +149,32 @@ TEMPLATES = [
 WSGI_APPLICATION = 'fitness.wsgi.application'
 
 
+# Caches
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'workout_plans': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'workout-plans',
+        'TIMEOUT': env.int('WORKOUT_PLAN_CACHE_TTL_SECONDS', default=60 * 60 * 24),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('WORKOUT_PLAN_CACHE_MAX_ENTRIES', default=1000),
+        },
+    },
+}
+
+# redis://... shares generated plans between all workers instead of one cache per process
+WORKOUT_PLAN_CACHE_URL = env('WORKOUT_PLAN_CACHE_URL', default='')
+if WORKOUT_PLAN_CACHE_URL:
+    CACHES['workout_plans'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': WORKOUT_PLAN_CACHE_URL,
+        'TIMEOUT': CACHES['workout_plans']['TIMEOUT'],
+    }
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from users.services import WorkoutPlanBatchService, get_plan_backend
+from users.services.plan_backends import PLAN_BACKENDS
+from users.services.workout_plan_cache import MAX_PLAN_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate workout plans for active members whose profile changed since their plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            choices=sorted(PLAN_BACKENDS),
+            default=settings.WORKOUT_PLAN_BATCH_BACKEND,
+            help='Plan generator; "local" is deterministic, runs offline and stores nothing'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Plan length in days'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.WORKOUT_PLAN_BATCH_WORKERS,
+            help='Concurrent generations'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Profiles generated and written per chunk'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after this many profiles'
+        )
+        parser.add_argument(
+            '--simulate-latency-ms',
+            type=int,
+            default=0,
+            help='Local backend only: average simulated generation latency'
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options['days'] <= MAX_PLAN_DAYS:
+            raise CommandError(f'--days must be between 1 and {MAX_PLAN_DAYS}')
+
+        backend_options = {}
+        if options['backend'] == 'local':
+            backend_options['latency_ms'] = options['simulate_latency_ms']
+
+        stats = WorkoutPlanBatchService.run(
+            get_plan_backend(options['backend'], **backend_options),
+            days=options['days'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            limit=options['limit'],
+        )
+
+        if not stats['stored']:
+            self.stdout.write(self.style.WARNING(
+                f"{options['backend']} backend: plans were generated but not stored"
+            ))
+        if stats['stopped_early']:
+            self.stdout.write(self.style.WARNING('LLM provider unavailable, stopped early'))
+
+        p95 = stats['p95_latency_seconds']
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {stats['generated']} workout plans ({stats['failed']} failed) "
+            f"in {stats['seconds']:.2f}s with {options['workers']} workers: "
+            f"{stats['plans_per_minute']:.0f} plans/min, p95 latency "
+            f"{p95 * 1000 if p95 is not None else 0:.0f}ms"
+        ))
@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from users.services import RecommendationSnapshotService
+
+
+class Command(BaseCommand):
+    help = 'Recompute invalidated or expiring recommendation snapshots of recently active members'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lead-seconds',
+            type=int,
+            default=60,
+            help='Also refresh snapshots expiring within this many seconds'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of snapshots refreshed per pass'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep refreshing instead of exiting after one pass'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds to sleep between passes when --loop is set'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed, dropped = RecommendationSnapshotService.refresh_hot(
+                lead_seconds=options['lead_seconds'], limit=options['limit']
+            )
+            if refreshed or dropped:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Refreshed {refreshed} snapshots, dropped {dropped} of incomplete profiles'
+                ))
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_workoutplanjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('days', models.PositiveSmallIntegerField()),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('plan', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_plans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'workout_plans',
+                'ordering': ['-version'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'version'), name='unique_workout_plan_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_workoutplan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreferenceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('old', models.JSONField()),
+                ('new', models.JSONField()),
+                ('reason', models.CharField(default='user_update', max_length=50)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='preference_changes', to='users.fitnessprofile')),
+            ],
+            options={
+                'db_table': 'profile_preference_changes',
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['profile', 'timestamp'], name='preference_change_profile_ts')],
+            },
+        ),
+    ]
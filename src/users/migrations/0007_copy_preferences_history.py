@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:50
+
+from datetime import datetime
+from itertools import groupby
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def parse_timestamp(value):
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return timezone.make_aware(timestamp) if timezone.is_naive(timestamp) else timestamp
+
+
+def copy_preferences_history(apps, schema_editor):
+    """Stream the JSON arrays out into preference change rows, BATCH_SIZE rows per INSERT"""
+    FitnessProfile = apps.get_model('users', 'FitnessProfile')
+    PreferenceChange = apps.get_model('users', 'PreferenceChange')
+
+    profiles = FitnessProfile.objects.exclude(preferences_history=[]).only(
+        'id', 'preferences_history', 'updated_at'
+    ).order_by('pk')
+
+    batch = []
+    for profile in profiles.iterator(chunk_size=BATCH_SIZE):
+        for entry in profile.preferences_history or []:
+            if not isinstance(entry, dict):
+                continue
+            batch.append(PreferenceChange(
+                profile_id=profile.pk,
+                timestamp=parse_timestamp(entry.get('timestamp')) or profile.updated_at,
+                old=entry.get('old') or {},
+                new=entry.get('new') or {},
+                reason=str(entry.get('reason') or 'user_update')[:50],
+            ))
+
+        if len(batch) >= BATCH_SIZE:
+            PreferenceChange.objects.bulk_create(batch)
+            batch = []
+
+    PreferenceChange.objects.bulk_create(batch)
+
+
+def restore_preferences_history(apps, schema_editor):
+    FitnessProfile = apps.get_model('users', 'FitnessProfile')
+    PreferenceChange = apps.get_model('users', 'PreferenceChange')
+
+    changes = PreferenceChange.objects.order_by('profile_id', 'timestamp', 'id')
+    for profile_id, profile_changes in groupby(
+        changes.iterator(chunk_size=BATCH_SIZE), key=lambda change: change.profile_id
+    ):
+        FitnessProfile.objects.filter(pk=profile_id).update(preferences_history=[
+            {
+                'timestamp': change.timestamp.isoformat(),
+                'old': change.old,
+                'new': change.new,
+                'reason': change.reason,
+            }
+            for change in profile_changes
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_preferencechange'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_preferences_history, restore_preferences_history),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_copy_preferences_history'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='fitnessprofile',
+            name='preferences_history',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0012_itemsimilarity'),
+        ('users', '0008_remove_fitnessprofile_preferences_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationSnapshot',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('payload', models.BinaryField()),
+                ('computed_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('invalidated_at', models.DateTimeField(blank=True, null=True)),
+                ('served_at', models.DateTimeField(db_index=True)),
+                ('suggested_classes', models.ManyToManyField(blank=True, related_name='+', to='classes.fitnessclass')),
+            ],
+            options={
+                'db_table': 'recommendation_snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_recommendationsnapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='workoutplanjob',
+            name='one_active_workout_plan_job_per_user',
+        ),
+        migrations.AddConstraint(
+            model_name='workoutplanjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('user', 'days'), name='one_active_workout_plan_job_per_user_and_days'),
+        ),
+    ]
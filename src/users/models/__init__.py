@@ -1,2 +1,6 @@
 from .fitness_profile import FitnessProfile
 from .users import User
+from .workout_plan_job import WorkoutPlanJob
+from .workout_plan import WorkoutPlan
+from .preference_change import PreferenceChange
+from .recommendation_snapshot import RecommendationSnapshot
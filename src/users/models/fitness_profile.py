@@ -1,3 +1,4 @@
+import copy
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -98,10 +99,6 @@ class FitnessProfile(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(7)]
     )
 
-    preferences_history = models.JSONField(
-        default=list,
-        help_text="Historical preferences and adjustments"
-    )
     llm_prompt_context = models.TextField(
         blank=True,
         help_text="Cached prompt context for LLM"
@@ -123,18 +120,73 @@ class FitnessProfile(models.Model):
         verbose_name = 'Fitness Profile'
         verbose_name_plural = 'Fitness Profiles'
 
+    # Inputs of the derived fields; saves only recompute those when one of these changed
+    BMI_FIELDS = ['height_cm', 'weight_kg']
+    LLM_CONTEXT_FIELDS = BMI_FIELDS + [
+        'primary_goal', 'experience_level', 'months_experience', 'activity_level',
+        'days_per_week', 'preferred_duration_min', 'has_injuries', 'injuries_description',
+        'medical_conditions', 'home_equipment',
+    ]
+    # What the recommendations response is computed from (besides preferred class types)
+    RECOMMENDATION_FIELDS = BMI_FIELDS + [
+        'primary_goal', 'experience_level', 'preferred_times', 'preferred_duration_min',
+    ]
+    TRACKED_FIELDS = list(dict.fromkeys(LLM_CONTEXT_FIELDS + RECOMMENDATION_FIELDS))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot()
+
+    def _snapshot(self):
+        """Remember the loaded values of the tracked fields"""
+        self._loaded_values = {
+            field: copy.deepcopy(self.__dict__[field])
+            for field in self.TRACKED_FIELDS if field in self.__dict__
+        }
+
+    def changed_fields(self):
+        """Tracked fields that differ from what was loaded (all of them when unsaved)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(self.TRACKED_FIELDS)
+        return {
+            field for field in self.TRACKED_FIELDS
+            if field in self.__dict__
+            and (field not in loaded or loaded[field] != self.__dict__[field])
+        }
+
     def save(self, *args, **kwargs):
-        if self.height_cm and self.weight_kg:
+        update_fields = kwargs.get('update_fields')
+        changed = self.changed_fields()
+        if update_fields is not None:
+            changed &= set(update_fields)
+
+        derived = []
+        if changed & set(self.BMI_FIELDS) and self.height_cm and self.weight_kg:
             self.bmi = self.calculate_bmi()
             self.bmi_category = self.get_bmi_category()
+            derived += ['bmi', 'bmi_category']
+        if changed & set(self.LLM_CONTEXT_FIELDS):
+            self.update_llm_context()
+            derived.append('llm_prompt_context')
 
-        is_new = self.pk is None
+        if update_fields is not None and derived:
+            kwargs['update_fields'] = {*update_fields, *derived}
+
+        # Derived fields go out with the same INSERT/UPDATE
+        created = self._state.adding
         super().save(*args, **kwargs)
 
-        if is_new or 'update_fields' not in kwargs:
-            self.update_llm_context()
-            if not is_new:
-                super().save(update_fields=['llm_prompt_context', 'updated_at'])
+        self._snapshot()
+        if changed & set(self.RECOMMENDATION_FIELDS) and not created:
+            from ..services.recommendation_snapshots import RecommendationSnapshotService
+            RecommendationSnapshotService.invalidate([self.user_id])
 
     def calculate_bmi(self):
         """Calculate Body Mass Index"""
@@ -180,9 +232,10 @@ class FitnessProfile(models.Model):
         if self.medical_conditions:
             context_parts.append(f"Medical Conditions: {self.medical_conditions}")
 
-        if self.pk and self.preferred_class_types.exists():
-            class_types = ", ".join([ct.name for ct in self.preferred_class_types.all()])
-            context_parts.append(f"Preferred Class Types: {class_types}")
+        # One query, or none when preferred_class_types was prefetched
+        class_types = [ct.name for ct in self.preferred_class_types.all()] if self.pk else []
+        if class_types:
+            context_parts.append(f"Preferred Class Types: {', '.join(class_types)}")
 
         if self.home_equipment:
             equipment = ", ".join(self.home_equipment)
@@ -0,0 +1,28 @@
+from django.db import models
+from django.utils import timezone
+
+
+class PreferenceChange(models.Model):
+    """
+    One change of a profile's goal / activity / experience preferences.
+    Append-only: rows are inserted once and never updated.
+    """
+    profile = models.ForeignKey(
+        'users.FitnessProfile',
+        on_delete=models.CASCADE,
+        related_name='preference_changes'
+    )
+    timestamp = models.DateTimeField(default=timezone.now)
+    old = models.JSONField()
+    new = models.JSONField()
+    reason = models.CharField(max_length=50, default='user_update')
+
+    class Meta:
+        db_table = 'profile_preference_changes'
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['profile', 'timestamp'], name='preference_change_profile_ts'),
+        ]
+
+    def __str__(self):
+        return f"Preference change of profile {self.profile_id} at {self.timestamp}"
@@ -0,0 +1,35 @@
+from django.db import models
+from django.conf import settings
+
+
+class RecommendationSnapshot(models.Model):
+    """
+    A member's last computed recommendations response, zlib-compressed JSON.
+    It is fresh until expires_at unless invalidated after it was computed;
+    suggested_classes lets class events find the snapshots that show a class.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation_snapshot'
+    )
+    payload = models.BinaryField()
+    suggested_classes = models.ManyToManyField(
+        'classes.FitnessClass',
+        related_name='+',
+        blank=True
+    )
+
+    # When computation started: an invalidation during it still counts
+    computed_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    invalidated_at = models.DateTimeField(null=True, blank=True)
+    # Last time the member read it, at RECOMMENDATION_SNAPSHOT_TTL_SECONDS resolution
+    served_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'recommendation_snapshots'
+
+    def __str__(self):
+        return f"Recommendations for {self.user_id} at {self.computed_at}"
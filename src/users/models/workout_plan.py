@@ -0,0 +1,34 @@
+from django.db import models
+from django.conf import settings
+
+
+class WorkoutPlan(models.Model):
+    """
+    A generated workout plan, kept per user as numbered versions. The latest
+    version is the current plan; fingerprint records the prompt inputs it was
+    generated from (WorkoutPlanCache.fingerprint) so a stale plan is detectable.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='workout_plans'
+    )
+    version = models.PositiveIntegerField()
+    days = models.PositiveSmallIntegerField()
+    fingerprint = models.CharField(max_length=64)
+    plan = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'workout_plans'
+        ordering = ['-version']
+        constraints = [
+            # Also the index behind "latest version of a user's plan"
+            models.UniqueConstraint(
+                fields=['user', 'version'],
+                name='unique_workout_plan_version'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Workout plan v{self.version} for {self.user_id}"
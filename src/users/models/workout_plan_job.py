@@ -0,0 +1,49 @@
+from django.db import models
+from django.conf import settings
+from django.db.models import Q
+
+
+class WorkoutPlanJob(models.Model):
+    """Background workout plan generation, polled by the client"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ['queued', 'running']
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='workout_plan_jobs'
+    )
+    days = models.PositiveSmallIntegerField(default=7)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+
+    result = models.JSONField(null=True, blank=True)
+    error = models.JSONField(null=True, blank=True)
+    cached = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'workout_plan_jobs'
+        ordering = ['-created_at']
+        constraints = [
+            # Repeated clicks reuse the running job instead of spawning new ones
+            models.UniqueConstraint(
+                fields=['user', 'days'],
+                condition=Q(status__in=['queued', 'running']),
+                name='one_active_workout_plan_job_per_user_and_days'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Workout plan job {self.pk} for {self.user_id} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
@@ -0,0 +1,5 @@
+from classes.pagination import KeysetPagination
+
+
+class PreferenceHistoryPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
@@ -0,0 +1,22 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+def format_event(event, data):
+    """One Server-Sent Event frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets text/event-stream requests through content negotiation. Streaming
+    views return a StreamingHttpResponse; any plain Response rendered here
+    (validation errors) goes out as a single 'error' event.
+    """
+
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data)
@@ -1,2 +1,5 @@
 from .fitness_profile import UserWithProfileSerializer, FitnessProfileSerializer
 from .users import UserCreateSerializer, UserReadSerializer, UserUpdateSerializer
+from .workout_plan_job import WorkoutPlanJobSerializer
+from .workout_plan import WorkoutPlanSerializer
+from .preference_change import PreferenceChangeSerializer
@@ -1,6 +1,6 @@
-from datetime import timezone
+from django.db import transaction
 from rest_framework import serializers
-from ..models import FitnessProfile
+from ..models import FitnessProfile, PreferenceChange
 from classes.models import ClassType
 from .users import UserReadSerializer
 
@@ -70,24 +70,21 @@ class FitnessProfileSerializer(serializers.ModelSerializer):
             'activity_level': instance.activity_level,
             'experience_level': instance.experience_level,
         }
-
-        instance = super().update(instance, validated_data)
-
         new_preferences = {
-            'primary_goal': instance.primary_goal,
-            'activity_level': instance.activity_level,
-            'experience_level': instance.experience_level,
+            field: validated_data.get(field, value) for field, value in old_preferences.items()
         }
 
-        if old_preferences != new_preferences:
-            instance.preferences_history.append({
-                'timestamp': timezone.now().isoformat(),
-                'old': old_preferences,
-                'new': new_preferences,
-                'reason': self.context.get('reason', 'user_update')
-            })
-            instance.save()
-
+        if old_preferences == new_preferences:
+            return super().update(instance, validated_data)
+
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            PreferenceChange.objects.create(
+                profile=instance,
+                old=old_preferences,
+                new=new_preferences,
+                reason=self.context.get('reason', 'user_update')
+            )
         return instance
 
 
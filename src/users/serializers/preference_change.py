@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from ..models import PreferenceChange
+
+
+class PreferenceChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PreferenceChange
+        fields = ['id', 'timestamp', 'old', 'new', 'reason']
+        read_only_fields = fields
@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from ..models import WorkoutPlan
+
+
+class WorkoutPlanSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkoutPlan
+        fields = ['version', 'days', 'plan', 'created_at']
+        read_only_fields = fields
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+from ..models import WorkoutPlanJob
+
+
+class WorkoutPlanJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source='id', read_only=True)
+
+    class Meta:
+        model = WorkoutPlanJob
+        fields = [
+            'job_id', 'status', 'days', 'result', 'error', 'cached',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
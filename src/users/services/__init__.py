@@ -1 +1,9 @@
+from .workout_plan_cache import WorkoutPlanCache
+from .llm_client import LLMClient, LLMUnavailableError, CircuitBreaker
+from .plan_stream import PlanStreamParser
 from .llm_service import WorkoutLLMService
+from .workout_plans import WorkoutPlanService
+from .workout_plan_jobs import WorkoutPlanJobService
+from .plan_backends import PlanBackend, get_plan_backend
+from .workout_plan_batch import WorkoutPlanBatchService
+from .recommendation_snapshots import RecommendationSnapshotService
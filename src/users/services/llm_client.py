@@ -0,0 +1,267 @@
+import random
+import threading
+import time
+from collections import deque
+import anthropic
+from django.conf import settings
+
+MAX_BACKOFF_SECONDS = 8
+LATENCY_WINDOW = 200
+
+# Provider-side trouble: worth retrying and counted by the circuit breaker
+RETRYABLE_ERRORS = (
+    anthropic.APIConnectionError,  # includes APITimeoutError
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+)
+
+
+def is_retryable(error):
+    # 529 "overloaded" has no dedicated exception class in the SDK
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and error.status_code >= 500
+
+
+class LLMUnavailableError(Exception):
+    """The provider is failing or slow (breaker open or retries exhausted)"""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After failure_threshold consecutive failures
+    (errors or calls slower than slow_call_seconds) it opens and rejects calls
+    for reset_seconds, then lets a single probe call through (half-open).
+    """
+
+    def __init__(self, failure_threshold, reset_seconds, slow_call_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds
+
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counters = {'calls': 0, 'successes': 0, 'failures': 0, 'rejected': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = 'half_open'
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            state = self._current_state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def record(self, success, latency):
+        with self._lock:
+            self._counters['calls'] += 1
+            self._latencies.append(latency)
+
+            if success and latency <= self.slow_call_seconds:
+                self._counters['successes'] += 1
+                self._consecutive_failures = 0
+                self._state = 'closed'
+                self._probe_in_flight = False
+                return
+
+            self._counters['failures'] += 1
+            self._consecutive_failures += 1
+            if (self._state == 'half_open'
+                    or self._consecutive_failures >= self.failure_threshold):
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release(self):
+        """Hand back a half-open probe that ended without a verdict (caller went away)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p):
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                **self._counters,
+                'latency_seconds': {
+                    'p50': percentile(0.5),
+                    'p95': percentile(0.95),
+                    'max': round(latencies[-1], 3) if latencies else None,
+                    'samples': len(latencies),
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._state = 'closed'
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self._latencies.clear()
+            self._counters = dict.fromkeys(self._counters, 0)
+
+
+class LLMClient:
+    """Process-wide Anthropic client: pooled connections, timeouts, retries, circuit breaker"""
+
+    _client = None
+    _breaker = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_client():
+        with LLMClient._lock:
+            if LLMClient._client is None:
+                LLMClient._client = anthropic.Anthropic(
+                    api_key=settings.ANTHROPIC_API_KEY,
+                    base_url=settings.ANTHROPIC_BASE_URL or None,
+                    timeout=settings.LLM_TIMEOUT_SECONDS,
+                    # Retries are ours so the breaker sees every attempt
+                    max_retries=0,
+                )
+            return LLMClient._client
+
+    @staticmethod
+    def breaker():
+        with LLMClient._lock:
+            if LLMClient._breaker is None:
+                LLMClient._breaker = CircuitBreaker(
+                    failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                    reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+                    slow_call_seconds=settings.LLM_SLOW_CALL_SECONDS,
+                )
+            return LLMClient._breaker
+
+    @staticmethod
+    def reset():
+        """Drop the shared client and breaker (settings changed, tests)"""
+        with LLMClient._lock:
+            if LLMClient._client is not None:
+                LLMClient._client.close()
+            LLMClient._client = None
+            LLMClient._breaker = None
+
+    @staticmethod
+    def backoff(attempt):
+        """Full jitter: uniform in [0, base * 2^attempt], capped"""
+        ceiling = min(MAX_BACKOFF_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def create_message(**kwargs):
+        """
+        messages.create with up to LLM_MAX_RETRIES retries on provider errors.
+        Raises LLMUnavailableError when the breaker is open or retries run out;
+        other API errors (bad request, auth) propagate unchanged.
+        """
+        breaker = LLMClient.breaker()
+        client = LLMClient.get_client()
+        last_error = None
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            if not breaker.allow():
+                raise LLMUnavailableError('LLM circuit breaker is open') from last_error
+
+            started = time.monotonic()
+            try:
+                message = client.messages.create(**kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The provider answered (bad request, auth...): not an availability problem
+                    breaker.record(True, time.monotonic() - started)
+                    raise
+                breaker.record(False, time.monotonic() - started)
+                last_error = e
+                if attempt < settings.LLM_MAX_RETRIES:
+                    time.sleep(LLMClient.backoff(attempt))
+                continue
+
+            breaker.record(True, time.monotonic() - started)
+            return message
+
+        raise LLMUnavailableError(f'LLM request failed: {last_error}') from last_error
+
+    @staticmethod
+    def stream_message(**kwargs):
+        """
+        Streaming messages.create: yields text deltas as they arrive.
+        Attempts are retried like create_message only until the first delta;
+        once text has been yielded a provider error raises LLMUnavailableError.
+        Each attempt records one outcome when it ends, judged on time to first
+        token; an attempt abandoned by the consumer before any text arrived
+        records nothing and hands back the half-open probe.
+        """
+        breaker = LLMClient.breaker()
+        client = LLMClient.get_client()
+        last_error = None
+
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            if not breaker.allow():
+                raise LLMUnavailableError('LLM circuit breaker is open') from last_error
+
+            started = time.monotonic()
+            first_token = None
+            # True: the provider answered, False: it failed, None: the consumer closed us
+            succeeded = None
+            try:
+                with client.messages.stream(**kwargs) as stream:
+                    for text in stream.text_stream:
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                        yield text
+                succeeded = True
+            except Exception as e:
+                # Not retryable (bad request, auth...): not an availability problem
+                succeeded = not is_retryable(e)
+                if succeeded:
+                    raise
+                if first_token is not None:
+                    raise LLMUnavailableError(f'LLM stream interrupted: {e}') from e
+                last_error = e
+            finally:
+                if succeeded is None and first_token is None:
+                    breaker.release()
+                else:
+                    breaker.record(
+                        succeeded is not False,
+                        first_token if first_token is not None else time.monotonic() - started
+                    )
+
+            if succeeded:
+                return
+            if attempt < settings.LLM_MAX_RETRIES:
+                time.sleep(LLMClient.backoff(attempt))
+
+        raise LLMUnavailableError(f'LLM request failed: {last_error}') from last_error
+
+    @staticmethod
+    def status():
+        return {
+            'breaker': LLMClient.breaker().snapshot(),
+            'timeout_seconds': settings.LLM_TIMEOUT_SECONDS,
+            'max_retries': settings.LLM_MAX_RETRIES,
+        }
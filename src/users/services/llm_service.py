@@ -1,37 +1,40 @@
 import json
+import logging
 import anthropic
 from django.conf import settings
 from django.utils import timezone
+from ..models import FitnessProfile
+from .llm_client import LLMClient, LLMUnavailableError
+from .plan_stream import PlanStreamParser
+from .workout_plan_cache import WorkoutPlanCache
+from .workout_plans import WorkoutPlanService
+
+logger = logging.getLogger(__name__)
 
 
 class WorkoutLLMService:
     """Service for generating personalized workouts using LLM"""
 
     @staticmethod
-    def generate_workout_plan(profile, days=7):
-        """Generate a personalized workout plan using Anthropic Claude"""
-
-        if not profile.is_complete:
-            return {
-                'error': 'Profile incomplete',
-                'missing_fields': [
-                    'height_cm' if not profile.height_cm else None,
-                    'weight_kg' if not profile.weight_kg else None,
-                    'primary_goal' if not profile.primary_goal else None,
-                ]
-            }
+    def build_prompt(profile, days):
+        """Prompt built only from WorkoutPlanCache.prompt_inputs, so the cache key covers it"""
+        inputs = WorkoutPlanCache.prompt_inputs(profile)
+        goal = dict(profile.GOAL_CHOICES).get(inputs['goal'], inputs['goal'])
+        experience = dict(profile.EXPERIENCE_LEVEL_CHOICES).get(
+            inputs['experience'], inputs['experience']
+        )
+        equipment = ', '.join(inputs['equipment']) or 'Bodyweight only'
+        injuries = f"Injuries: {inputs['injuries']}\n" if inputs['injuries'] else ''
 
         # Shorter, more efficient prompt to save tokens
-        prompt = f"""Create a {days}-day workout plan (JSON only, no markdown):
-
-User: {profile.user.username}
-Goal: {profile.get_primary_goal_display()}
-Level: {profile.get_experience_level_display()}
-BMI: {profile.bmi} ({profile.bmi_category})
-Frequency: {profile.days_per_week} days/week, {profile.preferred_duration_min} min/session
-Equipment: {', '.join(profile.home_equipment[:5]) if profile.home_equipment else 'Bodyweight only'}
-{f' Injuries: {profile.injuries_description}' if profile.has_injuries else ''}
+        return f"""Create a {days}-day workout plan (JSON only, no markdown):
 
+Goal: {goal}
+Level: {experience}
+BMI category: {inputs['bmi_category']}
+Frequency: {inputs['days_per_week']} days/week, {inputs['duration_min']} min/session
+Equipment: {equipment}
+{injuries}
 Return ONLY this JSON structure (no explanation):
 {{
   "days": [
@@ -48,48 +51,166 @@ Return ONLY this JSON structure (no explanation):
   "warnings": ["warning1"]
 }}"""
 
+    @staticmethod
+    def get_or_generate_workout_plan(profile, days=7):
+        """
+        Cached plan for the profile's prompt inputs, generating it on a miss.
+        Returns (plan, cached). Only successful LLM plans are cached.
+        """
+        workout_plan = WorkoutPlanCache.get(profile, days)
+        if workout_plan is not None:
+            return workout_plan, True
+
+        workout_plan = WorkoutLLMService.generate_workout_plan(profile, days)
+        if 'error' not in workout_plan and not workout_plan.get('fallback'):
+            WorkoutPlanCache.set(profile, days, workout_plan)
+        return workout_plan, False
+
+    @staticmethod
+    def _message_kwargs(prompt):
+        return {
+            "model": "claude-3-haiku-20240307",
+            "max_tokens": 1500,  # Reduced tokens = lower cost
+            "temperature": 0.7,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+
+    @staticmethod
+    def _strip_markdown(response_text):
+        """Clean up response (remove markdown if present)"""
+        response_text = response_text.strip()
+        if "```json" in response_text:
+            json_start = response_text.find("```json") + 7
+            json_end = response_text.find("```", json_start)
+            response_text = response_text[json_start:json_end].strip()
+        elif "```" in response_text:
+            json_start = response_text.find("```") + 3
+            json_end = response_text.find("```", json_start)
+            response_text = response_text[json_start:json_end].strip()
+        return response_text
+
+    @staticmethod
+    def stream_workout_plan(profile, days=7):
+        """
+        Generate a plan as a stream of (event, data) pairs: a 'day' event for
+        each days[i] as soon as the model closes it, then one 'plan' event with
+        the complete plan (or 'error'). Cached and fallback plans are replayed
+        through the same events.
+        """
+        workout_plan = WorkoutPlanCache.get(profile, days)
+        if workout_plan is not None:
+            WorkoutPlanService.record(profile, days, workout_plan)
+            yield from WorkoutLLMService._replay(workout_plan, cached=True)
+            return
+
+        prompt = WorkoutLLMService.build_prompt(profile, days)
+        parser = PlanStreamParser()
+        streamed_days = 0
+        stream = LLMClient.stream_message(**WorkoutLLMService._message_kwargs(prompt))
+
         try:
-            # Use the FREE Haiku model (much cheaper than Sonnet)
-            client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-
-            message = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1500,  # Reduced tokens = lower cost
-                temperature=0.7,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
+            for text in stream:
+                for day in parser.feed(text):
+                    streamed_days += 1
+                    yield 'day', day
+
+            workout_plan = json.loads(WorkoutLLMService._strip_markdown(parser.text))
+
+        except LLMUnavailableError as e:
+            if streamed_days:
+                # Days already sent cannot be swapped for the fallback plan
+                yield 'error', {'error': 'LLM stream interrupted', 'details': str(e)}
+            else:
+                yield from WorkoutLLMService._replay(
+                    WorkoutLLMService._generate_fallback_plan(profile, days), cached=False
+                )
+            return
+
+        except anthropic.APIError as e:
+            yield 'error', {
+                'error': 'API error',
+                'details': str(e),
+                'fallback': 'Try the /recommendations/ endpoint instead'
+            }
+            return
+
+        except json.JSONDecodeError as e:
+            yield 'error', {
+                'error': 'Failed to parse response',
+                'details': str(e),
+                'raw': parser.text[:200]
+            }
+            return
+
+        except Exception as e:
+            logger.exception(f"Workout plan stream failed for profile {profile.pk}")
+            # Settle the attempt's breaker outcome before the terminal event
+            stream.close()
+            yield 'error', {
+                'error': 'Unexpected error',
+                'details': str(e)
+            }
+            return
+
+        WorkoutPlanCache.set(profile, days, workout_plan)
+        WorkoutLLMService._touch_last_llm_update(profile)
+        WorkoutPlanService.record(profile, days, workout_plan)
+
+        yield 'plan', {'plan': workout_plan, 'cached': False}
+
+    @staticmethod
+    def _touch_last_llm_update(profile):
+        """Plain UPDATE: profile.save() would recompute BMI and the plan fingerprint"""
+        profile.last_llm_update = timezone.now()
+        FitnessProfile.objects.filter(pk=profile.pk).update(
+            last_llm_update=profile.last_llm_update
+        )
+
+    @staticmethod
+    def _replay(workout_plan, cached):
+        for day in workout_plan.get('days', []):
+            yield 'day', day
+        yield 'plan', {'plan': workout_plan, 'cached': cached}
+
+    @staticmethod
+    def generate_workout_plan(profile, days=7):
+        """Generate a personalized workout plan using Anthropic Claude"""
+
+        if not profile.is_complete:
+            return {
+                'error': 'Profile incomplete',
+                'missing_fields': [
+                    'height_cm' if not profile.height_cm else None,
+                    'weight_kg' if not profile.weight_kg else None,
+                    'primary_goal' if not profile.primary_goal else None,
                 ]
-            )
+            }
 
-            response_text = message.content[0].text.strip()
+        prompt = WorkoutLLMService.build_prompt(profile, days)
 
-            # Clean up response (remove markdown if present)
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                response_text = response_text[json_start:json_end].strip()
+        try:
+            # Use the FREE Haiku model (much cheaper than Sonnet)
+            message = LLMClient.create_message(**WorkoutLLMService._message_kwargs(prompt))
 
+            response_text = WorkoutLLMService._strip_markdown(message.content[0].text)
             workout_plan = json.loads(response_text)
 
-            profile.last_llm_update = timezone.now()
-            profile.save()
+            WorkoutLLMService._touch_last_llm_update(profile)
 
             return workout_plan
 
+        except LLMUnavailableError:
+            # Provider failing, slow or rate limiting: serve the free plan instead
+            return WorkoutLLMService._generate_fallback_plan(profile, days)
+
         except anthropic.APIError as e:
             error_msg = str(e)
 
-            # Handle rate limits gracefully
-            if 'rate_limit' in error_msg.lower():
-                return WorkoutLLMService._generate_fallback_plan(profile, days)
-
             return {
                 'error': 'API error',
                 'details': error_msg,
@@ -180,7 +301,8 @@ Return ONLY this JSON structure (no explanation):
                 f"Consider your {profile.bmi_category} BMI when selecting intensity"
             ] + ([f"Mind your injuries: {profile.injuries_description}"]
                  if profile.has_injuries else []),
-            "note": "This is a basic plan. Upgrade to premium for AI-personalized workouts."
+            "note": "This is a basic plan. Upgrade to premium for AI-personalized workouts.",
+            "fallback": True
         }
 
     @staticmethod
@@ -0,0 +1,69 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from .llm_client import LLMClient
+from .llm_service import WorkoutLLMService
+from .workout_plan_cache import WorkoutPlanCache
+
+
+class PlanBackend(ABC):
+    """
+    Turns a profile into a workout plan dict. Called from worker threads, so
+    implementations must not touch the database: everything they need is on
+    the profile instance. Plans of a backend with persist = False are never
+    stored or cached.
+    """
+
+    name = None
+    persist = True
+
+    @abstractmethod
+    def generate(self, profile, days):
+        """Return the plan dict for profile; raise on failure"""
+
+
+class AnthropicPlanBackend(PlanBackend):
+    """The production model, through the shared client and its circuit breaker"""
+
+    name = 'anthropic'
+
+    def generate(self, profile, days):
+        prompt = WorkoutLLMService.build_prompt(profile, days)
+        message = LLMClient.create_message(**WorkoutLLMService._message_kwargs(prompt))
+        return json.loads(WorkoutLLMService._strip_markdown(message.content[0].text))
+
+
+class LocalPlanBackend(PlanBackend):
+    """
+    Deterministic offline backend for running and benchmarking the batch
+    pipeline: the rule-based plan, plus an optional simulated latency that is
+    derived from the profile fingerprint so runs are repeatable. Its plans
+    keep the fallback markers and are not persisted, so a benchmark never
+    passes them off as members' generated plans.
+    """
+
+    name = 'local'
+    persist = False
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+
+    def generate(self, profile, days):
+        if self.latency_ms:
+            # 50%-150% of the configured latency
+            jitter = int(WorkoutPlanCache.fingerprint(profile)[:4], 16) / 0xFFFF
+            time.sleep(self.latency_ms * (0.5 + jitter) / 1000)
+
+        return WorkoutLLMService._generate_fallback_plan(profile, days)
+
+
+PLAN_BACKENDS = {
+    backend.name: backend for backend in (AnthropicPlanBackend, LocalPlanBackend)
+}
+
+
+def get_plan_backend(name, **options):
+    try:
+        return PLAN_BACKENDS[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown plan backend: {name}") from None
@@ -0,0 +1,66 @@
+import json
+
+
+class PlanStreamParser:
+    """
+    Incremental scanner for a workout plan streamed as JSON text.
+
+    feed() takes text chunks as they arrive and returns the days[i] objects
+    that closed in them, so a day can be sent on before the rest of the plan
+    is generated. Text around the top-level object (markdown fences) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._in_days = False
+        self._day_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        days = []
+
+        for i in range(self._pos, len(self.text)):
+            char = self.text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = self.text[self._string_start:i]
+                continue
+
+            if not self._stack and char != '{':
+                continue  # before or after the plan object
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif char == ':':
+                self._key = self._last_string
+            elif char in '{[':
+                if char == '[' and self._stack == ['{'] and self._key == 'days':
+                    self._in_days = True
+                self._stack.append(char)
+                if self._in_days and char == '{' and len(self._stack) == 3:
+                    self._day_start = i
+            elif char in '}]':
+                self._stack.pop()
+                if self._in_days and char == '}' and len(self._stack) == 2:
+                    days.append(json.loads(self.text[self._day_start:i + 1]))
+                elif self._in_days and char == ']' and len(self._stack) == 1:
+                    self._in_days = False
+            elif char == ',':
+                self._key = None
+
+        self._pos = len(self.text)
+        return days
@@ -0,0 +1,219 @@
+import json
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from ..models import FitnessProfile, RecommendationSnapshot
+
+
+class RecommendationSnapshotService:
+    """
+    Precomputed per-member recommendations responses.
+
+    A request is served from the member's snapshot with one primary key
+    lookup. Profile changes and the member's own bookings invalidate it, as
+    does a suggested class filling up, being cancelled or edited; the next
+    request (or the refresher, for members who read theirs recently)
+    recomputes it. Invalidation only stamps invalidated_at, so it costs one
+    UPDATE and never computes anything on the path of the event. The UPDATE
+    runs once the event's transaction commits, so it never holds snapshot
+    row locks while the caller still holds its own (e.g. a class row during
+    a seat claim).
+    """
+
+    @staticmethod
+    def _encode(payload):
+        return zlib.compress(
+            json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        )
+
+    @staticmethod
+    def _decode(data):
+        return json.loads(zlib.decompress(data))
+
+    @staticmethod
+    def _fresh(now):
+        return Q(expires_at__gt=now) & (
+            Q(invalidated_at__isnull=True) | Q(invalidated_at__lt=F('computed_at'))
+        )
+
+    @staticmethod
+    def get(user_id):
+        """The member's fresh recommendations payload, or None"""
+        now = timezone.now()
+        row = RecommendationSnapshot.objects.filter(
+            RecommendationSnapshotService._fresh(now), user_id=user_id
+        ).values_list('payload', 'served_at').first()
+        if row is None:
+            return None
+
+        payload, served_at = row
+        # Keeps the member hot for the refresher; at most one write per TTL
+        if served_at < now - timedelta(seconds=settings.RECOMMENDATION_SNAPSHOT_TTL_SECONDS):
+            RecommendationSnapshot.objects.filter(user_id=user_id).update(served_at=now)
+        return RecommendationSnapshotService._decode(payload)
+
+    @staticmethod
+    def general_recommendations(profile):
+        """Generate basic recommendations based on profile"""
+        recommendations = []
+
+        if profile.bmi_category == "Overweight" or profile.bmi_category == "Obese":
+            recommendations.append({
+                'type': 'weight_management',
+                'message': 'Focus on cardio and balanced nutrition',
+                'priority': 'high'
+            })
+        elif profile.bmi_category == "Underweight":
+            recommendations.append({
+                'type': 'nutrition',
+                'message': 'Consider strength training and calorie surplus',
+                'priority': 'medium'
+            })
+
+        if profile.primary_goal == 'weight_loss':
+            recommendations.append({
+                'type': 'workout',
+                'message': 'Focus on HIIT and cardio classes 4-5 times per week',
+                'priority': 'high'
+            })
+        elif profile.primary_goal == 'muscle_gain':
+            recommendations.append({
+                'type': 'workout',
+                'message': 'Focus on strength training with progressive overload',
+                'priority': 'high'
+            })
+
+        if profile.experience_level == 'beginner':
+            recommendations.append({
+                'type': 'safety',
+                'message': 'Start with beginner-friendly classes and focus on form',
+                'priority': 'high'
+            })
+
+        return recommendations
+
+    @staticmethod
+    def suggested_classes(profile):
+        """Best-scoring upcoming classes for the profile, best first"""
+        from classes.models import FitnessClass
+        from classes.services import ClassRecommendationEngine
+
+        class_ids = ClassRecommendationEngine.recommend(profile, k=5)
+        classes = FitnessClass.objects.with_booking_stats(profile.user).in_bulk(class_ids)
+        return [classes[pk] for pk in class_ids if pk in classes]
+
+    @staticmethod
+    def refresh(profile, served=True):
+        """Compute and store the snapshot of a complete profile, returns the payload"""
+        from classes.serializers import FitnessClassReadSerializer
+        from classes.services.recommendation_engine import BOOKING_CUTOFF_SECONDS
+
+        computed_at = timezone.now()
+        suggested = RecommendationSnapshotService.suggested_classes(profile)
+        payload = {
+            'recommendations': RecommendationSnapshotService.general_recommendations(profile),
+            'suggested_classes': FitnessClassReadSerializer(suggested, many=True).data,
+        }
+
+        expires_at = computed_at + timedelta(seconds=settings.RECOMMENDATION_SNAPSHOT_TTL_SECONDS)
+        if suggested:
+            # A suggestion stops being bookable shortly before it starts
+            expires_at = min(
+                expires_at,
+                min(c.start_time for c in suggested) - timedelta(seconds=BOOKING_CUTOFF_SECONDS)
+            )
+
+        fields = {
+            'payload': RecommendationSnapshotService._encode(payload),
+            'computed_at': computed_at,
+            'expires_at': expires_at,
+        }
+        if served:
+            fields['served_at'] = computed_at
+
+        with transaction.atomic():
+            snapshot, _ = RecommendationSnapshot.objects.update_or_create(
+                user_id=profile.user_id,
+                defaults=fields,
+                create_defaults={**fields, 'served_at': computed_at},
+            )
+            snapshot.suggested_classes.set(suggested)
+
+        # The response as served from the snapshot
+        return RecommendationSnapshotService._decode(fields['payload'])
+
+    @staticmethod
+    def invalidate(user_ids):
+        """Members whose profile or bookings changed, once the transaction commits"""
+        user_ids = list(user_ids)
+        transaction.on_commit(
+            lambda: RecommendationSnapshot.objects.filter(user_id__in=user_ids).update(
+                invalidated_at=timezone.now()
+            ),
+            robust=True
+        )
+
+    @staticmethod
+    def invalidate_classes(class_ids, full_only=False):
+        """
+        Snapshots suggesting any of the classes, once the transaction commits;
+        with full_only, only classes full by then
+        """
+        from classes.models import FitnessClass
+
+        classes = FitnessClass.objects.filter(pk__in=list(class_ids))
+        if full_only:
+            classes = classes.alias(
+                seats_taken=F('confirmed_count') + F('pending_count')
+            ).filter(seats_taken__gte=F('max_capacity'))
+
+        transaction.on_commit(
+            lambda: RecommendationSnapshot.objects.filter(
+                suggested_classes__in=classes.values('pk')
+            ).update(invalidated_at=timezone.now()),
+            robust=True
+        )
+
+    @staticmethod
+    def stale_hot_snapshots(lead_seconds=0, limit=None):
+        """
+        User ids of members who read their snapshot within
+        RECOMMENDATION_HOT_MEMBER_HOURS whose snapshot is invalid or expires
+        within lead_seconds, soonest expiry first
+        """
+        now = timezone.now()
+        user_ids = RecommendationSnapshot.objects.filter(
+            served_at__gte=now - timedelta(hours=settings.RECOMMENDATION_HOT_MEMBER_HOURS)
+        ).exclude(
+            RecommendationSnapshotService._fresh(now + timedelta(seconds=lead_seconds))
+        ).order_by('expires_at').values_list('user_id', flat=True)
+        return list(user_ids[:limit] if limit else user_ids)
+
+    @staticmethod
+    def refresh_hot(lead_seconds=0, limit=None, chunk_size=100):
+        """Recompute the stale snapshots of hot members. Returns (refreshed, dropped)"""
+        user_ids = RecommendationSnapshotService.stale_hot_snapshots(lead_seconds, limit)
+        refreshed = dropped = 0
+
+        for start in range(0, len(user_ids), chunk_size):
+            profiles = FitnessProfile.objects.filter(
+                user_id__in=user_ids[start:start + chunk_size]
+            ).select_related('user').prefetch_related('preferred_class_types')
+
+            incomplete = []
+            for profile in profiles:
+                if not profile.is_complete:
+                    incomplete.append(profile.user_id)
+                    continue
+                RecommendationSnapshotService.refresh(profile, served=False)
+                refreshed += 1
+
+            # Served as a warning now, nothing to keep warm
+            RecommendationSnapshot.objects.filter(user_id__in=incomplete).delete()
+            dropped += len(incomplete)
+
+        return refreshed, dropped
@@ -0,0 +1,147 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from ..models import FitnessProfile, WorkoutPlan
+from .llm_client import LLMUnavailableError
+from .workout_plan_cache import WorkoutPlanCache
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class WorkoutPlanBatchService:
+    """
+    Off-peak pre-generation of workout plans for members whose profile
+    changed since their current plan was generated (or who have none).
+    Generation runs on a bounded thread pool; each chunk of results is
+    written with one INSERT, one UPDATE and one cache round-trip.
+    """
+
+    @staticmethod
+    def candidates(limit=None):
+        """Complete profiles of active members whose current plan fingerprint is out of date"""
+        latest = WorkoutPlan.objects.filter(user=OuterRef('user')).order_by('-version')
+        profiles = FitnessProfile.objects.filter(
+            user__is_active=True,
+            height_cm__isnull=False,
+            weight_kg__isnull=False,
+        ).annotate(
+            plan_fingerprint=Subquery(latest.values('fingerprint')[:1]),
+            plan_version=Subquery(latest.values('version')[:1]),
+        ).order_by('pk')
+
+        found = 0
+        for profile in profiles.iterator(chunk_size=500):
+            if not profile.is_complete:
+                continue
+            if WorkoutPlanCache.fingerprint(profile) == profile.plan_fingerprint:
+                continue
+            yield profile
+            found += 1
+            if limit and found >= limit:
+                return
+
+    @staticmethod
+    def _generate(backend, profile, days):
+        """Runs on a pool thread. Returns (plan or None, latency, error or None)"""
+        started = time.perf_counter()
+        try:
+            plan = backend.generate(profile, days)
+            if not isinstance(plan, dict) or not isinstance(plan.get('days'), list):
+                raise ValueError('Plan has no days list')
+            return plan, time.perf_counter() - started, None
+        except Exception as e:
+            return None, time.perf_counter() - started, e
+
+    @staticmethod
+    def _write(generated, days):
+        """Store (profile, plan) pairs as each user's next plan version"""
+        if not generated:
+            return
+
+        rows = [
+            WorkoutPlan(
+                user_id=profile.user_id,
+                version=(profile.plan_version or 0) + 1,
+                days=days,
+                fingerprint=WorkoutPlanCache.fingerprint(profile),
+                plan=plan,
+            )
+            for profile, plan in generated
+        ]
+
+        # A user who generated a plan meanwhile already owns that version: keep theirs
+        WorkoutPlan.objects.bulk_create(rows, ignore_conflicts=True)
+
+        # ignore_conflicts does not report which rows went in, so read the keys back
+        written = set(
+            WorkoutPlan.objects.filter(
+                user_id__in=[row.user_id for row in rows],
+                version__in={row.version for row in rows},
+            ).values_list('user_id', 'version', 'fingerprint')
+        )
+        stored = [
+            (profile, row) for (profile, _), row in zip(generated, rows)
+            if (row.user_id, row.version, row.fingerprint) in written
+        ]
+
+        FitnessProfile.objects.filter(
+            pk__in=[profile.pk for profile, _ in stored]
+        ).update(last_llm_update=timezone.now())
+        WorkoutPlanCache.set_many([(row.fingerprint, days, row.plan) for _, row in stored])
+
+    @staticmethod
+    def run(backend, days=7, workers=8, chunk_size=200, limit=None):
+        """
+        Generate and store plans for every candidate (generate only, for a
+        backend that does not persist). Stops early when the provider is
+        unavailable (circuit breaker open). Returns run stats.
+        """
+        started = time.perf_counter()
+        latencies = []
+        generated_count = failed = 0
+        stopped = False
+
+        profiles = WorkoutPlanBatchService.candidates(limit)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plan-batch') as pool:
+            while not stopped and (chunk := list(islice(profiles, chunk_size))):
+                results = pool.map(
+                    lambda profile: WorkoutPlanBatchService._generate(backend, profile, days),
+                    chunk
+                )
+
+                generated = []
+                for profile, (plan, latency, error) in zip(chunk, results):
+                    latencies.append(latency)
+                    if error is None:
+                        generated.append((profile, plan))
+                        continue
+                    failed += 1
+                    logger.error(f"Plan pre-generation failed for profile {profile.pk}: {error}")
+                    stopped = stopped or isinstance(error, LLMUnavailableError)
+
+                if backend.persist:
+                    WorkoutPlanBatchService._write(generated, days)
+                generated_count += len(generated)
+
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'generated': generated_count,
+            'failed': failed,
+            'stopped_early': stopped,
+            'stored': backend.persist,
+            'seconds': elapsed,
+            'plans_per_minute': generated_count / elapsed * 60 if elapsed else 0,
+            'p50_latency_seconds': percentile(latencies, 0.5),
+            'p95_latency_seconds': percentile(latencies, 0.95),
+        }
@@ -0,0 +1,69 @@
+import hashlib
+import json
+from django.core.cache import caches
+
+MAX_PLAN_DAYS = 14
+
+# Bump when the prompt changes so plans generated from the old prompt are ignored
+PROMPT_VERSION = 1
+
+
+class WorkoutPlanCache:
+    """
+    Generated workout plans keyed by a fingerprint of the prompt inputs.
+
+    The key only covers what goes into the prompt, so identical profiles of
+    different users share entries. Entries are never invalidated: a plan is
+    still right for its inputs, and a changed profile has a new fingerprint
+    and simply misses. TTL and size bound come from the 'workout_plans'
+    cache alias (WORKOUT_PLAN_CACHE_* settings), which is per-process unless
+    WORKOUT_PLAN_CACHE_URL points it at redis.
+    """
+
+    @staticmethod
+    def _cache():
+        return caches['workout_plans']
+
+    @staticmethod
+    def prompt_inputs(profile):
+        """Canonical prompt inputs; the prompt is built from exactly these values"""
+        return {
+            'goal': profile.primary_goal,
+            'experience': profile.experience_level,
+            'bmi_category': profile.bmi_category,
+            'days_per_week': profile.days_per_week,
+            'duration_min': profile.preferred_duration_min,
+            'equipment': sorted(profile.home_equipment or [])[:5],
+            'injuries': profile.injuries_description.strip() if profile.has_injuries else '',
+        }
+
+    @staticmethod
+    def fingerprint(profile):
+        payload = json.dumps(
+            [PROMPT_VERSION, WorkoutPlanCache.prompt_inputs(profile)],
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _key(fingerprint, days):
+        return f'workout_plan:{fingerprint}:{days}'
+
+    @staticmethod
+    def get(profile, days):
+        return WorkoutPlanCache._cache().get(
+            WorkoutPlanCache._key(WorkoutPlanCache.fingerprint(profile), days)
+        )
+
+    @staticmethod
+    def set(profile, days, plan):
+        WorkoutPlanCache._cache().set(
+            WorkoutPlanCache._key(WorkoutPlanCache.fingerprint(profile), days), plan
+        )
+
+    @staticmethod
+    def set_many(plans):
+        """Store (fingerprint, days, plan) triples in one round-trip"""
+        WorkoutPlanCache._cache().set_many({
+            WorkoutPlanCache._key(fingerprint, days): plan for fingerprint, days, plan in plans
+        })
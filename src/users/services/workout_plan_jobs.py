@@ -0,0 +1,115 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from ..models import FitnessProfile, WorkoutPlanJob
+from .llm_service import WorkoutLLMService
+from .workout_plans import WorkoutPlanService
+
+logger = logging.getLogger(__name__)
+
+
+class WorkoutPlanJobService:
+    """
+    Runs workout plan generation on a process-local thread pool so the LLM
+    round-trip never holds a web worker. No broker needed: jobs are rows in
+    workout_plan_jobs, clients poll them.
+    """
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def _get_executor():
+        with WorkoutPlanJobService._executor_lock:
+            if WorkoutPlanJobService._executor is None:
+                WorkoutPlanJobService._executor = ThreadPoolExecutor(
+                    max_workers=settings.WORKOUT_PLAN_WORKERS,
+                    thread_name_prefix='workout-plan'
+                )
+            return WorkoutPlanJobService._executor
+
+    @staticmethod
+    def expire_stale(user):
+        """
+        Fail active jobs older than WORKOUT_PLAN_JOB_TIMEOUT_SECONDS, e.g. when
+        the process running them was restarted, so the user can submit again.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.WORKOUT_PLAN_JOB_TIMEOUT_SECONDS)
+        return WorkoutPlanJob.objects.filter(
+            user=user,
+            status__in=WorkoutPlanJob.ACTIVE_STATUSES,
+            created_at__lt=cutoff
+        ).update(
+            status='failed',
+            error={'error': 'Job timed out'},
+            finished_at=timezone.now()
+        )
+
+    @staticmethod
+    def submit(user, days):
+        """Queue a job, or return the user's active one of that length. Returns (job, created)."""
+        WorkoutPlanJobService.expire_stale(user)
+
+        active = WorkoutPlanJob.objects.filter(
+            user=user, days=days, status__in=WorkoutPlanJob.ACTIVE_STATUSES
+        ).first()
+        if active is not None:
+            return active, False
+
+        try:
+            with transaction.atomic():
+                job = WorkoutPlanJob.objects.create(user=user, days=days)
+                transaction.on_commit(lambda: WorkoutPlanJobService._dispatch(job.pk))
+        except IntegrityError:
+            # A concurrent click won the race for the active slot
+            return WorkoutPlanJob.objects.get(
+                user=user, days=days, status__in=WorkoutPlanJob.ACTIVE_STATUSES
+            ), False
+
+        return job, True
+
+    @staticmethod
+    def _dispatch(job_id):
+        if settings.WORKOUT_PLAN_WORKERS > 0:
+            WorkoutPlanJobService._get_executor().submit(
+                WorkoutPlanJobService.run_in_thread, job_id
+            )
+        else:
+            WorkoutPlanJobService.run(job_id)
+
+    @staticmethod
+    def run_in_thread(job_id):
+        try:
+            WorkoutPlanJobService.run(job_id)
+        except Exception:
+            logger.exception(f"Workout plan job {job_id} crashed")
+        finally:
+            # Pool threads own their connection; don't leak one per thread
+            connection.close()
+
+    @staticmethod
+    def run(job_id):
+        if not WorkoutPlanJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', started_at=timezone.now()
+        ):
+            return
+
+        job = WorkoutPlanJob.objects.get(pk=job_id)
+        try:
+            profile = FitnessProfile.objects.select_related('user').get(user_id=job.user_id)
+            plan, cached = WorkoutLLMService.get_or_generate_workout_plan(profile, job.days)
+        except Exception as e:
+            plan, cached = {'error': 'Unexpected error', 'details': str(e)}, False
+
+        if 'error' in plan:
+            job.status, job.error = 'failed', plan
+        else:
+            job.status, job.result, job.cached = 'succeeded', plan, cached
+            if not plan.get('fallback'):
+                WorkoutPlanService.record(profile, job.days, plan)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'cached', 'finished_at'])
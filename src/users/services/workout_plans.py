@@ -0,0 +1,51 @@
+from django.db import IntegrityError, transaction
+from ..models import WorkoutPlan
+from .workout_plan_cache import WorkoutPlanCache
+
+
+class WorkoutPlanService:
+    """Versioned storage of the plans users generated"""
+
+    @staticmethod
+    def current(user, version=None):
+        """
+        The latest plan (or the given version) with the user's profile joined
+        in for the staleness check: one lookup on the (user, version) index.
+        """
+        plans = WorkoutPlan.objects.select_related('user__fitness_profile').filter(user=user)
+        if version is not None:
+            plans = plans.filter(version=version)
+        return plans.order_by('-version').first()
+
+    @staticmethod
+    def is_stale(workout_plan, profile):
+        """The profile's prompt inputs changed since the plan was generated"""
+        return workout_plan.fingerprint != WorkoutPlanCache.fingerprint(profile)
+
+    @staticmethod
+    def record(profile, days, plan):
+        """
+        Store a generated plan as the user's next version. Returns the current
+        version unchanged when it already holds this exact plan.
+        """
+        fingerprint = WorkoutPlanCache.fingerprint(profile)
+        current = WorkoutPlan.objects.filter(user_id=profile.user_id).order_by('-version').first()
+
+        if (current is not None and current.fingerprint == fingerprint
+                and current.days == days and current.plan == plan):
+            return current
+
+        try:
+            with transaction.atomic():
+                return WorkoutPlan.objects.create(
+                    user_id=profile.user_id,
+                    version=current.version + 1 if current else 1,
+                    days=days,
+                    fingerprint=fingerprint,
+                    plan=plan,
+                )
+        except IntegrityError:
+            # A concurrent generation took this version number; theirs is current
+            return WorkoutPlan.objects.filter(
+                user_id=profile.user_id
+            ).order_by('-version').first()
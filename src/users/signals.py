@@ -0,0 +1,33 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from .models import FitnessProfile
+from .services.recommendation_snapshots import RecommendationSnapshotService
+
+
+@receiver(m2m_changed, sender=FitnessProfile.preferred_class_types.through)
+def preferred_class_types_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh LLM context and recommendations of profiles whose preferred class types changed"""
+    if reverse and action == 'pre_clear':
+        # Cleared from the ClassType side: pk_set is not given, remember who is affected
+        instance._cleared_profile_ids = list(
+            instance.user_preferences.values_list('pk', flat=True)
+        )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_clear' and not pk_set:
+        return  # nothing was actually added or removed
+
+    if not reverse:
+        profiles = [instance]
+    else:
+        profile_ids = pk_set if action != 'post_clear' else instance._cleared_profile_ids
+        profiles = FitnessProfile.objects.filter(pk__in=profile_ids).select_related('user')
+
+    user_ids = []
+    for profile in profiles:
+        profile.update_llm_context()
+        profile.save(update_fields=['llm_prompt_context', 'updated_at'])
+        user_ids.append(profile.user_id)
+    RecommendationSnapshotService.invalidate(user_ids)
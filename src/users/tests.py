@@ -1,3 +1,802 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import anthropic
+import httpx
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from classes.models import ClassType, FitnessClass, Level
+from classes.services import BookingService, ClassRecommendationEngine
+from rest_framework.test import APIClient
+from .models import User, FitnessProfile, RecommendationSnapshot, WorkoutPlan, WorkoutPlanJob
+from .services import (
+    LLMClient, LLMUnavailableError, PlanStreamParser, RecommendationSnapshotService,
+    WorkoutLLMService, WorkoutPlanBatchService, WorkoutPlanCache, WorkoutPlanJobService,
+    get_plan_backend
+)
 
-# Create your tests here.
+PLAN = {'days': [{'day': 1, 'focus': 'Full Body', 'exercises': [], 'duration': 30}],
+        'tips': [], 'warnings': []}
+
+STREAMED_PLAN = {
+    'days': [
+        {'day': 1, 'focus': 'Upper {Body}', 'exercises': [
+            {'name': 'Push-ups "strict"', 'sets': 3, 'reps': '10-12', 'rest': '60s'}
+        ], 'duration': 30},
+        {'day': 2, 'focus': 'Legs [heavy]', 'exercises': [], 'duration': 40},
+    ],
+    'tips': ['Warm up {first}'],
+    'warnings': [],
+}
+
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/messages with the next scripted (status, delay) reply"""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            status, delay = server.script.pop(0) if server.script else (200, 0)
+
+        time.sleep(delay)
+
+        if status == 200 and request.get('stream'):
+            self.stream_plan()
+            return
+
+        if status == 200:
+            body = {
+                'id': 'msg_fake', 'type': 'message', 'role': 'assistant',
+                'model': 'claude-3-haiku-20240307',
+                'content': [{'type': 'text', 'text': json.dumps(PLAN)}],
+                'stop_reason': 'end_turn', 'stop_sequence': None,
+                'usage': {'input_tokens': 1, 'output_tokens': 1},
+            }
+        else:
+            body = {'type': 'error', 'error': {'type': 'api_error', 'message': 'boom'}}
+
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client already timed out
+
+    def stream_plan(self):
+        """The plan as Anthropic stream events, a few characters per delta"""
+        text = '```json\n' + json.dumps(STREAMED_PLAN, indent=2) + '\n```'
+        events = [
+            ('message_start', {'type': 'message_start', 'message': {
+                'id': 'msg_fake', 'type': 'message', 'role': 'assistant',
+                'model': 'claude-3-haiku-20240307', 'content': [],
+                'stop_reason': None, 'stop_sequence': None,
+                'usage': {'input_tokens': 1, 'output_tokens': 1},
+            }}),
+            ('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                     'content_block': {'type': 'text', 'text': ''}}),
+        ] + [
+            ('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                     'delta': {'type': 'text_delta', 'text': text[i:i + 8]}})
+            for i in range(0, len(text), 8)
+        ] + [
+            ('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+            ('message_delta', {'type': 'message_delta',
+                               'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                               'usage': {'output_tokens': 1}}),
+            ('message_stop', {'type': 'message_stop'}),
+        ]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for event, data in events:
+            self.wfile.write(f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode())
+            self.wfile.flush()
+            time.sleep(self.server.delta_delay)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeAnthropicTestCase(TestCase):
+    """Points the shared LLM client at a local fake messages endpoint"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAnthropicHandler)
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests = 0
+        self.server.script = []
+        self.server.delta_delay = 0
+        self.settings_override = override_settings(
+            ANTHROPIC_BASE_URL=f'http://127.0.0.1:{self.server.server_port}',
+            LLM_TIMEOUT_SECONDS=1,
+            LLM_MAX_RETRIES=2,
+            LLM_RETRY_BASE_SECONDS=0,
+            LLM_SLOW_CALL_SECONDS=5,
+            LLM_BREAKER_FAILURE_THRESHOLD=3,
+            LLM_BREAKER_RESET_SECONDS=60,
+        )
+        self.settings_override.enable()
+        LLMClient.reset()
+
+        user = User.objects.create_user('llm', 'llm@example.com', 'password123')
+        self.profile = FitnessProfile.objects.create(user=user, height_cm=175, weight_kg=70)
+        caches['workout_plans'].clear()
+
+    def tearDown(self):
+        LLMClient.reset()
+        self.settings_override.disable()
+
+
+class LLMClientTests(FakeAnthropicTestCase):
+    def test_success_reuses_one_client(self):
+        self.assertEqual(WorkoutLLMService.generate_workout_plan(self.profile, 1), PLAN)
+        client = LLMClient.get_client()
+        self.assertEqual(WorkoutLLMService.generate_workout_plan(self.profile, 1), PLAN)
+        self.assertIs(LLMClient.get_client(), client)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_retries_provider_errors(self):
+        self.server.script = [(500, 0), (529, 0)]
+
+        self.assertEqual(WorkoutLLMService.generate_workout_plan(self.profile, 1), PLAN)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(LLMClient.breaker().state, 'closed')
+
+    def test_breaker_opens_and_short_circuits_to_fallback(self):
+        self.server.script = [(500, 0)] * 3
+
+        plan = WorkoutLLMService.generate_workout_plan(self.profile, 1)
+        self.assertTrue(plan['fallback'])
+        self.assertEqual(LLMClient.breaker().state, 'open')
+
+        plan = WorkoutLLMService.generate_workout_plan(self.profile, 1)
+        self.assertTrue(plan['fallback'])
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(LLMClient.status()['breaker']['rejected'], 1)
+
+    def test_timeout_counts_as_failure(self):
+        self.server.script = [(200, 1.5)] * 3
+
+        with override_settings(LLM_TIMEOUT_SECONDS=0.3):
+            LLMClient.reset()
+            plan = WorkoutLLMService.generate_workout_plan(self.profile, 1)
+
+        self.assertTrue(plan['fallback'])
+        self.assertEqual(LLMClient.breaker().state, 'open')
+
+    def test_slow_success_trips_breaker(self):
+        self.server.script = [(200, 0.2)] * 3
+
+        with override_settings(LLM_SLOW_CALL_SECONDS=0.1, LLM_BREAKER_FAILURE_THRESHOLD=2):
+            LLMClient.reset()
+            for _ in range(2):
+                self.assertEqual(WorkoutLLMService.generate_workout_plan(self.profile, 1), PLAN)
+
+            self.assertEqual(LLMClient.breaker().state, 'open')
+            self.assertTrue(WorkoutLLMService.generate_workout_plan(self.profile, 1)['fallback'])
+
+    def test_half_open_probe_closes_breaker(self):
+        self.server.script = [(500, 0)] * 3
+
+        with override_settings(LLM_BREAKER_RESET_SECONDS=0):
+            LLMClient.reset()
+            self.assertTrue(WorkoutLLMService.generate_workout_plan(self.profile, 1)['fallback'])
+            self.assertEqual(LLMClient.breaker().state, 'half_open')
+
+            self.assertEqual(WorkoutLLMService.generate_workout_plan(self.profile, 1), PLAN)
+            self.assertEqual(LLMClient.breaker().state, 'closed')
+
+    def test_status_endpoint_is_admin_only(self):
+        WorkoutLLMService.generate_workout_plan(self.profile, 1)
+        client = APIClient()
+
+        client.force_authenticate(self.profile.user)
+        response = client.get('/api/users/profiles/llm_status/')
+        self.assertEqual(response.status_code, 403)
+
+        admin = User.objects.create_user('admin', 'admin@example.com', 'password123',
+                                         is_staff=True)
+        client.force_authenticate(admin)
+        response = client.get('/api/users/profiles/llm_status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['breaker']['state'], 'closed')
+        self.assertEqual(response.data['breaker']['successes'], 1)
+        self.assertIsNotNone(response.data['breaker']['latency_seconds']['p95'])
+
+    def fake_stream(self, *texts, error=None):
+        """Patch the client so messages.stream yields texts, then raises error"""
+        def text_stream():
+            yield from texts
+            if error is not None:
+                raise error
+
+        client = mock.MagicMock()
+        client.messages.stream.return_value.__enter__.return_value.text_stream = text_stream()
+        return mock.patch.object(LLMClient, 'get_client', return_value=client)
+
+    def open_half_way(self):
+        """Trip the breaker so the next call is the half-open probe"""
+        with override_settings(LLM_BREAKER_RESET_SECONDS=0):
+            LLMClient.reset()
+            breaker = LLMClient.breaker()
+        for _ in range(3):
+            breaker.record(False, 0)
+        self.assertEqual(breaker.state, 'half_open')
+        return breaker
+
+    def test_stream_closed_after_first_token_records_one_success(self):
+        breaker = self.open_half_way()
+
+        with self.fake_stream('a', 'b'):
+            stream = LLMClient.stream_message(model='m', max_tokens=1, messages=[])
+            self.assertEqual(next(stream), 'a')
+            stream.close()
+
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual((breaker.snapshot()['calls'], breaker.snapshot()['successes']), (4, 1))
+
+    def test_stream_abandoned_before_first_token_releases_the_probe(self):
+        breaker = self.open_half_way()
+
+        with self.fake_stream(error=KeyboardInterrupt()):
+            with self.assertRaises(KeyboardInterrupt):
+                list(LLMClient.stream_message(model='m', max_tokens=1, messages=[]))
+
+        # No verdict recorded, and the next caller may probe again
+        self.assertEqual(breaker.snapshot()['calls'], 3)
+        self.assertTrue(breaker.allow())
+
+    def test_stream_interrupted_mid_way_records_one_failure(self):
+        breaker = LLMClient.breaker()
+        error = anthropic.APIConnectionError(request=httpx.Request('POST', 'http://fake'))
+
+        with self.fake_stream('a', error=error):
+            stream = LLMClient.stream_message(model='m', max_tokens=1, messages=[])
+            self.assertEqual(next(stream), 'a')
+            with self.assertRaises(LLMUnavailableError):
+                next(stream)
+
+        snapshot = breaker.snapshot()
+        self.assertEqual((snapshot['calls'], snapshot['successes'], snapshot['failures']),
+                         (1, 0, 1))
+
+
+def read_events(response):
+    """(event, data, seconds since start) for each SSE frame of a streaming response"""
+    started = time.monotonic()
+    buffer = b''
+    for chunk in response.streaming_content:
+        buffer += chunk
+        while b'\n\n' in buffer:
+            frame, buffer = buffer.split(b'\n\n', 1)
+            event, data = frame.decode().split('\n')
+            yield (event.removeprefix('event: '), json.loads(data.removeprefix('data: ')),
+                   time.monotonic() - started)
+
+
+class PlanStreamTests(FakeAnthropicTestCase):
+    def test_parser_emits_each_day_when_it_closes(self):
+        text = '```json\n' + json.dumps(STREAMED_PLAN) + '\n```'
+        parser = PlanStreamParser()
+        emitted = []
+        for i, char in enumerate(text):
+            for day in parser.feed(char):
+                emitted.append((day, i))
+
+        self.assertEqual([day for day, _ in emitted], STREAMED_PLAN['days'])
+        # Day 1 is complete long before the plan is
+        self.assertLess(emitted[0][1], text.index('"day": 2'))
+        self.assertEqual(parser.text, text)
+
+    def test_stream_endpoint_sends_days_before_the_plan_finishes(self):
+        self.server.delta_delay = 0.01
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+
+        response = client.get('/api/users/profiles/workout_plan_stream/?days=2',
+                              HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = list(read_events(response))
+
+        self.assertEqual([event for event, _, _ in events], ['day', 'day', 'plan'])
+        self.assertEqual(events[0][1], STREAMED_PLAN['days'][0])
+        self.assertEqual(events[2][1], {'plan': STREAMED_PLAN, 'cached': False})
+        # About 50 deltas 10ms apart: day 1 must not wait for the end of the stream
+        self.assertGreater(events[2][2] - events[0][2], 0.1)
+
+        # Replayed from the plan cache on the next request
+        events = list(read_events(client.get('/api/users/profiles/workout_plan_stream/?days=2')))
+        self.assertEqual(events[-1][1], {'plan': STREAMED_PLAN, 'cached': True})
+        self.assertEqual(self.server.requests, 1)
+
+    def test_stream_retries_then_falls_back_when_breaker_opens(self):
+        self.server.script = [(500, 0)] * 3
+        events = list(WorkoutLLMService.stream_workout_plan(self.profile, 2))
+
+        self.assertEqual([event for event, _ in events], ['day', 'day', 'plan'])
+        self.assertTrue(events[-1][1]['plan']['fallback'])
+        self.assertEqual(LLMClient.breaker().state, 'open')
+
+    def test_unexpected_stream_error_ends_with_an_error_event(self):
+        with mock.patch.object(PlanStreamParser, 'feed', side_effect=RuntimeError('boom')):
+            events = list(WorkoutLLMService.stream_workout_plan(self.profile, 2))
+
+        self.assertEqual(events, [('error', {'error': 'Unexpected error', 'details': 'boom'})])
+        # The provider answered: the attempt is recorded once, as a success
+        snapshot = LLMClient.breaker().snapshot()
+        self.assertEqual((snapshot['calls'], snapshot['successes']), (1, 1))
+
+    def test_stream_rejects_invalid_days(self):
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+
+        response = client.get('/api/users/profiles/workout_plan_stream/?days=99',
+                              HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith(b'event: error\n'))
+
+
+@override_settings(WORKOUT_PLAN_WORKERS=0)
+class WorkoutPlanTests(FakeAnthropicTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def generate(self, days=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/profiles/generate_workout_plan/',
+                                        {'days': days}, format='json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_generated_plan_is_persisted_and_read_with_one_query(self):
+        self.assertEqual(self.client.get('/api/users/profiles/workout_plan/').status_code, 404)
+
+        self.generate()
+        self.profile.refresh_from_db()
+        self.assertIsNotNone(self.profile.last_llm_update)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/profiles/workout_plan/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(response.data['plan'], PLAN)
+        self.assertFalse(response.data['stale'])
+
+        # Same inputs: served from the plan cache, no new version
+        self.generate()
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.profile.user.workout_plans.count(), 1)
+
+    def test_changed_profile_regenerates_a_new_version(self):
+        self.generate()
+
+        self.profile.days_per_week = 5
+        self.profile.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/api/users/profiles/workout_plan/')
+        self.assertTrue(response.data['stale'])
+        self.assertEqual(response.data['version'], 1)
+        self.assertIn('job_id', response.data['regeneration'])
+
+        response = self.client.get('/api/users/profiles/workout_plan/')
+        self.assertEqual(response.data['version'], 2)
+        self.assertFalse(response.data['stale'])
+        self.assertEqual(self.server.requests, 2)
+
+        response = self.client.get('/api/users/profiles/workout_plan/?version=1')
+        self.assertEqual(response.data['version'], 1)
+        self.assertTrue(response.data['stale'])
+        self.assertNotIn('regeneration', response.data)
+
+    def test_repeated_stale_reads_reuse_one_regeneration_job(self):
+        self.generate()
+        self.profile.days_per_week = 5
+        self.profile.save()
+
+        # The job has not run yet, every read points at the same one
+        first = self.client.get('/api/users/profiles/workout_plan/').data['regeneration']
+        second = self.client.get('/api/users/profiles/workout_plan/').data['regeneration']
+
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertEqual(self.profile.user.workout_plan_jobs.count(), 2)
+
+    def test_plan_outlives_a_deleted_profile(self):
+        self.generate()
+        self.profile.delete()
+
+        response = self.client.get('/api/users/profiles/workout_plan/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['stale'])
+        self.assertNotIn('regeneration', response.data)
+
+    def test_streamed_plan_is_persisted(self):
+        list(WorkoutLLMService.stream_workout_plan(self.profile, 2))
+
+        response = self.client.get('/api/users/profiles/workout_plan/')
+        self.assertEqual(response.data['plan'], STREAMED_PLAN)
+        self.assertEqual(response.data['days'], 2)
+
+
+@override_settings(WORKOUT_PLAN_WORKERS=0, WORKOUT_PLAN_JOB_TIMEOUT_SECONDS=300)
+class WorkoutPlanJobTests(FakeAnthropicTestCase):
+    def test_active_job_is_reused_per_plan_length(self):
+        job, created = WorkoutPlanJobService.submit(self.profile.user, 7)
+        self.assertTrue(created)
+
+        self.assertEqual(WorkoutPlanJobService.submit(self.profile.user, 7), (job, False))
+        other, created = WorkoutPlanJobService.submit(self.profile.user, 3)
+        self.assertTrue(created)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_job_runs_after_commit_and_finishes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job, _ = WorkoutPlanJobService.submit(self.profile.user, 1)
+            self.assertEqual(job.status, 'queued')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result, PLAN)
+        self.assertIsNotNone(job.started_at)
+        self.assertIsNotNone(job.finished_at)
+
+        # A finished job no longer blocks a new one
+        self.assertTrue(WorkoutPlanJobService.submit(self.profile.user, 1)[1])
+
+    def test_stale_active_job_times_out(self):
+        job, _ = WorkoutPlanJobService.submit(self.profile.user, 7)
+        WorkoutPlanJob.objects.filter(pk=job.pk).update(
+            created_at=timezone.now() - timedelta(seconds=301)
+        )
+
+        replacement, created = WorkoutPlanJobService.submit(self.profile.user, 7)
+
+        self.assertTrue(created)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', {'error': 'Job timed out'}))
+        self.assertNotEqual(replacement.pk, job.pk)
+
+
+class WorkoutPlanBatchTests(FakeAnthropicTestCase):
+    def setUp(self):
+        super().setUp()
+        users = User.objects.bulk_create([
+            User(username=f'batch{i}', email=f'batch{i}@example.com') for i in range(4)
+        ])
+        FitnessProfile.objects.bulk_create([
+            FitnessProfile(user=users[0], height_cm=180, weight_kg=80, primary_goal='endurance'),
+            FitnessProfile(user=users[1], height_cm=160, weight_kg=55, days_per_week=5),
+            FitnessProfile(user=users[2]),  # incomplete
+            FitnessProfile(user=users[3], height_cm=170, weight_kg=65),
+        ])
+        User.objects.filter(pk=users[3].pk).update(is_active=False)
+
+        # Up-to-date plan: skipped
+        WorkoutPlan.objects.create(user=self.profile.user, version=3, days=7, plan=PLAN,
+                                   fingerprint=WorkoutPlanCache.fingerprint(self.profile))
+        self.batch_profile = FitnessProfile.objects.get(user=users[0])
+
+    def test_local_backend_generates_without_storing(self):
+        out = StringIO()
+        call_command('pregenerate_workout_plans', backend='local', workers=2, chunk_size=1,
+                     stdout=out)
+        self.assertIn('Generated 2 workout plans (0 failed)', out.getvalue())
+        self.assertIn('plans were generated but not stored', out.getvalue())
+        self.assertIn('plans/min', out.getvalue())
+
+        self.assertTrue(get_plan_backend('local').generate(self.batch_profile, 7)['fallback'])
+        self.assertFalse(WorkoutPlan.objects.filter(user=self.batch_profile.user).exists())
+        self.assertIsNone(WorkoutPlanCache.get(self.batch_profile, 7))
+        self.batch_profile.refresh_from_db()
+        self.assertIsNone(self.batch_profile.last_llm_update)
+
+        # Nothing was stored, so the profiles are still candidates
+        stats = WorkoutPlanBatchService.run(get_plan_backend('local'))
+        self.assertEqual((stats['generated'], stats['stored']), (2, False))
+
+    def test_conflicting_version_is_not_marked_as_generated(self):
+        # The member generated version 1 themselves after the batch read their profile
+        WorkoutPlan.objects.create(user=self.batch_profile.user, version=1, days=7,
+                                   plan={'days': []}, fingerprint='theirs')
+        self.batch_profile.plan_version = None
+        other = FitnessProfile.objects.get(user__username='batch1')
+        other.plan_version = None
+
+        WorkoutPlanBatchService._write([(self.batch_profile, PLAN), (other, PLAN)], 7)
+
+        self.assertEqual(WorkoutPlan.objects.get(user=self.batch_profile.user).fingerprint,
+                         'theirs')
+        self.assertIsNone(FitnessProfile.objects.get(pk=self.batch_profile.pk).last_llm_update)
+        self.assertIsNone(WorkoutPlanCache.get(self.batch_profile, 7))
+        self.assertIsNotNone(FitnessProfile.objects.get(pk=other.pk).last_llm_update)
+        self.assertEqual(WorkoutPlanCache.get(other, 7), PLAN)
+
+    def test_anthropic_backend_stops_when_breaker_opens(self):
+        stats = WorkoutPlanBatchService.run(get_plan_backend('anthropic'), workers=4)
+        self.assertEqual((stats['generated'], stats['failed']), (2, 0))
+        plan = WorkoutPlan.objects.get(user=self.batch_profile.user)
+        self.assertEqual((plan.version, plan.plan), (1, PLAN))
+        self.assertEqual(WorkoutPlanCache.get(self.batch_profile, 7), PLAN)
+        self.batch_profile.refresh_from_db()
+        self.assertIsNotNone(self.batch_profile.last_llm_update)
+        self.assertEqual(WorkoutPlanBatchService.run(get_plan_backend('anthropic'))['generated'], 0)
+        self.assertIsNotNone(stats['p95_latency_seconds'])
+
+        WorkoutPlan.objects.all().delete()
+        self.server.script = [(500, 0)] * 3
+        with override_settings(LLM_MAX_RETRIES=0):
+            LLMClient.reset()
+            stats = WorkoutPlanBatchService.run(get_plan_backend('anthropic'), workers=1,
+                                                chunk_size=1)
+        self.assertTrue(stats['stopped_early'])
+        self.assertEqual(stats['generated'], 0)
+
+
+class WorkoutPlanCacheTests(TestCase):
+    def setUp(self):
+        caches['workout_plans'].clear()
+        self.profiles = [
+            FitnessProfile.objects.create(
+                user=User.objects.create_user(name, f'{name}@example.com', 'password123'),
+                height_cm=175, weight_kg=70, primary_goal='weight_loss',
+                home_equipment=['mat', 'dumbbells']
+            )
+            for name in ['twin1', 'twin2']
+        ]
+
+    def test_fingerprint_covers_only_prompt_inputs(self):
+        profile, twin = self.profiles
+        fingerprint = WorkoutPlanCache.fingerprint(profile)
+
+        self.assertEqual(WorkoutPlanCache.fingerprint(twin), fingerprint)
+        self.assertEqual(
+            WorkoutPlanCache.fingerprint(FitnessProfile.objects.get(pk=profile.pk)), fingerprint
+        )
+
+        # Equipment order and fields the prompt never sees don't matter
+        profile.home_equipment = ['dumbbells', 'mat']
+        profile.months_experience = 12
+        self.assertEqual(WorkoutPlanCache.fingerprint(profile), fingerprint)
+
+        profile.days_per_week = 5
+        self.assertNotEqual(WorkoutPlanCache.fingerprint(profile), fingerprint)
+
+    def test_changed_profile_misses_without_evicting_shared_plans(self):
+        profile, twin = self.profiles
+        WorkoutPlanCache.set(profile, 7, PLAN)
+        self.assertEqual(WorkoutPlanCache.get(twin, 7), PLAN)
+
+        profile.days_per_week = 5
+        profile.save()
+
+        self.assertIsNone(WorkoutPlanCache.get(profile, 7))
+        self.assertIsNone(WorkoutPlanCache.get(twin, 3))
+        self.assertEqual(WorkoutPlanCache.get(twin, 7), PLAN)
+
+
+class FitnessProfileTrackingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('track', 'track@example.com', 'password123')
+        self.profile = FitnessProfile.objects.create(user=self.user, height_cm=180, weight_kg=81)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_save_skips_context_rebuild(self):
+        profile = FitnessProfile.objects.get(pk=self.profile.pk)
+        profile.total_workouts = 3
+
+        # No user or class type lookups, no second UPDATE
+        with self.assertNumQueries(1):
+            profile.save()
+
+    def test_patch_recomputes_derived_fields_in_one_update(self):
+        # Load profile (+user), prefetch class types, one UPDATE
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(3):
+                response = self.client.patch('/api/users/profiles/mine/', {'weight_kg': 72},
+                                             format='json')
+        # The recommendation snapshot UPDATE waits for the commit
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bmi'], 22.2)
+        self.assertIn('Weight: 72', response.data['llm_prompt_context'])
+
+    def test_preference_change_appends_one_history_row(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch('/api/users/profiles/mine/', {'primary_goal': 'endurance'},
+                              format='json')
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        # Load, prefetch, profile UPDATE, history INSERT (the snapshot UPDATE follows the commit)
+        self.assertEqual(len(statements), 4)
+
+        change = self.profile.preference_changes.get()
+        self.assertEqual(change.old['primary_goal'], 'general_fitness')
+        self.assertEqual(change.new['primary_goal'], 'endurance')
+        self.profile.refresh_from_db()
+        self.assertIn('Endurance Improvement', self.profile.llm_prompt_context)
+
+        # Unchanged preferences: no history row
+        self.client.patch('/api/users/profiles/mine/', {'weight_kg': 75}, format='json')
+        self.assertEqual(self.profile.preference_changes.count(), 1)
+
+    def test_preference_history_is_paginated_newest_first(self):
+        for goal in ['endurance', 'strength', 'flexibility']:
+            self.client.patch('/api/users/profiles/mine/', {'primary_goal': goal},
+                              format='json')
+
+        response = self.client.get('/api/users/profiles/preference_history/?page_size=2')
+        self.assertEqual(
+            [change['new']['primary_goal'] for change in response.data['results']],
+            ['flexibility', 'strength']
+        )
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['new']['primary_goal'], 'endurance')
+        self.assertIsNone(response.data['next'])
+
+    def test_class_type_changes_rebuild_context(self):
+        yoga = ClassType.objects.create(name='Yoga')
+
+        self.profile.preferred_class_types.add(yoga)
+        self.profile.refresh_from_db()
+        self.assertIn('Preferred Class Types: Yoga', self.profile.llm_prompt_context)
+
+        yoga.user_preferences.clear()
+        self.profile.refresh_from_db()
+        self.assertNotIn('Preferred Class Types', self.profile.llm_prompt_context)
+
+
+@override_settings(RECOMMENDATION_REFRESH_SECONDS=0)
+class RecommendationSnapshotTests(TestCase):
+    URL = '/api/users/profiles/recommendations/'
+
+    def setUp(self):
+        ClassRecommendationEngine.mark_dirty(full=True)
+
+        self.user = User.objects.create_user('snap', 'snap@example.com', 'password123')
+        self.profile = FitnessProfile.objects.create(
+            user=self.user, height_cm=170, weight_kg=70, primary_goal='weight_loss',
+            experience_level='beginner',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        level = Level.objects.create(name='All Levels', difficulty_order=4)
+        class_type = ClassType.objects.create(name='HIIT')
+        start_time = timezone.now() + timedelta(days=2)
+        self.small_class, self.big_class = [
+            FitnessClass.objects.create(
+                class_type=class_type, level=level, max_capacity=capacity,
+                start_time=start_time, end_time=start_time + timedelta(hours=1),
+            )
+            for capacity in (1, 20)
+        ]
+
+    def suggested_ids(self, response):
+        return [fitness_class['id'] for fitness_class in response.data['suggested_classes']]
+
+    def test_fresh_snapshot_is_served_with_one_query(self):
+        first = self.client.get(self.URL)
+        self.assertEqual(self.suggested_ids(first), [self.small_class.pk, self.big_class.pk])
+
+        with self.assertNumQueries(1):
+            second = self.client.get(self.URL)
+        self.assertEqual(second.json(), first.json())
+
+    def test_profile_change_invalidates_snapshot(self):
+        self.client.get(self.URL)
+
+        # Not a recommendation input: the snapshot is kept
+        self.client.patch('/api/users/profiles/mine/', {'days_per_week': 5}, format='json')
+        with self.assertNumQueries(1):
+            self.client.get(self.URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/users/profiles/mine/', {'primary_goal': 'muscle_gain'},
+                              format='json')
+        response = self.client.get(self.URL)
+        self.assertIn('progressive overload',
+                      [tip['message'] for tip in response.data['recommendations']][0])
+
+    def test_bookings_invalidate_the_member_and_full_classes(self):
+        other = User.objects.create_user('other', 'other@example.com', 'password123')
+        FitnessProfile.objects.create(
+            user=other, height_cm=180, weight_kg=80, primary_goal='weight_loss',
+            experience_level='beginner',
+        )
+        self.client.get(self.URL)
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        other_client.get(self.URL)
+
+        # The member's own booking shows up in their suggestions
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingService.create_booking(self.user, self.big_class)
+        response = self.client.get(self.URL)
+        booked = {
+            fitness_class['id']: fitness_class['user_has_booking']
+            for fitness_class in response.data['suggested_classes']
+        }
+        self.assertEqual(booked, {self.small_class.pk: False, self.big_class.pk: True})
+
+        # Someone else taking the last seat of a suggested class
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingService.create_booking(other, self.small_class)
+        self.assertIsNone(RecommendationSnapshotService.get(self.user.pk))
+        self.assertEqual(self.suggested_ids(self.client.get(self.URL)), [self.big_class.pk])
+
+    def test_cancelled_class_invalidates_snapshots_showing_it(self):
+        self.client.get(self.URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingService.cancel_class(self.small_class)
+        self.assertEqual(self.suggested_ids(self.client.get(self.URL)), [self.big_class.pk])
+
+    def test_invalidation_waits_for_the_booking_to_commit(self):
+        self.client.get(self.URL)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                BookingService.create_booking(self.user, self.small_class)
+            # Nothing touched the snapshots while the class row was locked
+            self.assertFalse(
+                [q['sql'] for q in queries if 'recommendation_snapshots' in q['sql']]
+            )
+            self.assertIsNotNone(RecommendationSnapshotService.get(self.user.pk))
+
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(RecommendationSnapshotService.get(self.user.pk))
+
+    def test_refresher_recomputes_only_hot_members(self):
+        cold = User.objects.create_user('cold', 'cold@example.com', 'password123')
+        FitnessProfile.objects.create(
+            user=cold, height_cm=180, weight_kg=80, primary_goal='weight_loss',
+            experience_level='beginner',
+        )
+        self.client.get(self.URL)
+        cold_client = APIClient()
+        cold_client.force_authenticate(cold)
+        cold_client.get(self.URL)
+        RecommendationSnapshot.objects.filter(user=cold).update(
+            served_at=timezone.now() - timedelta(days=2)
+        )
+
+        self.big_class.max_capacity = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            self.big_class.save()
+        self.assertEqual(RecommendationSnapshotService.refresh_hot(), (1, 0))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.URL)
+        self.assertIn(25, [c['max_capacity'] for c in response.data['suggested_classes']])
+        self.assertIsNone(RecommendationSnapshotService.get(cold.pk))
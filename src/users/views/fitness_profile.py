@@ -1,11 +1,18 @@
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from django.utils import timezone
-from ..models import FitnessProfile
-from ..serializers import FitnessProfileSerializer
-from classes.serializers import FitnessClassReadSerializer
+from ..models import FitnessProfile, PreferenceChange, WorkoutPlanJob
+from ..pagination import PreferenceHistoryPagination
+from ..renderers import EventStreamRenderer, format_event
+from ..serializers import (
+    FitnessProfileSerializer, PreferenceChangeSerializer, WorkoutPlanJobSerializer,
+    WorkoutPlanSerializer
+)
+from ..services.recommendation_snapshots import RecommendationSnapshotService
+from ..services.workout_plan_cache import MAX_PLAN_DAYS
 
 
 class FitnessProfileViewSet(viewsets.ModelViewSet):
@@ -19,7 +26,10 @@ class FitnessProfileViewSet(viewsets.ModelViewSet):
         return FitnessProfile.objects.filter(user=self.request.user)
 
     def _get_profile(self):
-        profile, created = FitnessProfile.objects.get_or_create(user=self.request.user)
+        # user and class types are what saving (LLM context) and serializing the profile read
+        profile, created = FitnessProfile.objects.select_related('user').prefetch_related(
+            'preferred_class_types'
+        ).get_or_create(user=self.request.user)
         return profile
 
     @action(detail=False, methods=['get', 'put', 'patch'], url_path="mine")
@@ -35,6 +45,16 @@ class FitnessProfileViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def preference_history(self, request):
+        """Changes of the user's goal, activity and experience level, newest first"""
+        queryset = PreferenceChange.objects.filter(profile__user=request.user)
+
+        paginator = PreferenceHistoryPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = PreferenceChangeSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def llm_context(self, request):
         """Get LLM prompt context for this user"""
@@ -46,8 +66,20 @@ class FitnessProfileViewSet(viewsets.ModelViewSet):
             'last_updated': profile.last_llm_update
         })
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def llm_status(self, request):
+        """Circuit breaker state and LLM latency of this process"""
+        from ..services import LLMClient
+
+        return Response(LLMClient.status())
+
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
+        """Served from the member's snapshot while it is fresh, recomputed otherwise"""
+        snapshot = RecommendationSnapshotService.get(request.user.pk)
+        if snapshot is not None:
+            return Response(snapshot)
+
         profile = self._get_profile()
 
         if not profile.is_complete:
@@ -56,13 +88,7 @@ class FitnessProfileViewSet(viewsets.ModelViewSet):
                 'missing_fields': self._get_missing_fields(profile)
             })
 
-        recommendations = self._generate_recommendations(profile)
-        suggested_classes = self._get_suggested_classes(profile)
-
-        return Response({
-            'recommendations': recommendations,
-            'suggested_classes': FitnessClassReadSerializer(suggested_classes, many=True).data
-        })
+        return Response(RecommendationSnapshotService.refresh(profile))
 
     def _get_missing_fields(self, profile):
         """Get list of missing required fields"""
@@ -79,76 +105,108 @@ class FitnessProfileViewSet(viewsets.ModelViewSet):
 
         return missing
 
-    def _generate_recommendations(self, profile):
-        """Generate basic recommendations based on profile"""
-        recommendations = []
+    def _parse_days(self, value):
+        """Requested plan length, or None when it is not an integer in range"""
+        try:
+            days = int(value)
+        except (TypeError, ValueError):
+            return None
+        return days if 1 <= days <= MAX_PLAN_DAYS else None
 
-        if profile.bmi_category == "Overweight" or profile.bmi_category == "Obese":
-            recommendations.append({
-                'type': 'weight_management',
-                'message': 'Focus on cardio and balanced nutrition',
-                'priority': 'high'
-            })
-        elif profile.bmi_category == "Underweight":
-            recommendations.append({
-                'type': 'nutrition',
-                'message': 'Consider strength training and calorie surplus',
-                'priority': 'medium'
-            })
+    @action(detail=False, methods=['post'])
+    def generate_workout_plan(self, request):
+        """
+        Queue personalized workout plan generation using LLM.
+        Returns 202 with a job to poll at workout_plan_jobs/<job_id>/.
+        """
+        from ..services import WorkoutPlanJobService
 
-        if profile.primary_goal == 'weight_loss':
-            recommendations.append({
-                'type': 'workout',
-                'message': 'Focus on HIIT and cardio classes 4-5 times per week',
-                'priority': 'high'
-            })
-        elif profile.primary_goal == 'muscle_gain':
-            recommendations.append({
-                'type': 'workout',
-                'message': 'Focus on strength training with progressive overload',
-                'priority': 'high'
-            })
+        profile = self._get_profile()
 
-        if profile.experience_level == 'beginner':
-            recommendations.append({
-                'type': 'safety',
-                'message': 'Start with beginner-friendly classes and focus on form',
-                'priority': 'high'
-            })
+        if not profile.is_complete:
+            return Response({
+                'error': 'Profile incomplete',
+                'missing_fields': self._get_missing_fields(profile)
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        return recommendations
+        days = self._parse_days(request.data.get('days', 7))
+        if days is None:
+            return Response(
+                {'error': f'days must be an integer between 1 and {MAX_PLAN_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-    def _get_suggested_classes(self, profile):
-        """Get suggested classes based on profile"""
-        from classes.models import FitnessClass
-        from django.utils import timezone
+        job, created = WorkoutPlanJobService.submit(request.user, days)
 
-        queryset = FitnessClass.objects.filter(
-            is_active=True,
-            is_cancelled=False,
-            start_time__gt=timezone.now()
-        )
+        response_data = WorkoutPlanJobSerializer(job).data
+        response_data['created'] = created
+        response_data['status_url'] = self._job_status_url(request, job)
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
 
-        if profile.preferred_class_types.exists():
-            queryset = queryset.filter(
-                class_type__in=profile.preferred_class_types.all()
-            )
+    def _job_status_url(self, request, job):
+        return request.build_absolute_uri(f'/api/users/profiles/workout_plan_jobs/{job.pk}/')
 
-        experience_mapping = {
-            'beginner': ['Beginner', 'All Levels'],
-            'intermediate': ['Intermediate', 'All Levels'],
-            'advanced': ['Advanced', 'All Levels']
-        }
+    @action(detail=False, methods=['get'])
+    def workout_plan(self, request):
+        """
+        Current workout plan, or an older one with ?version=N. When the profile
+        changed since the current plan was generated it is returned with
+        stale=true and a regeneration job is queued.
+        """
+        from ..services import WorkoutPlanService, WorkoutPlanJobService
+
+        version = request.query_params.get('version')
+        if version is not None and not version.isdigit():
+            return Response(
+                {'error': 'version must be a positive integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if profile.experience_level in experience_mapping:
-            allowed_levels = experience_mapping[profile.experience_level]
-            queryset = queryset.filter(level__name__in=allowed_levels)
+        workout_plan = WorkoutPlanService.current(request.user, version)
+        if workout_plan is None:
+            return Response(
+                {'error': 'Workout plan not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-        return queryset.order_by('start_time')[:5]
+        try:
+            profile = workout_plan.user.fitness_profile
+        except FitnessProfile.DoesNotExist:
+            # Profile deleted since: nothing to compare against or regenerate from
+            profile = None
+
+        response_data = WorkoutPlanSerializer(workout_plan).data
+        response_data['stale'] = (
+            profile is None or WorkoutPlanService.is_stale(workout_plan, profile)
+        )
 
-    @action(detail=False, methods=['post'])
-    def generate_workout_plan(self, request):
-        """Generate a personalized workout plan using LLM"""
+        if response_data['stale'] and version is None and profile and profile.is_complete:
+            job, created = WorkoutPlanJobService.submit(request.user, workout_plan.days)
+            response_data['regeneration'] = {
+                'job_id': job.pk,
+                'status': job.status,
+                'status_url': self._job_status_url(request, job),
+            }
+
+        return Response(response_data)
+
+    @action(detail=False, methods=['get'], url_path=r'workout_plan_jobs/(?P<job_id>\d+)')
+    def workout_plan_job(self, request, job_id=None):
+        """Status and, once finished, result of a workout plan job"""
+        job = WorkoutPlanJob.objects.filter(pk=job_id, user=request.user).first()
+        if job is None:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(WorkoutPlanJobSerializer(job).data)
+
+    @action(detail=False, methods=['get'],
+            renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def workout_plan_stream(self, request):
+        """
+        Server-Sent Events version of generate_workout_plan (?days=7): a 'day'
+        event per plan day as soon as the model finishes it, then 'plan' with
+        the complete plan, or 'error'.
+        """
         from ..services import WorkoutLLMService
 
         profile = self._get_profile()
@@ -159,22 +217,18 @@ class FitnessProfileViewSet(viewsets.ModelViewSet):
                 'missing_fields': self._get_missing_fields(profile)
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        days = request.data.get('days', 7)
-
-        try:
-            workout_plan = WorkoutLLMService.generate_workout_plan(profile, days)
-
-            if 'error' in workout_plan:
-                return Response(workout_plan, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            return Response({
-                'success': True,
-                'workout_plan': workout_plan,
-                'generated_at': timezone.now().isoformat(),
-            })
+        days = self._parse_days(request.query_params.get('days', 7))
+        if days is None:
+            return Response(
+                {'error': f'days must be an integer between 1 and {MAX_PLAN_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        except Exception as e:
-            return Response({
-                'error': 'Failed to generate workout plan',
-                'details': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        events = (
+            format_event(event, data)
+            for event, data in WorkoutLLMService.stream_workout_plan(profile, days)
+        )
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+        return response